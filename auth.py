@@ -0,0 +1,366 @@
+"""
+Password hashing and login checks for Labs at Yale.
+
+Passwords are stored as werkzeug hashes, scrypt with N=32768 by default, which
+takes about 100 ms of CPU and 32 MB of memory per check.  Checking them on the
+request thread let a burst of logins (the start of every semester) run as
+many scrypt computations at once as there were request threads, each holding
+its 32 MB and all of them competing for the same cores.
+
+Hashing now happens on a `HashPool`: a fixed number of worker threads behind
+a bounded queue.  hashlib's scrypt releases the GIL, so the workers run in
+parallel on as many cores as there are workers.  At most `workers` hashes are
+in memory at once.  When the queue is full, or a job waits longer than
+`HASH_TIMEOUT`, the caller gets `PoolBusy` straight away and the app answers
+503 instead of making the queue longer.  Jobs whose caller gave up are
+dropped from the queue without being hashed.
+
+On a successful login, a hash weaker than `HASH_METHOD` (a lower scrypt
+cost, or pbkdf2) is replaced with a hash at the current cost.  The cost can
+therefore be raised without forcing password resets; hashes stronger than the
+current setting are left alone, so lowering it never weakens them.
+
+Login attempts are limited in memory with token buckets, one per IP address
+and one per net id; see `check_login_rate`.
+
+Classes:
+    - PoolBusy: The hash pool is saturated.
+    - RateLimited: Too many login attempts.
+    - HashPool: Bounded pool of hashing threads.
+    - RateLimiter: Token buckets keyed by string.
+
+Functions:
+    - hash_password(password)
+    - needs_rehash(password_hash)
+    - authenticate(net_id, password)
+    - check_login_rate(net_id, ip)
+"""
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+import database
+from instrumentation import add_metrics_renderer
+
+HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+HASH_WORKERS = int(os.environ.get('HASH_WORKERS', min(4, os.cpu_count() or 1)))
+HASH_QUEUE_SIZE = int(os.environ.get('HASH_QUEUE_SIZE', 32))
+HASH_TIMEOUT = float(os.environ.get('HASH_TIMEOUT', 5))
+# Hash families from weakest to strongest; a hash is never moved down this list.
+_HASH_FAMILIES = ['pbkdf2', 'scrypt']
+
+# (attempts, seconds): a bucket holds `attempts` tokens and refills completely
+# in `seconds`.  The IP limit is loose because a campus NAT puts many students
+# behind one address.
+LOGIN_LIMIT_PER_NET_ID = (10, 300)
+LOGIN_LIMIT_PER_IP = (300, 60)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class PoolBusy(Exception):
+    """Raised when a hash job cannot be queued, or waits longer than its timeout."""
+
+
+class RateLimited(Exception):
+    """
+    Raised when a login attempt is over its rate limit.
+
+    Attributes:
+        retry_after (float): Seconds until the next attempt is allowed.
+    """
+    def __init__(self, retry_after):
+        super().__init__(f'retry after {retry_after:.0f}s')
+        self.retry_after = retry_after
+
+
+class HashPool:
+    """
+    Runs password hashing jobs on a fixed set of threads.
+
+    Attributes:
+        workers (int): Number of hashing threads.
+        queue_size (int): Jobs that may wait for a thread before `submit` refuses more.
+    """
+    def __init__(self, workers=HASH_WORKERS, queue_size=HASH_QUEUE_SIZE):
+        if workers < 1:
+            raise ValueError("hash pool needs at least one worker")
+        self.workers = workers
+        self.queue_size = queue_size
+        self._jobs = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._stats = {'completed': 0, 'rejected': 0, 'expired': 0, 'wait_seconds': 0.0, 'hash_seconds': 0.0}
+        self._threads = [threading.Thread(target=self._run, name=f'password-hash-{i}', daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, fn, *args):
+        """
+        Queue `fn(*args)` for a worker thread.
+
+        Returns:
+            Future: Resolves to whatever `fn` returned.
+
+        Raises:
+            PoolBusy: The queue is full.
+        """
+        future = Future()
+        try:
+            self._jobs.put_nowait((fn, args, future, time.perf_counter()))
+        except queue.Full:
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise PoolBusy("password hashing queue is full") from None
+        return future
+
+    def run(self, fn, *args, timeout=None):
+        """
+        Run `fn(*args)` on a worker thread and wait for the result.
+
+        Args:
+            timeout (float, optional): Seconds to wait. Defaults to HASH_TIMEOUT.
+
+        Raises:
+            PoolBusy: The queue is full, or the job did not finish in time.
+        """
+        future = self.submit(fn, *args)
+        try:
+            return future.result(HASH_TIMEOUT if timeout is None else timeout)
+        except FutureTimeout:
+            # A job still in the queue is skipped; one already running finishes unobserved.
+            future.cancel()
+            raise PoolBusy("password hashing timed out") from None
+
+    def stats(self):
+        """Return job counts and timings, plus the current queue length."""
+        with self._lock:
+            return dict(self._stats, queued=self._jobs.qsize())
+
+    def stop(self):
+        """Finish the queued jobs, then stop the worker threads."""
+        for _ in self._threads:
+            self._jobs.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            fn, args, future, queued_at = job
+            if not future.set_running_or_notify_cancel():
+                with self._lock:
+                    self._stats['expired'] += 1
+                continue
+            start = time.perf_counter()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+            end = time.perf_counter()
+            with self._lock:
+                self._stats['completed'] += 1
+                self._stats['wait_seconds'] += start - queued_at
+                self._stats['hash_seconds'] += end - start
+
+
+class RateLimiter:
+    """
+    Token buckets keyed by string, kept in memory.
+
+    Each key may make `capacity` attempts at once, and earns them back at
+    `capacity / per` attempts per second.  Only the `maxsize` most recently
+    used keys are remembered; a forgotten key starts again with a full bucket.
+    """
+    def __init__(self, capacity, per, maxsize=65536, clock=time.monotonic):
+        self.capacity = capacity
+        self.rate = capacity / per
+        self.maxsize = maxsize
+        self.clock = clock
+        self.limited = 0
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+
+    def acquire(self, key):
+        """
+        Take one attempt from `key`'s bucket.
+
+        Returns:
+            float: 0 if the attempt is allowed, otherwise seconds until it would be.
+        """
+        now = self.clock()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / self.rate
+                self.limited += 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def reset(self, key):
+        """Give `key` a full bucket again."""
+        with self._lock:
+            self._buckets.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+net_id_limiter = RateLimiter(*LOGIN_LIMIT_PER_NET_ID)
+ip_limiter = RateLimiter(*LOGIN_LIMIT_PER_IP)
+
+
+def get_hash_pool():
+    """Return the shared HashPool, starting it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = HashPool()
+        return _pool
+
+
+def configure_hash_pool(workers=None, queue_size=None):
+    """
+    Replace the shared HashPool with one of a different size.
+
+    Args:
+        workers (int, optional): Hashing threads. Defaults to HASH_WORKERS.
+        queue_size (int, optional): Queue length. Defaults to HASH_QUEUE_SIZE.
+    """
+    global _pool
+    with _pool_lock:
+        old, _pool = _pool, HashPool(workers or HASH_WORKERS,
+                                     HASH_QUEUE_SIZE if queue_size is None else queue_size)
+    if old is not None:
+        old.stop()
+
+
+def hash_password(password):
+    """
+    Hash a new password with HASH_METHOD on the hash pool.
+
+    Raises:
+        PoolBusy: The hash pool is saturated.
+    """
+    return get_hash_pool().run(generate_password_hash, password, HASH_METHOD)
+
+
+def _hash_cost(method):
+    """
+    Return a comparable (family, work) cost for a werkzeug hash method.
+
+    Work is N * r * p for scrypt and the iteration count for pbkdf2.
+
+    Raises:
+        ValueError: The method is not a pbkdf2 or scrypt method string.
+    """
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        n, r, p = (int(a) for a in args) if args else (2 ** 15, 8, 1)
+        return _HASH_FAMILIES.index(name), n * r * p
+    if name == 'pbkdf2':
+        return _HASH_FAMILIES.index(name), int(args[1]) if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+    raise ValueError(f'unknown password hash method {method!r}')
+
+
+def needs_rehash(password_hash):
+    """
+    Return True if `password_hash` is weaker than what HASH_METHOD produces.
+
+    A hash from a weaker family (pbkdf2 under scrypt) or with a lower cost is
+    upgraded; one at an equal or higher cost is kept, so lowering HASH_METHOD
+    never weakens stored hashes.
+    """
+    try:
+        stored = _hash_cost(password_hash.split('$', 1)[0])
+    except ValueError:
+        return True
+    return stored < _hash_cost(HASH_METHOD)
+
+
+def _verify(password_hash, password):
+    if not check_password_hash(password_hash, password):
+        return False, None
+    if needs_rehash(password_hash):
+        return True, generate_password_hash(password, HASH_METHOD)
+    return True, None
+
+
+def authenticate(net_id, password):
+    """
+    Check a net id and password.
+
+    The hash is checked on the hash pool; if it matches but is weaker than
+    HASH_METHOD (see `needs_rehash`), the user's stored hash is upgraded.
+
+    Returns:
+        AuthUser | None: The user, or None if the net id or password is wrong.
+
+    Raises:
+        PoolBusy: The hash pool is saturated.
+    """
+    credentials = database.get_user_credentials(net_id)
+    if credentials is None:
+        return None
+    user, password_hash = credentials
+    ok, new_hash = get_hash_pool().run(_verify, password_hash, password)
+    if not ok:
+        return None
+    if new_hash is not None:
+        database.update_password_hash(net_id, new_hash, old_hash=password_hash)
+    return user
+
+
+def check_login_rate(net_id, ip):
+    """
+    Count a login attempt against the net id's and the IP address's limits.
+
+    Call `login_succeeded` after a successful login so a user who logs in
+    often is not locked out by their own attempts.
+
+    Raises:
+        RateLimited: Either limit is exhausted.
+    """
+    wait = max(ip_limiter.acquire(ip), net_id_limiter.acquire(net_id))
+    if wait > 0:
+        raise RateLimited(wait)
+
+
+def login_succeeded(net_id):
+    net_id_limiter.reset(net_id)
+
+
+def _metric_lines():
+    if _pool is None:
+        return []
+    stats = _pool.stats()
+    lines = ['# TYPE labsatyale_password_hash_queued gauge',
+             f'labsatyale_password_hash_queued {stats["queued"]}']
+    for stat in ('completed', 'rejected', 'expired'):
+        lines.append(f'# TYPE labsatyale_password_hash_{stat}_total counter')
+        lines.append(f'labsatyale_password_hash_{stat}_total {stats[stat]}')
+    for stat in ('wait_seconds', 'hash_seconds'):
+        lines.append(f'# TYPE labsatyale_password_{stat}_total counter')
+        lines.append(f'labsatyale_password_{stat}_total {stats[stat]:.6f}')
+    lines.append('# TYPE labsatyale_login_rate_limited_total counter')
+    for name, limiter in (('ip', ip_limiter), ('net_id', net_id_limiter)):
+        lines.append(f'labsatyale_login_rate_limited_total{{key="{name}"}} {limiter.limited}')
+    return lines
+
+
+add_metrics_renderer(_metric_lines)
@@ -0,0 +1,92 @@
+"""
+Fellowship listing: counting applications per view versus the maintained counter.
+
+`get_fellowship_information` used to LEFT JOIN applications and GROUP BY
+fellowship on every `/fellowships` view, so the listing read every
+application.  It now reads `fellowships.application_count`, which triggers on
+applications keep exact.  This benchmark loads N applications, checks that
+both queries agree, times the listing each way, and times inserting and
+deleting applications with the triggers in place.
+
+Usage:
+    python -m benchmarks.bench_application_count [--applications 1000000] [--fellowships 2000] [--repeat 20]
+"""
+import argparse
+import random
+import sqlite3
+import time
+
+import database
+from benchmarks.common import create_database, seed, summarize
+
+COUNTING_QUERY = '''
+    SELECT f.fellowship_id, f.name, l.lab_name,
+           (u.first_name || ' ' || u.last_name) AS faculty_name,
+           f.class_years, f.description, f.deadline, f.stipend,
+           COUNT(a.application_id) AS application_count
+    FROM fellowships f
+    JOIN labs l ON f.lab_num = l.lab_num
+    JOIN users u ON l.faculty_net_id = u.net_id
+    LEFT JOIN applications a ON f.fellowship_id = a.fellowship_id
+    GROUP BY f.fellowship_id
+'''
+
+
+def build(applications, fellowships, students):
+    path = create_database()
+    fellowship_ids, student_ids = seed(path, faculty=fellowships // 10, fellowships_per_lab=10, students=students)
+    rng = random.Random(17)
+    conn = sqlite3.connect(path)
+    pairs = set()
+    while len(pairs) < applications:
+        pairs.add((rng.choice(fellowship_ids), rng.choice(student_ids)))
+    start = time.perf_counter()
+    conn.executemany('INSERT INTO applications (fellowship_id, student_net_id) VALUES (?, ?)', sorted(pairs))
+    conn.commit()
+    load = time.perf_counter() - start
+    conn.close()
+    return path, load
+
+
+def time_it(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--applications', type=int, default=1_000_000)
+    parser.add_argument('--fellowships', type=int, default=2000)
+    parser.add_argument('--students', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    path, load = build(args.applications, args.fellowships, args.students)
+    print(f"loaded {args.applications} applications through the triggers in {load:.1f}s")
+
+    conn = sqlite3.connect(path)
+    counted = {r[0]: r[8] for r in conn.execute(COUNTING_QUERY)}
+    maintained = {f.get_fellowship_id(): f.get_application_count() for f in database.get_fellowship_information()}
+    assert counted == maintained, "maintained counts disagree with COUNT(*)"
+
+    print(f"{'listing':<22}{'mean ms':>10}{'p50':>10}{'p95':>10}")
+    for name, fn in [('COUNT + GROUP BY', lambda: conn.execute(COUNTING_QUERY).fetchall()),
+                     ('application_count', database.get_fellowship_information)]:
+        s = time_it(fn, args.repeat)
+        print(f"{name:<22}{s['mean']:>10.2f}{s['p50']:>10.2f}{s['p95']:>10.2f}")
+
+    rows = [(fid, f'stu{i}') for i, fid in enumerate(range(1, 1001))]
+    start = time.perf_counter()
+    for row in rows:
+        conn.execute('INSERT OR IGNORE INTO applications (fellowship_id, student_net_id) VALUES (?, ?)', row)
+        conn.commit()
+    print(f"1000 single-row applications, one commit each: {(time.perf_counter() - start) * 1000:.1f} ms")
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
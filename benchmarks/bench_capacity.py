@@ -0,0 +1,94 @@
+"""
+Worst-holder replacement cost as fellowship capacity grows.
+
+Runs unrestricted deferred acceptance (`top_k=None`) on cohorts where every
+fellowship has the same capacity, once with `run_matching`'s heaps and once
+with a reference loop that finds the worst holder with a linear `max()` and
+removes it with `list.remove()`, the way `run_matching` used to.
+
+Usage:
+    python -m benchmarks.bench_capacity [--fellowships 20] [--choices 5]
+"""
+import argparse
+import random
+import time
+
+from matching import PreferenceTable, run_matching
+
+CAPACITIES = [1, 10, 50, 100, 250, 500]
+
+
+def make_cohort(fellowships, capacity, choices, seed=0):
+    rng = random.Random(seed)
+    students = [f'stu{i}' for i in range(fellowships * capacity * 2)]
+    fellowship_rows = [(fid, capacity) for fid in range(fellowships)]
+    student_pref_rows = []
+    applicants = {fid: [] for fid in range(fellowships)}
+    for net_id in students:
+        for fid in rng.sample(range(fellowships), min(choices, fellowships)):
+            student_pref_rows.append((net_id, fid))
+            applicants[fid].append(net_id)
+    faculty_pref_rows = []
+    for fid, pool in applicants.items():
+        rng.shuffle(pool)
+        faculty_pref_rows.extend((fid, net_id) for net_id in pool)
+    return PreferenceTable.from_rows(students, fellowship_rows, student_pref_rows, faculty_pref_rows)
+
+
+def linear_matching(data):
+    """Reference deferred acceptance with O(capacity) worst-holder lookup."""
+    held = [[] for _ in data.fellowship_ids]
+    student_next = [0] * len(data.student_ids)
+    unmatched = list(range(len(data.student_ids)))
+    while unmatched:
+        student = unmatched.pop()
+        prefs = data.student_prefs[student]
+        choice = student_next[student]
+        if choice >= len(prefs):
+            continue
+        student_next[student] = choice + 1
+        fid = prefs[choice]
+        rank_idx = data.faculty_rank[fid]
+        rank = rank_idx.get(student)
+        if rank is None:
+            unmatched.append(student)
+            continue
+        matched_list = held[fid]
+        if len(matched_list) < data.capacity[fid]:
+            matched_list.append(student)
+            continue
+        worst_student = max(matched_list, key=rank_idx.__getitem__)
+        if rank < rank_idx[worst_student]:
+            matched_list.remove(worst_student)
+            matched_list.append(student)
+            unmatched.append(worst_student)
+        else:
+            unmatched.append(student)
+    return held
+
+
+def best_of(fn, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fellowships', type=int, default=20)
+    parser.add_argument('--choices', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'capacity':>9}{'students':>10}{'linear ms':>12}{'heap ms':>10}{'speedup':>9}")
+    for capacity in CAPACITIES:
+        data = make_cohort(args.fellowships, capacity, args.choices)
+        linear = best_of(lambda: linear_matching(data))
+        heap = best_of(lambda: run_matching(data, top_k=None))
+        print(f"{capacity:>9}{len(data.student_ids):>10}{linear * 1000:>12.1f}{heap * 1000:>10.1f}{linear / heap:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
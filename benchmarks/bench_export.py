@@ -0,0 +1,110 @@
+"""
+Exporting 500,000 rows: building the whole file vs. streaming it.
+
+Fills `faculty_preferences` with `--rows` rankings and downloads them
+through /export/preferences/faculty.<fmt>, with and without
+`Accept-Encoding: gzip`.  The `buffered` baseline does what an export
+without streaming would: `fetchall()` and then write every row into one
+CSV string before sending anything.
+
+Reported per setup:
+- total time and rows per second;
+- time to the first body chunk;
+- body size on the wire;
+- peak Python memory (tracemalloc, measured in a second, separate pass so
+  that tracing does not slow down the timed one).
+
+Usage:
+    python -m benchmarks.bench_export [--rows 500000] [--fellowships 500]
+"""
+import argparse
+import csv
+import io
+import sqlite3
+import time
+import tracemalloc
+
+import database
+from benchmarks.common import create_database, seed
+from fellowship import app
+
+
+def buffered_export():
+    with database.get_connection() as conn:
+        rows = conn.execute('''
+            SELECT p.fellowship_id, f.name, p.preference_rank, p.student_net_id
+            FROM faculty_preferences p
+            LEFT JOIN fellowships f ON f.fellowship_id = p.fellowship_id
+            ORDER BY p.fellowship_id, p.preference_rank
+        ''').fetchall()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(database.FACULTY_PREFERENCE_EXPORT_COLUMNS)
+    writer.writerows(rows)
+    yield buffer.getvalue().encode('utf-8')
+
+
+def streamed_export(client, fmt, compress):
+    headers = {'Accept-Encoding': 'gzip'} if compress else {}
+    response = client.get(f'/export/preferences/faculty.{fmt}', headers=headers, buffered=False)
+    assert response.status_code == 200, response.status_code
+    assert ('Content-Encoding' in response.headers) == compress
+    try:
+        yield from response.response
+    finally:
+        response.close()
+
+
+def drain(chunks):
+    """Read a body to the end, keeping only its size; returns (seconds, first chunk seconds, bytes)."""
+    start = time.perf_counter()
+    first, size = None, 0
+    for chunk in chunks:
+        if first is None:
+            first = time.perf_counter() - start
+        size += len(chunk)
+    return time.perf_counter() - start, first, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=500000)
+    parser.add_argument('--fellowships', type=int, default=500)
+    args = parser.parse_args()
+
+    per_fellowship = args.rows // args.fellowships
+    path = create_database()
+    fellowship_ids, students = seed(path, faculty=args.fellowships // 10, fellowships_per_lab=10,
+                                    students=per_fellowship)
+    conn = sqlite3.connect(path)
+    conn.executemany('INSERT INTO faculty_preferences VALUES (?, ?, ?)',
+                     ((f, s, rank) for f in fellowship_ids for rank, s in enumerate(students, 1)))
+    conn.commit()
+    conn.close()
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = 'prof0'
+        session['_fresh'] = True
+
+    setups = [
+        ('buffered csv', buffered_export),
+        ('stream csv', lambda: streamed_export(client, 'csv', False)),
+        ('stream csv+gzip', lambda: streamed_export(client, 'csv', True)),
+        ('stream json', lambda: streamed_export(client, 'json', False)),
+        ('stream json+gzip', lambda: streamed_export(client, 'json', True)),
+    ]
+    print(f'{len(fellowship_ids) * len(students)} rows')
+    print(f"{'setup':<18}{'seconds':>8}{'rows/s':>10}{'first ms':>10}{'MB sent':>9}{'peak MB':>9}")
+    for name, make in setups:
+        seconds, first, size = drain(make())
+        tracemalloc.start()
+        drain(make())
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{name:<18}{seconds:>8.2f}{len(fellowship_ids) * len(students) / seconds:>10.0f}"
+              f"{first * 1000:>10.1f}{size / 2 ** 20:>9.1f}{peak / 2 ** 20:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Faculty fellowship page: per-fellowship lookups versus the batched loader.
+
+`_build_fellowship_data` used to call `get_fellowship_applicants` and
+`get_faculty_preferences` once per fellowship, on top of a full `get_matches()`
+scan.  This benchmark counts the connection checkouts and SQL statements each
+approach issues for one faculty member as their number of fellowships grows,
+and times both.  The batched loader should stay at the same statement count
+however many fellowships there are.
+
+Usage:
+    python -m benchmarks.bench_faculty_page [--sizes 1,10,30,100] [--applicants 20] [--repeat 20]
+"""
+import argparse
+import random
+import sqlite3
+import time
+
+import database
+from benchmarks.common import create_database, seed, summarize
+
+
+def per_fellowship(faculty_net_id, fellowships):
+    """The original loop, kept as the reference."""
+    data = []
+    all_matches = database.get_matches()
+    for fellowship in fellowships:
+        applicants = database.get_fellowship_applicants(faculty_net_id, fellowship.fellowship_id)
+        pref_dict = dict(database.get_faculty_preferences(fellowship.fellowship_id))
+        if pref_dict:
+            applicants = sorted(applicants, key=lambda app: pref_dict.get(app.student_net_id, float('inf')))
+        data.append((applicants, all_matches.get(fellowship.fellowship_id, []), pref_dict))
+    return data
+
+
+def batched(faculty_net_id, fellowships):
+    details = database.get_faculty_fellowship_details(faculty_net_id)
+    return [details.get(f.fellowship_id) for f in fellowships]
+
+
+def build(fellowships, applicants, other_faculty=20):
+    """One faculty member (prof0) with `fellowships` fellowships, plus background rows."""
+    path = create_database()
+    fellowship_ids, students = seed(path, faculty=1 + other_faculty, fellowships_per_lab=fellowships,
+                                    students=max(applicants * 2, 50))
+    rng = random.Random(9)
+    conn = sqlite3.connect(path)
+    conn.execute('INSERT INTO match_runs (match_run_id) VALUES (1)')
+    for fid in fellowship_ids:
+        chosen = rng.sample(students, applicants)
+        conn.executemany('INSERT INTO applications (fellowship_id, student_net_id) VALUES (?, ?)',
+                         [(fid, s) for s in chosen])
+        ranked = chosen[:applicants // 2]
+        conn.executemany('INSERT INTO faculty_preferences VALUES (?, ?, ?)',
+                         [(fid, s, rank) for rank, s in enumerate(ranked, 1)])
+        conn.execute('INSERT INTO matches (match_run_id, fellowship_id, student_net_id) VALUES (1, ?, ?)',
+                     (fid, ranked[0]))
+    conn.commit()
+    conn.close()
+    return path
+
+
+def measure(fn, fellowships, repeat):
+    statements = []
+    with database.get_connection() as conn:
+        conn.set_trace_callback(statements.append)
+    before = database.get_pool_stats()
+    fn('prof0', fellowships)
+    after = database.get_pool_stats()
+    with database.get_connection() as conn:
+        conn.set_trace_callback(None)
+    checkouts = (after['opened'] + after['reused']) - (before['opened'] + before['reused'])
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn('prof0', fellowships)
+        samples.append(time.perf_counter() - start)
+    return checkouts, len(statements), summarize(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1,10,30,100')
+    parser.add_argument('--applicants', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'fellowships':>12}{'path':>10}{'checkouts':>11}{'statements':>12}{'p50 ms':>10}{'p95 ms':>10}")
+    for size in (int(s) for s in args.sizes.split(',')):
+        build(size, args.applicants)
+        fellowships = database.get_fellowships_by_faculty('prof0')
+        for label, fn in (('loop', per_fellowship), ('batched', batched)):
+            checkouts, statements, stats = measure(fn, fellowships, args.repeat)
+            print(f"{size:>12}{label:>10}{checkouts:>11}{statements:>12}{stats['p50']:>10.2f}{stats['p95']:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Login storm: many clients posting /login at once.
+
+Each of `--clients` threads logs in repeatedly, as a different student, for
+`--seconds`.  The passwords are hashed with the default scrypt
+(N=32768, r=8, so 32 MB per check).  The benchmark runs three setups:
+
+- `inline`: the hash is checked on the request thread, as before; every
+  concurrent login is its own scrypt run.
+- `pool`: `auth.HashPool` with HASH_WORKERS threads and a queue large enough
+  for every client.
+- `pool/q8`: the same pool with an 8-job queue.  Logins beyond that get a
+  503 with Retry-After immediately instead of waiting.
+
+Reported per setup:
+- successful logins per second;
+- p50/p99 latency of successful logins;
+- number of 503 answers;
+- the most scrypt runs in flight at once, and the memory that implies.
+
+Rate limiting is switched off so that only hashing is measured.
+
+Usage:
+    python -m benchmarks.bench_login [--clients 32] [--seconds 5]
+"""
+import argparse
+import sqlite3
+import threading
+import time
+
+from werkzeug.security import generate_password_hash
+
+import auth
+from auth import HashPool, RateLimiter
+from benchmarks.common import create_database, seed, summarize
+from fellowship import app
+
+SCRYPT_MB = 32
+
+
+class InlinePool:
+    """Runs the job on the calling thread, like the old login path."""
+    def run(self, fn, *args, timeout=None):
+        return fn(*args)
+
+    def stop(self):
+        pass
+
+
+class Gauge:
+    """Counts jobs in flight and remembers the peak."""
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def wrap(self, fn):
+        def run(*args):
+            with self._lock:
+                self.current += 1
+                self.peak = max(self.peak, self.current)
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self.current -= 1
+        return run
+
+
+def storm(clients, seconds):
+    latencies, busy = [], [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client_loop(i):
+        with app.test_client() as client:
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                response = client.post('/login', data={'net_id': f'stu{i}', 'password': 'semester-start'})
+                elapsed = time.perf_counter() - start
+                with lock:
+                    if response.status_code == 302:
+                        latencies.append(elapsed)
+                    elif response.status_code == 503:
+                        busy[0] += 1
+                    else:
+                        raise AssertionError(f'unexpected status {response.status_code}')
+                if response.status_code == 503:
+                    time.sleep(float(response.headers['Retry-After']))
+
+    threads = [threading.Thread(target=client_loop, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, busy[0], time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    path = create_database()
+    seed(path, faculty=5, fellowships_per_lab=1, students=args.clients)
+    conn = sqlite3.connect(path)
+    conn.execute('UPDATE users SET password_hash = ?', (generate_password_hash('semester-start', auth.HASH_METHOD),))
+    conn.commit()
+    conn.close()
+
+    auth.net_id_limiter = RateLimiter(10 ** 9, 1)
+    auth.ip_limiter = RateLimiter(10 ** 9, 1)
+    verify = auth._verify
+
+    setups = [
+        ('inline', InlinePool),
+        ('pool', lambda: HashPool(auth.HASH_WORKERS, queue_size=args.clients)),
+        ('pool/q8', lambda: HashPool(auth.HASH_WORKERS, queue_size=8)),
+    ]
+    print(f'{args.clients} clients, {args.seconds:.0f} s each, HASH_WORKERS={auth.HASH_WORKERS}, {auth.HASH_METHOD}')
+    print(f"{'setup':<9}{'logins/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'503s':>7}{'peak scrypt':>13}{'peak MB':>9}")
+    for name, make_pool in setups:
+        gauge = Gauge()
+        auth._verify = gauge.wrap(verify)
+        auth._pool = make_pool()
+        try:
+            latencies, busy, elapsed = storm(args.clients, args.seconds)
+        finally:
+            auth._pool.stop()
+            auth._pool = None
+            auth._verify = verify
+        stats = summarize(latencies)
+        print(f"{name:<9}{len(latencies) / elapsed:>9.1f}{stats['p50']:>9.0f}{stats['p99']:>9.0f}{busy:>7}"
+              f"{gauge.peak:>13}{gauge.peak * SCRYPT_MB:>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Diffing two match runs: in SQL vs. loading both runs into Python.
+
+Builds a full-cohort run and a second run in which `--changed` students
+moved, were dropped or were added, with `MATCH_RUNS_KEPT` runs stored.  It
+times `database.diff_match_runs`, which returns only the differing pairs,
+against `get_matches` on both runs followed by a set difference in Python.
+
+Usage:
+    python -m benchmarks.bench_match_diff [--students 30000] [--changed 1000] [--repeat 5]
+"""
+import argparse
+import random
+import statistics
+import time
+
+import database
+from benchmarks.common import create_database, seed
+
+
+def python_diff(old_run_id, new_run_id):
+    def pairs(run_id):
+        return {(s, f) for f, students in database.get_matches(run_id).items() for s in students}
+
+    old, new = pairs(old_run_id), pairs(new_run_id)
+    added, removed = new - old, old - new
+    removed_by_student = {}
+    for s, f in removed:
+        removed_by_student.setdefault(s, []).append(f)
+    diff = {'added': [], 'removed': [], 'moved': []}
+    for s, f in sorted(added):
+        if s in removed_by_student:
+            diff['moved'].extend((s, old_f, f) for old_f in sorted(removed_by_student[s]))
+        else:
+            diff['added'].append((s, f))
+    added_students = {s for s, _ in added}
+    diff['removed'] = sorted((s, f) for s, f in removed if s not in added_students)
+    return diff
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=30000)
+    parser.add_argument('--changed', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    path = create_database()
+    fellowship_ids, students = seed(path, faculty=args.students // 100, fellowships_per_lab=10,
+                                    students=args.students)
+    rng = random.Random(24)
+    placed = {s: rng.choice(fellowship_ids) for s in students[:-args.changed]}
+    changed = dict(placed)
+    for s in rng.sample(list(placed), args.changed):
+        changed[s] = rng.choice(fellowship_ids)
+    for s in rng.sample(list(placed), args.changed):
+        del changed[s]
+    for s in students[-args.changed:]:
+        changed[s] = rng.choice(fellowship_ids)
+
+    def as_matches(placement):
+        matches = {}
+        for s, f in placement.items():
+            matches.setdefault(f, []).append(s)
+        return matches
+
+    for _ in range(database.MATCH_RUNS_KEPT - 2):
+        database.save_matches(as_matches(placed))
+    old_run = database.save_matches(as_matches(placed))
+    new_run = database.save_matches(as_matches(changed))
+
+    sql_ms, sql_diff = timed(lambda: database.diff_match_runs(old_run, new_run), args.repeat)
+    py_ms, py_diff = timed(lambda: python_diff(old_run, new_run), args.repeat)
+    assert sql_diff == py_diff
+    counts = ', '.join(f'{len(v)} {k}' for k, v in sql_diff.items())
+    print(f'{len(placed)} -> {len(changed)} matches, {database.MATCH_RUNS_KEPT} runs stored; diff: {counts}')
+    print(f"{'diff_match_runs (SQL)':<28}{sql_ms:>9.1f} ms")
+    print(f"{'get_matches x2 + Python':<28}{py_ms:>9.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
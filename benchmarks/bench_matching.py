@@ -0,0 +1,103 @@
+"""
+Matching engine throughput on a synthetic cohort.
+
+Generates a cohort in memory (20k students and 2k fellowships by default),
+packs it into a PreferenceTable and times `run_matching` on it.  With
+`--sqlite` the cohort is also written to a throwaway database and the time to
+load it back with `load_preferences()` is reported separately.
+
+Usage:
+    python -m benchmarks.bench_matching [--students 20000] [--fellowships 2000]
+                                        [--choices 5] [--sqlite]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from matching import PreferenceTable, load_preferences, run_matching
+
+
+def make_cohort(students, fellowships, choices, seed=0):
+    """
+    Return synthetic rows in the shape `PreferenceTable.from_rows` expects.
+
+    Every student applies to `choices` random fellowships and ranks them; every
+    fellowship ranks all of its applicants.
+    """
+    rng = random.Random(seed)
+    student_ids = [f'stu{i}' for i in range(students)]
+    fellowship_rows = [(fid, rng.randint(1, 5)) for fid in range(1, fellowships + 1)]
+    student_pref_rows = []
+    applicants = {fid: [] for fid, _ in fellowship_rows}
+    for net_id in student_ids:
+        for fid in rng.sample(range(1, fellowships + 1), choices):
+            student_pref_rows.append((net_id, fid))
+            applicants[fid].append(net_id)
+    faculty_pref_rows = []
+    for fid, pool in applicants.items():
+        rng.shuffle(pool)
+        faculty_pref_rows.extend((fid, net_id) for net_id in pool)
+    return student_ids, fellowship_rows, student_pref_rows, faculty_pref_rows
+
+
+def write_cohort(path, cohort):
+    """Store a synthetic cohort in the tables `load_matching_inputs` reads."""
+    from benchmarks.common import create_database
+    create_database(path)
+    student_ids, fellowship_rows, student_pref_rows, faculty_pref_rows = cohort
+    conn = sqlite3.connect(path)
+    conn.executemany('INSERT INTO fellowships (fellowship_id, name, capacity) VALUES (?, ?, ?)',
+                     [(fid, f'Fellowship {fid}', cap) for fid, cap in fellowship_rows])
+    ranks = {}
+    rows = []
+    for net_id, fid in student_pref_rows:
+        ranks[net_id] = ranks.get(net_id, 0) + 1
+        rows.append((net_id, fid, ranks[net_id]))
+    conn.executemany('INSERT INTO student_preferences VALUES (?, ?, ?)', rows)
+    conn.executemany('INSERT INTO applications (fellowship_id, student_net_id) VALUES (?, ?)',
+                     [(fid, net_id) for net_id, fid, _ in rows])
+    ranks = {}
+    rows = []
+    for fid, net_id in faculty_pref_rows:
+        ranks[fid] = ranks.get(fid, 0) + 1
+        rows.append((fid, net_id, ranks[fid]))
+    conn.executemany('INSERT INTO faculty_preferences VALUES (?, ?, ?)', rows)
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=20000)
+    parser.add_argument('--fellowships', type=int, default=2000)
+    parser.add_argument('--choices', type=int, default=5)
+    parser.add_argument('--sqlite', action='store_true')
+    args = parser.parse_args()
+
+    cohort = make_cohort(args.students, args.fellowships, args.choices)
+
+    start = time.perf_counter()
+    data = PreferenceTable.from_rows(*cohort)
+    pack = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matches = run_matching(data)
+    match = time.perf_counter() - start
+
+    print(f"{args.students} students, {args.fellowships} fellowships, {args.choices} choices each")
+    print(f"pack       {pack * 1000:>9.1f} ms")
+    print(f"match      {match * 1000:>9.1f} ms  ({sum(len(v) for v in matches.values())} matched)")
+
+    if args.sqlite:
+        with tempfile.TemporaryDirectory() as tmp:
+            write_cohort(os.path.join(tmp, 'bench.sqlite'), cohort)
+            start = time.perf_counter()
+            load_preferences()
+            print(f"load       {(time.perf_counter() - start) * 1000:>9.1f} ms  (4 queries)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Saving 1,000-entry faculty rankings: delete-all and re-insert vs. diff.
+
+`save_faculty_preferences` used to delete a fellowship's whole ranking and
+insert it again one `execute` at a time.  It now compares the new ranking
+with the stored one and writes only the rows that differ, each kind of
+change in one `executemany`.  Each scenario below alternates between two
+rankings, so every save is a real change (or, for `unchanged`, the same
+ranking again).  The benchmark reports the median time per save and the
+rows SQLite wrote (`total_changes`) for both versions.
+
+Usage:
+    python -m benchmarks.bench_preferences [--size 1000] [--repeat 20]
+"""
+import argparse
+import statistics
+import time
+
+import database
+from benchmarks.common import create_database, seed
+
+
+def legacy_save_faculty_preferences(fellowship_id, ranked_student_ids):
+    def write(conn):
+        cur = conn.cursor()
+        cur.execute('DELETE FROM faculty_preferences WHERE fellowship_id = ?', (fellowship_id,))
+        for rank, student_net_id in enumerate(ranked_student_ids, 1):
+            cur.execute('''
+                INSERT INTO faculty_preferences (fellowship_id, student_net_id, preference_rank)
+                VALUES (?, ?, ?)
+            ''', (fellowship_id, student_net_id, rank))
+
+    database.run_write(write)
+
+
+def scenarios(students, size):
+    base = students[:size]
+    swapped = list(base)
+    swapped[size // 2], swapped[size // 2 + 1] = swapped[size // 2 + 1], swapped[size // 2]
+    return [
+        ('unchanged', base, base),
+        ('swap two', base, swapped),
+        ('add one at end', base, base + [students[size]]),
+        ('remove first', base, base[1:]),
+        ('move last to top', base, base[-1:] + base[:-1]),
+        ('reverse', base, base[::-1]),
+        ('replace all', base, students[size:2 * size]),
+    ]
+
+
+def total_changes():
+    with database.get_connection() as conn:
+        return conn.total_changes
+
+
+def run(save, fellowship_id, first, second, repeat):
+    save(fellowship_id, first)
+    times, rows = [], []
+    for i in range(repeat):
+        ranking = second if i % 2 == 0 else first
+        before = total_changes()
+        start = time.perf_counter()
+        save(fellowship_id, ranking)
+        times.append(time.perf_counter() - start)
+        rows.append(total_changes() - before)
+    return statistics.median(times) * 1000, statistics.median(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    path = create_database()
+    fellowship_ids, students = seed(path, faculty=2, fellowships_per_lab=1, students=2 * args.size + 1)
+
+    print(f"{'scenario':<18}{'legacy ms':>10}{'rows':>7}{'diff ms':>9}{'rows':>7}")
+    for name, first, second in scenarios(students, args.size):
+        legacy = run(legacy_save_faculty_preferences, fellowship_ids[0], first, second, args.repeat)
+        diff = run(database.save_faculty_preferences, fellowship_ids[1], first, second, args.repeat)
+        print(f"{name:<18}{legacy[0]:>10.2f}{legacy[1]:>7.0f}{diff[0]:>9.2f}{diff[1]:>7.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Per-request cost of the latency histograms and sampled profiling.
+
+Sends N requests for /labs through Flask's test client with
+    - off: LATENCY_HISTOGRAMS disabled,
+    - histograms: the default (histograms on, no profiling),
+    - sampled: histograms plus cProfile on PROFILE_SAMPLE_RATE of requests,
+and reports the mean time per request.
+
+Usage:
+    python -m benchmarks.bench_profiling [--requests 2000] [--labs 200] [--rate 0.05]
+"""
+import argparse
+import sqlite3
+import tempfile
+import time
+
+from benchmarks.common import create_database
+from fellowship import app
+
+
+def seed(path, labs):
+    conn = sqlite3.connect(path)
+    for i in range(labs):
+        conn.execute("INSERT INTO users VALUES (?, 'F', 'L', ?, 'x', 'faculty')", (f'fac{i}', f'fac{i}@yale.edu'))
+        conn.execute('INSERT INTO labs (lab_name, faculty_net_id) VALUES (?, ?)', (f'Lab {i}', f'fac{i}'))
+    conn.commit()
+    conn.close()
+
+
+def run(client, requests):
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.get('/labs')
+    return (time.perf_counter() - start) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--labs', type=int, default=200)
+    parser.add_argument('--rate', type=float, default=0.05)
+    args = parser.parse_args()
+
+    seed(create_database(), args.labs)
+    app.config['PROFILE_DIR'] = tempfile.mkdtemp()
+    modes = [
+        ('off', {'LATENCY_HISTOGRAMS': False, 'PROFILE_SAMPLE_RATE': 0.0}),
+        ('histograms', {'LATENCY_HISTOGRAMS': True, 'PROFILE_SAMPLE_RATE': 0.0}),
+        ('sampled', {'LATENCY_HISTOGRAMS': True, 'PROFILE_SAMPLE_RATE': args.rate}),
+    ]
+    with app.test_client() as client:
+        run(client, 50)
+        print(f"{'mode':<12}{'ms/request':>12}")
+        for name, config in modes:
+            app.config.update(config)
+            print(f"{name:<12}{run(client, args.requests) * 1000:>12.3f}")
+
+
+if __name__ == '__main__':
+    main()
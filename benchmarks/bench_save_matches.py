@@ -0,0 +1,96 @@
+"""
+Saving and reading a full-cohort matching.
+
+`save_matches` used to delete every match and insert the new ones one
+`execute` at a time.  Each save is now a new match run, written with one
+`executemany`; an incremental full matching copies the current run with
+INSERT ... SELECT and applies only its diff.  `get_matches(run)` reads one
+run through the (match_run_id, fellowship_id, student_net_id) index, so the
+older runs kept next to it do not slow it down.
+
+Usage:
+    python -m benchmarks.bench_save_matches [--students 30000] [--repeat 5]
+"""
+import argparse
+import random
+import statistics
+import time
+
+import database
+from benchmarks.common import create_database, seed
+
+
+def legacy_save_matches(matches_dict):
+    """The per-row loop, writing into a new run so both versions produce the same rows."""
+    def write(conn):
+        cur = conn.cursor()
+        run_id = database._start_match_run(conn)
+        for fellowship_id, students in matches_dict.items():
+            if isinstance(students, list):
+                for student_net_id in students:
+                    cur.execute('''
+                        INSERT INTO matches (match_run_id, fellowship_id, student_net_id)
+                        VALUES (?, ?, ?)
+                    ''', (run_id, fellowship_id, student_net_id))
+            else:
+                cur.execute('''
+                    INSERT INTO matches (match_run_id, fellowship_id, student_net_id)
+                    VALUES (?, ?, ?)
+                ''', (run_id, fellowship_id, students))
+
+    database.run_write(write)
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=30000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    path = create_database()
+    fellowship_ids, students = seed(path, faculty=args.students // 100, fellowships_per_lab=10,
+                                    students=args.students)
+    rng = random.Random(23)
+    matches = {}
+    for net_id in students:
+        matches.setdefault(rng.choice(fellowship_ids), []).append(net_id)
+    moved = rng.sample(students, 100)
+    diff = {'progress': {}, 'rejections_added': [], 'rejections_removed': [],
+            'matches_removed': [(f, s) for f, ss in matches.items() for s in ss if s in set(moved)],
+            'matches_added': [(rng.choice(fellowship_ids), s) for s in moved]}
+
+    print(f'{len(students)} matched students in {len(matches)} fellowships, median of {args.repeat}')
+    print(f"{'per-row execute':<34}{timed(lambda: legacy_save_matches(matches), args.repeat):>9.1f} ms")
+    print(f"{'executemany (save_matches)':<34}{timed(lambda: database.save_matches(matches), args.repeat):>9.1f} ms")
+    # Alternate the diff and its inverse so every run differs from the one it copies.
+    inverse = dict(diff, matches_removed=diff['matches_added'], matches_added=diff['matches_removed'])
+    diffs = [diff, inverse]
+
+    def new_run():
+        database.save_matching_state('mutual_top_k', None, diffs[0], new_run=True)
+        diffs.reverse()
+
+    print(f"{'copy run + 100-student diff':<34}{timed(new_run, args.repeat):>9.1f} ms")
+
+    kept = database.MATCH_RUNS_KEPT
+    database.MATCH_RUNS_KEPT = 1
+    run_id = database.save_matches(matches)
+    print(f"{'get_matches(run), 1 run stored':<34}{timed(lambda: database.get_matches(run_id), args.repeat):>9.1f} ms")
+    database.MATCH_RUNS_KEPT = kept
+    for _ in range(kept - 1):
+        database.save_matches(matches)
+    print(f"{f'get_matches(run), {kept} runs stored':<34}"
+          f"{timed(lambda: database.get_matches(run_id), args.repeat):>9.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
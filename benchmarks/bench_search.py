@@ -0,0 +1,57 @@
+"""
+Fellowship search: LIKE scan versus the FTS5 index.
+
+Builds a database with 100k fellowships (by default), then times the same set
+of searches through `get_fellowship_information` with and without the FTS5
+index installed.
+
+Usage:
+    python -m benchmarks.bench_search [--fellowships 100000] [--repeat 5]
+"""
+import argparse
+import time
+
+import database
+from benchmarks.common import create_database, seed, summarize
+
+QUERIES = ['fellowship 4242', 'topic', 'last17', 'research', 'building 3', 'nomatch']
+
+
+def time_queries(repeat):
+    samples = []
+    rows = 0
+    for _ in range(repeat):
+        for q in QUERIES:
+            start = time.perf_counter()
+            rows += len(database.get_fellowship_information(q))
+            samples.append(time.perf_counter() - start)
+    return summarize(samples), rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fellowships', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    faculty = max(1, args.fellowships // 100)
+    path = create_database()
+    seed(path, faculty=faculty, fellowships_per_lab=100, students=10)
+
+    like, like_rows = time_queries(args.repeat)
+
+    start = time.perf_counter()
+    if not database.ensure_search_index():
+        print("SQLite built without FTS5; only the LIKE path is available")
+        return
+    build = time.perf_counter() - start
+    fts, fts_rows = time_queries(args.repeat)
+
+    print(f"{faculty * 100} fellowships, index build {build:.2f}s")
+    print(f"{'path':<6}{'rows':>10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for label, stats, rows in (('like', like, like_rows), ('fts5', fts, fts_rows)):
+        print(f"{label:<6}{rows:>10}{stats['mean']:>10.2f}{stats['p50']:>10.2f}{stats['p95']:>10.2f}{stats['max']:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
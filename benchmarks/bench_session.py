@@ -0,0 +1,65 @@
+"""
+Queries per authenticated request, with and without the session user cache.
+
+Flask-Login calls `load_user` on every request from a logged-in user.  It
+used to run `get_user_by_netid`, one query (selecting the unused
+password_hash too) per request; it now calls `get_session_user`, which is
+served from `user_cache` after the first request.  This benchmark logs a
+student and a faculty member in, requests a few pages N times each with the
+query headers on, and reports SQL statements per request and time per
+request for both loaders.
+
+Usage:
+    python -m benchmarks.bench_session [--requests 500]
+"""
+import argparse
+import time
+
+import database
+import fellowship
+from benchmarks.common import create_database, seed
+from fellowship import app
+
+PAGES = ['/labs', '/fellowships', '/faculty', '/profile']
+
+
+def legacy_load_user(net_id):
+    return database.get_user_by_netid([net_id])
+
+
+def run(client, path, requests):
+    queries = 0
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(path)
+        queries += int(response.headers['X-DB-Queries'])
+    return queries / requests, (time.perf_counter() - start) / requests * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    seed(create_database(), faculty=20, fellowships_per_lab=5, students=50)
+    app.config['QUERY_DEBUG_HEADERS'] = True
+    cached_loader = fellowship.login_manager._user_callback
+
+    print(f"{'user':<9}{'page':<14}{'loader':<10}{'queries/req':>12}{'ms/req':>10}")
+    for net_id in ('stu0', 'prof0'):
+        for path in PAGES:
+            for name, loader in (('per-req', legacy_load_user), ('cached', cached_loader)):
+                fellowship.login_manager.user_loader(loader)
+                database.user_cache.clear()
+                with app.test_client() as client:
+                    with client.session_transaction() as session:
+                        session['_user_id'] = net_id
+                        session['_fresh'] = True
+                    client.get(path)
+                    queries, ms = run(client, path, args.requests)
+                print(f"{net_id:<9}{path:<14}{name:<10}{queries:>12.2f}{ms:>10.3f}")
+    fellowship.login_manager.user_loader(cached_loader)
+
+
+if __name__ == '__main__':
+    main()
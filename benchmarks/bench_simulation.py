@@ -0,0 +1,53 @@
+"""
+Scaling of what-if simulations with the number of worker processes.
+
+Runs the same grid of scenarios (strategies x top-k cutoffs x capacity
+scales) on a synthetic cohort with 1, 2, 4, ... workers up to the CPU count
+and reports wall time and speedup over one worker.
+
+Usage:
+    python -m benchmarks.bench_simulation [--students 20000] [--fellowships 2000]
+"""
+import argparse
+import os
+import time
+
+from benchmarks.bench_matching import make_cohort
+from matching import PreferenceTable, STRATEGIES
+from simulation import simulate
+
+
+def scenario_grid():
+    return [
+        {'strategy': name, 'top_k': top_k, 'capacity_scale': scale}
+        for name in STRATEGIES
+        for top_k in (1, 2, 3, None)
+        for scale in (0.5, 1.0, 2.0, 4.0)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=20000)
+    parser.add_argument('--fellowships', type=int, default=2000)
+    parser.add_argument('--choices', type=int, default=5)
+    args = parser.parse_args()
+
+    data = PreferenceTable.from_rows(*make_cohort(args.students, args.fellowships, args.choices))
+    scenarios = scenario_grid()
+    cpus = os.cpu_count() or 1
+    counts = sorted({1, cpus} | {n for n in (2, 4, 8, 16) if n < cpus})
+
+    print(f"{len(scenarios)} scenarios, {args.students} students, {cpus} CPUs")
+    print(f"{'workers':>8}{'seconds':>10}{'speedup':>9}")
+    baseline = None
+    for workers in counts:
+        start = time.perf_counter()
+        simulate(scenarios, data=data, workers=workers)
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        print(f"{workers:>8}{elapsed:>10.2f}{baseline / elapsed:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
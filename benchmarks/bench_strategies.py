@@ -0,0 +1,51 @@
+"""
+Compare every registered matching strategy on synthetic cohorts.
+
+For each cohort size and preference density (how many fellowships each
+student ranks), reports each strategy's runtime, peak memory allocated while
+matching, number of students matched and number of blocking pairs (0 means
+the matching is stable with respect to the full rankings).
+
+Usage:
+    python -m benchmarks.bench_strategies [--sizes 1000,5000,20000] [--densities 2,5,10]
+"""
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.bench_matching import make_cohort
+from matching import PreferenceTable, STRATEGIES, count_blocking_pairs, run_strategy
+
+
+def measure(name, data):
+    tracemalloc.start()
+    start = time.perf_counter()
+    matches = run_strategy(name, data)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    matched = sum(len(v) for v in matches.values())
+    return elapsed, peak, matched, count_blocking_pairs(data, matches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='1000,5000,20000',
+                        help='comma-separated student counts; fellowships = students / 10')
+    parser.add_argument('--densities', default='2,5,10',
+                        help='comma-separated numbers of fellowships ranked per student')
+    args = parser.parse_args()
+
+    print(f"{'students':>9}{'density':>8}  {'strategy':<22}{'ms':>9}{'peak KiB':>10}{'matched':>9}{'blocking':>10}")
+    for students in (int(x) for x in args.sizes.split(',')):
+        for density in (int(x) for x in args.densities.split(',')):
+            fellowships = max(density, students // 10)
+            data = PreferenceTable.from_rows(*make_cohort(students, fellowships, density))
+            for name in STRATEGIES:
+                elapsed, peak, matched, blocking = measure(name, data)
+                print(f"{students:>9}{density:>8}  {name:<22}{elapsed * 1000:>9.1f}{peak / 1024:>10.0f}"
+                      f"{matched:>9}{blocking:>10}")
+
+
+if __name__ == '__main__':
+    main()
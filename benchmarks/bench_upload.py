@@ -0,0 +1,107 @@
+"""
+Resume uploads: whole-file reads versus the streaming upload path.
+
+Simulates N concurrent uploads of an S MB PDF.  Werkzeug has already spooled
+each upload to a temporary file by the time the view runs, so every upload
+starts from an open file on disk, and each thread then either
+    - read: calls `file.read()` and stores the bytes (the old upload path), or
+    - stream: hands the file to `update_student_resume`, which copies it into
+      the resume store in 64 KB chunks.
+
+Each mode runs in its own process so the peak RSS figures do not mix.  Peak
+Python heap is measured with tracemalloc.
+
+Usage:
+    python -m benchmarks.bench_upload [--uploads 50] [--size-mb 10]
+"""
+import argparse
+import os
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import database
+from benchmarks.common import create_database
+
+
+def make_uploads(directory, uploads, size):
+    paths = []
+    block = os.urandom(1024 * 1024)
+    for i in range(uploads):
+        path = os.path.join(directory, f'upload{i}.pdf')
+        with open(path, 'wb') as f:
+            f.write(b'%PDF-1.7\n' + str(i).encode())
+            written = 0
+            while written < size:
+                f.write(block[:size - written])
+                written += len(block)
+        paths.append(path)
+    return paths
+
+
+def run(mode, uploads, size):
+    work = tempfile.mkdtemp()
+    path = create_database(os.path.join(work, 'bench.sqlite'))
+    database._RESUME_DIR = os.path.join(work, 'resumes')
+    conn = sqlite3.connect(path)
+    for i in range(uploads):
+        conn.execute("INSERT INTO users VALUES (?, 'S', 'T', ?, 'x', 'student')", (f'stu{i}', f'stu{i}@yale.edu'))
+        conn.execute('INSERT INTO students (net_id, class_year) VALUES (?, 2026)', (f'stu{i}',))
+    conn.commit()
+    conn.close()
+    paths = make_uploads(work, uploads, size)
+
+    barrier = threading.Barrier(uploads)
+    failures = []
+
+    def upload(i):
+        with open(paths[i], 'rb') as f:
+            barrier.wait()
+            data = f.read() if mode == 'read' else f
+            if not database.update_student_resume(f'stu{i}', data, 'cv.pdf', max_size=size + 1024):
+                failures.append(i)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    threads = [threading.Thread(target=upload, args=(i,)) for i in range(uploads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{mode:<8}{uploads:>8}{elapsed:>10.2f}{peak / 2**20:>14.1f}{max_rss:>14.1f}{len(failures):>10}")
+    database._pool.reset()
+    shutil.rmtree(work)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uploads', type=int, default=50)
+    parser.add_argument('--size-mb', type=float, default=10)
+    parser.add_argument('--mode', choices=['read', 'stream'])
+    args = parser.parse_args()
+    size = int(args.size_mb * 1024 * 1024)
+
+    if args.mode:
+        run(args.mode, args.uploads, size)
+        return
+
+    print(f"{'mode':<8}{'uploads':>8}{'seconds':>10}{'peak heap MB':>14}{'max RSS MB':>14}{'failed':>10}")
+    sys.stdout.flush()
+    for mode in ('read', 'stream'):
+        subprocess.run([sys.executable, '-m', 'benchmarks.bench_upload', '--mode', mode,
+                        '--uploads', str(args.uploads), '--size-mb', str(args.size_mb)], check=True)
+
+
+if __name__ == '__main__':
+    main()
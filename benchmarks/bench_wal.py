@@ -0,0 +1,98 @@
+"""
+Reader latency while a large write is in progress.
+
+Reader threads repeatedly load the fellowship listing while writer threads
+upload 10 MB resumes and save preferences.  The benchmark runs once in the
+default rollback-journal mode and once with `enable_wal_mode()`, and reports
+reader latency and the number of failed writes for each.
+
+Usage:
+    python -m benchmarks.bench_wal [--seconds 5] [--readers 8] [--writers 4]
+"""
+import argparse
+import os
+import threading
+import time
+
+import database
+from benchmarks.common import create_database, seed, summarize
+
+
+def run(seconds, readers, writers, wal):
+    path = create_database()
+    fellowship_ids, students = seed(path, faculty=50, fellowships_per_lab=4, students=200)
+    if wal:
+        database.enable_wal_mode()
+
+    stop = threading.Event()
+    latencies = []
+    failures = []
+    writes = []
+    lock = threading.Lock()
+    resume = b'%PDF-1.4\n' + os.urandom(10 * 1024 * 1024)
+
+    def reader():
+        local = []
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                database.get_fellowship_information('fellowship')
+            except Exception as e:
+                with lock:
+                    failures.append(('read', e))
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    def writer(i):
+        n = 0
+        while not stop.is_set():
+            student = students[(i * 37 + n) % len(students)]
+            if n % 2 == 0:
+                ok = database.update_student_resume(student, resume, 'resume.pdf')
+                if not ok:
+                    with lock:
+                        failures.append(('resume', None))
+            else:
+                try:
+                    database.save_faculty_preferences(fellowship_ids[n % len(fellowship_ids)], students[:20])
+                except Exception as e:
+                    with lock:
+                        failures.append(('preferences', e))
+            n += 1
+        with lock:
+            writes.append(n)
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    database.disable_wal_mode()
+    database._pool.reset()
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return summarize(latencies), len(latencies), sum(writes), len(failures)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'mode':<10}{'reads':>8}{'writes':>8}{'failed':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for label, wal in (('rollback', False), ('wal', True)):
+        stats, reads, writes, failed = run(args.seconds, args.readers, args.writers, wal)
+        print(f"{label:<10}{reads:>8}{writes:>8}{failed:>8}"
+              f"{stats['p50']:>10.2f}{stats['p95']:>10.2f}{stats['p99']:>10.2f}{stats['max']:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
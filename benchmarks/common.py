@@ -0,0 +1,97 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Each benchmark builds a throwaway database from schema.sql, fills it with
+synthetic rows and points the `database` module at it.  Run the scripts from
+the repository root, e.g. `python -m benchmarks.bench_wal`.
+"""
+import os
+import sqlite3
+import statistics
+import tempfile
+
+import database
+import migrate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEMA_PATH = os.path.join(ROOT, 'schema.sql')
+
+
+def create_database(path=None):
+    """
+    Create an empty, fully migrated database from schema.sql and make it the active database.
+
+    Args:
+        path (str, optional): Where to create the file. Defaults to a new temp file.
+
+    Returns:
+        str: Path of the database file.
+    """
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix='.sqlite')
+        os.close(fd)
+        os.remove(path)
+    with open(SCHEMA_PATH) as f:
+        schema = f.read()
+    conn = sqlite3.connect(path)
+    conn.executescript(schema)
+    migrate.upgrade(conn)
+    conn.close()
+    database._DATABASE_URL = path
+    database._pool.reset()
+    return path
+
+
+def seed(path, faculty=10, fellowships_per_lab=5, students=100):
+    """
+    Fill a database with synthetic faculty, labs, fellowships and students.
+
+    Returns:
+        tuple[list[int], list[str]]: The fellowship ids and student net ids created.
+    """
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        'INSERT INTO users VALUES (?, ?, ?, ?, ?, ?)',
+        [(f'prof{i}', f'First{i}', f'Last{i}', f'prof{i}@yale.edu', 'x', 'faculty') for i in range(faculty)]
+        + [(f'stu{i}', f'Student{i}', f'Surname{i}', f'stu{i}@yale.edu', 'x', 'student') for i in range(students)]
+    )
+    conn.executemany('INSERT INTO faculty VALUES (?, ?)',
+                     [(f'prof{i}', f'Department {i % 7}') for i in range(faculty)])
+    conn.executemany('INSERT INTO students (net_id, class_year, major) VALUES (?, ?, ?)',
+                     [(f'stu{i}', 2025 + i % 4, f'Major {i % 11}') for i in range(students)])
+    conn.executemany(
+        'INSERT INTO labs (lab_num, lab_name, description, website, location, faculty_net_id) VALUES (?, ?, ?, ?, ?, ?)',
+        [(i + 1, f'Lab {i}', f'Research on topic {i}', '', f'Building {i % 9}', f'prof{i}') for i in range(faculty)]
+    )
+    rows = []
+    for lab in range(faculty):
+        for j in range(fellowships_per_lab):
+            n = lab * fellowships_per_lab + j
+            rows.append((n + 1, lab + 1, f'Fellowship {n}', '2025,2026',
+                         f'Summer research fellowship number {n}', f'2026-0{1 + n % 9}-01', 1000 + n % 5000, 1 + n % 3))
+    conn.executemany(
+        'INSERT INTO fellowships (fellowship_id, lab_num, name, class_years, description, deadline, stipend, capacity) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+    conn.commit()
+    conn.close()
+    return [r[0] for r in rows], [f'stu{i}' for i in range(students)]
+
+
+def percentile(samples, pct):
+    """Return the `pct` percentile of a list of numbers."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+def summarize(samples):
+    """Return mean/p50/p95/p99/max of a list of seconds, in milliseconds."""
+    return {
+        'mean': statistics.fmean(samples) * 1000 if samples else 0.0,
+        'p50': percentile(samples, 50) * 1000,
+        'p95': percentile(samples, 95) * 1000,
+        'p99': percentile(samples, 99) * 1000,
+        'max': max(samples) * 1000 if samples else 0.0,
+    }
@@ -0,0 +1,158 @@
+"""
+In-process cache for read-mostly catalog queries.
+
+`TTLCache` holds up to `maxsize` results for at most `ttl` seconds, evicting
+the least recently used entry when full.  Each entry carries tags naming the
+data it was built from (`'labs'`, `'faculty:abc12'`, `'fellowship:7'`), and
+writers call `invalidate(*tags)` after committing so exactly the affected
+entries are dropped; the TTL only bounds staleness from writes this process
+does not see (another server process, a script).
+
+A read that started before an invalidation does not store its result, so a
+query that raced a write cannot put the old rows back after the write
+invalidated them.
+
+Cached values are shared between callers and must not be modified.
+
+Classes:
+    - TTLCache: Size-bounded LRU + TTL cache with tag invalidation and stats.
+
+Functions:
+    - cached(cache, tags): Decorator caching a function's results in `cache`.
+"""
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    LRU cache whose entries also expire after `ttl` seconds.
+
+    Attributes:
+        stats (dict): Counts of `hits`, `misses`, `evictions` (LRU),
+            `expirations` (TTL) and `invalidations` (entries dropped by tag).
+    """
+    def __init__(self, maxsize=1024, ttl=60.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, tags, value)
+        self._by_tag = {}
+        self._generation = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Return the cached value for `key`, or `_MISSING`."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return _MISSING
+            if entry[0] <= self.clock():
+                self._remove(key)
+                self.stats['expirations'] += 1
+                self.stats['misses'] += 1
+                return _MISSING
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry[2]
+
+    def snapshot(self):
+        """Return the stats plus the current number of entries."""
+        with self._lock:
+            return dict(self.stats, size=len(self._entries))
+
+    def metric_lines(self, name):
+        """Return the stats as Prometheus metrics labelled cache=`name`."""
+        stats = self.snapshot()
+        lines = ['# TYPE labsatyale_cache_entries gauge', f'labsatyale_cache_entries{{cache="{name}"}} {stats.pop("size")}']
+        for stat, value in stats.items():
+            lines.append(f'# TYPE labsatyale_cache_{stat}_total counter')
+            lines.append(f'labsatyale_cache_{stat}_total{{cache="{name}"}} {value}')
+        return lines
+
+    def generation(self):
+        """Return a token that changes whenever anything is invalidated."""
+        return self._generation
+
+    def set(self, key, value, tags=(), generation=None):
+        """
+        Store `value` under `key`.
+
+        Args:
+            tags (iterable[str]): Tags `invalidate` can drop the entry by.
+            generation (int, optional): `generation()` from before the value was
+                read; if something was invalidated since, the value is not stored.
+        """
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            tags = frozenset(tags)
+            self._entries[key] = (self.clock() + self.ttl, tags, value)
+            for tag in tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+                self.stats['evictions'] += 1
+
+    def invalidate(self, *tags):
+        """Drop every entry carrying any of `tags`."""
+        with self._lock:
+            self._generation += 1
+            for tag in tags:
+                for key in list(self._by_tag.get(tag, ())):
+                    self._remove(key)
+                    self.stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._by_tag.clear()
+
+    def _remove(self, key):
+        _, tags, _ = self._entries.pop(key)
+        for tag in tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+
+def cached(cache, tags, scope=None):
+    """
+    Cache a function's results in `cache`, keyed by its name and arguments.
+
+    Args:
+        cache (TTLCache): Where to keep the results.
+        tags (callable): `tags(result, *args, **kwargs)` returns the tags of an entry.
+        scope (callable, optional): Returns a value added to every key, e.g. the
+            database path, so results from different databases never mix.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (fn.__name__, scope() if scope else None, args, tuple(sorted(kwargs.items())))
+            value = cache.get(key)
+            if value is not _MISSING:
+                return value
+            generation = cache.generation()
+            value = fn(*args, **kwargs)
+            # "Not found" is not cached: the row may be created at any moment.
+            if value is not None:
+                cache.set(key, value, tags(value, *args, **kwargs), generation)
+            return value
+        wrapper.uncached = fn
+        return wrapper
+    return decorator
@@ -1,11 +1,34 @@
-from sqlite3 import connect
-from contextlib import closing
-
-from werkzeug.security import check_password_hash, generate_password_hash
-
+import json
+import os
+import time
+import sqlite3
+
+import search
+from instrumentation import InstrumentedConnection, add_metrics_renderer
+from pagination import Sort, fetch_page
+from cache import TTLCache, cached
 from Users import Faculty, Labs, Fellowship, AuthUser, Application, Applicant
+from pool import ConnectionPool
+from resume_store import ResumeStore
+from writer import WriteQueue
 
 _DATABASE_URL = 'labsatyale.sqlite'
+_SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.sql')
+_RESUME_DIR = 'resumes'
+_POOL_SIZE = 8
+CACHE_SIZE = 1024
+CACHE_TTL = 60
+USER_CACHE_SIZE = 4096
+USER_CACHE_TTL = 30
+MATCH_RUNS_KEPT = 20
+_PRAGMAS = [('foreign_keys', 'ON')]
+_WAL_PRAGMAS = [
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('busy_timeout', 5000),
+    ('cache_size', -20000),
+    ('mmap_size', 268435456),
+]
 
 """
 Database access module for Labs at Yale.
@@ -15,67 +38,283 @@ database. It includes functions for fetching faculty, lab, and fellowship inform
 optionally filtered by a search query.
 
 Functions:
-    - get_faculty_information(q=None)
-    - get_labs_information(q=None)
-    - get_fellowship_information(q=None)
+    - get_faculty_information(q=None, sort=None, after=None, limit=None)
+    - get_labs_information(q=None, sort=None, after=None, limit=None)
+    - get_fellowship_information(q=None, sort=None, after=None, limit=None)
+
+The listings return a `pagination.Page`: a list that, when a `limit` is
+given, also carries the keyset cursor of the next page.
+
+Every function checks its connection out of a shared, per-thread
+`ConnectionPool` through `get_connection()` instead of opening its own.
+Writes go through `run_write()`, which hands them to a single `WriteQueue`
+thread once WAL mode has been turned on with `enable_wal_mode()`.
+
+The `iter_*` functions used by the exports (see export.py) are generators
+that yield rows from the open cursor and keep their connection until they
+are exhausted or closed.
+
+Searches use the FTS5 indexes from `search.py` once `ensure_search_index()`
+has installed them, and fall back to LIKE matching otherwise.
+
+The lab and faculty listings and fellowship lookups are cached in
+`catalog_cache` (see cache.py); code that writes users, faculty, labs or
+fellowships must call `invalidate_faculty` / `invalidate_fellowship` after
+committing.
 """
 
-def get_faculty_information(q = None):
+
+def connect(database):
+    """Open a connection whose queries are reported to the instrumentation layer."""
+    return sqlite3.connect(database, factory=InstrumentedConnection)
+
+
+def _connect():
+    return connect(_DATABASE_URL)
+
+
+_pool = ConnectionPool(_connect, size=_POOL_SIZE, pragmas=_PRAGMAS)
+_writer = None
+# Database files whose FTS5 search indexes are installed (see `ensure_search_index`).
+_search_ready = set()
+
+# Labs, faculty and fellowship details change rarely but are read on almost
+# every page. Writers invalidate what they change with `invalidate_faculty`
+# and `invalidate_fellowship`; see cache.py.
+catalog_cache = TTLCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL)
+add_metrics_renderer(lambda: catalog_cache.metric_lines('catalog'))
+
+# Logged-in users are loaded on every request; keep them briefly, and drop
+# them when their users row changes (`invalidate_user`).
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+add_metrics_renderer(lambda: user_cache.metric_lines('user'))
+
+
+def _catalog(tags):
+    return cached(catalog_cache, tags, scope=lambda: _DATABASE_URL)
+
+
+# (table, column, definition) for columns schema.sql gained after release.
+_ADDED_COLUMNS = [
+    ('students', 'resume_sha256', 'TEXT'),
+    ('students', 'resume_size', 'INTEGER'),
+    ('students', 'subscribed', 'INTEGER NOT NULL DEFAULT 0'),
+    ('email_outbox', 'notification_id', 'INTEGER'),
+    ('email_outbox', 'recipients', 'INTEGER'),
+    ('email_outbox', 'send_seconds', 'REAL'),
+    ('matching_state', 'version', 'INTEGER NOT NULL DEFAULT 0'),
+]
+
+
+def get_resume_store():
+    """Return the file store resumes are kept in."""
+    return ResumeStore(_RESUME_DIR)
+
+
+def get_connection():
+    """
+    Check a connection out of the shared pool.
+
+    Use as a context manager: `with get_connection() as conn: ...`.  Changes
+    that are not committed before the block exits are rolled back.
+    """
+    return _pool.connection()
+
+
+def configure_pool(size=None, pragmas=None):
+    """
+    Replace the shared pool with one using a new size and/or PRAGMA list.
+
+    Args:
+        size (int, optional): Maximum number of connections checked out at once.
+        pragmas (list[tuple[str, object]], optional): PRAGMAs applied to every new connection.
+    """
+    global _pool
+    _pool.reset()
+    _pool = ConnectionPool(
+        _connect,
+        size=size if size is not None else _pool.size,
+        pragmas=pragmas if pragmas is not None else _pool.pragmas,
+    )
+
+
+def get_pool_stats():
+    """Return the shared pool's opened/reused/waited counters."""
+    return _pool.stats()
+
+
+def enable_wal_mode(pragmas=None):
+    """
+    Switch the database to WAL mode and serialize writes through one writer thread.
+
+    In WAL mode readers keep reading the last committed snapshot while a write is
+    in progress, so a large resume upload or `save_matches` no longer blocks
+    `/fellowships` and `/labs`.
+
+    Args:
+        pragmas (list[tuple[str, object]], optional): Overrides for the default WAL
+            PRAGMAs (synchronous, busy_timeout, cache_size, mmap_size).
+    """
+    global _writer
+    wal_pragmas = dict(_WAL_PRAGMAS)
+    wal_pragmas.update(dict(pragmas or []))
+    all_pragmas = _PRAGMAS + list(wal_pragmas.items())
+    disable_wal_mode()
+    configure_pool(pragmas=all_pragmas)
+    _writer = WriteQueue(_connect, pragmas=all_pragmas)
+
+
+def disable_wal_mode():
+    """Stop the writer thread and go back to writing from the calling thread."""
+    global _writer
+    if _writer is not None:
+        _writer.stop()
+        _writer = None
+        configure_pool(pragmas=_PRAGMAS)
+
+
+def run_write(fn):
+    """
+    Run `fn(conn)` as one committed write.
+
+    With WAL mode on, the write runs on the writer thread; otherwise it runs on
+    the calling thread's pooled connection.  `fn` must not commit itself.
+
+    Args:
+        fn (callable): Function taking a sqlite3 connection.
+
+    Returns:
+        object: Whatever `fn` returned.
+    """
+    if _writer is not None:
+        return _writer.submit(fn)
+    with get_connection() as conn:
+        # Take the write lock before `fn` reads anything, as the writer thread
+        # does, so what `fn` checks cannot change before it writes.
+        if not conn.in_transaction:
+            conn.execute('BEGIN IMMEDIATE')
+        result = fn(conn)
+        conn.commit()
+        return result
+
+
+def ensure_schema():
+    """
+    Create any tables from schema.sql that the database does not have yet.
+
+    Every statement in schema.sql is `CREATE ... IF NOT EXISTS`, so existing
+    tables and their rows are left alone.  Columns added to existing tables
+    since (`_ADDED_COLUMNS`) are added with ALTER TABLE.
+    """
+    with open(_SCHEMA_PATH) as f:
+        schema = f.read()
+    with get_connection() as conn:
+        # Add new columns first: schema.sql may index them.
+        for table, column, definition in _ADDED_COLUMNS:
+            columns = {r[1] for r in conn.execute(f'PRAGMA table_info({table})')}
+            if columns and column not in columns:
+                conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+        conn.commit()
+        conn.executescript(schema)
+
+
+def ensure_search_index():
+    """
+    Install the full-text search indexes if this SQLite build supports FTS5.
+
+    Returns:
+        bool: True if searches will use the FTS5 indexes, False if they use LIKE.
+    """
+    with get_connection() as conn:
+        ready = search.install(conn)
+    if ready:
+        _search_ready.add(_DATABASE_URL)
+    else:
+        _search_ready.discard(_DATABASE_URL)
+    return ready
+
+
+def _search_match(q):
+    if not q or _DATABASE_URL not in _search_ready:
+        return None
+    return search.match_expression(q)
+
+
+# Each key matches an index from migrations/0004 or 0008, so every sort is read in order.
+FACULTY_SORTS = {
+    'name': Sort('name', "users.last_name || ' ' || users.first_name", 'users.net_id'),
+}
+LAB_SORTS = {
+    'name': Sort('name', 'l.lab_name', 'l.lab_num'),
+}
+FELLOWSHIP_SORTS = {
+    'newest': Sort('newest', None, 'f.fellowship_id', descending=True),
+    'deadline': Sort('deadline', "IFNULL(f.deadline, '9999-12-31')", 'f.fellowship_id'),
+    'stipend': Sort('stipend', 'IFNULL(f.stipend, -1)', 'f.fellowship_id', descending=True),
+    'applications': Sort('applications', 'f.application_count', 'f.fellowship_id', descending=True),
+}
+SAVED_SORT = Sort('saved', 'saved_fellowships.saved_at', 'saved_fellowships.fellowship_id', descending=True)
+
+
+def _pick_sort(sorts, sort, relevance=None):
+    """Return the named sort, the relevance sort for full-text searches, or the first one."""
+    if sort in sorts:
+        return sorts[sort]
+    if relevance is not None:
+        return relevance
+    return next(iter(sorts.values()))
+
+
+@_catalog(lambda result, *args, **kwargs: ('faculty',))
+def get_faculty_information(q = None, sort = None, after = None, limit = None):
     """
        Retrieve faculty information from the database.
 
        Args:
            q (str, optional): A search query string. If provided, results will be filtered
                by matching against faculty email, department, first name, or last name.
-               The search is case-insensitive and supports partial matches.
+               The search is case-insensitive and supports partial matches. With the
+               FTS5 index installed, each word is prefix-matched and results are
+               ranked by relevance.
+           sort (str, optional): A key of `FACULTY_SORTS`.
+           after (str, optional): Cursor of the previous page (`Page.next_cursor`).
+           limit (int, optional): Page size. None returns every row.
 
        Returns:
-           list[Faculty]: A list of `Faculty` objects containing:
+           Page[Faculty]: A list of `Faculty` objects containing:
                - net_id
                - first_name
                - last_name
                - email
                - department
        """
-    faculty = []
-    with closing(connect(_DATABASE_URL)) as conn:
-        cur = conn.cursor()
-        query = """
-        SELECT 
-            users.net_id, 
-            users.first_name, 
-            users.last_name, 
-            users.email, 
-            faculty.department
-        FROM users
-        JOIN faculty 
-            ON users.net_id = faculty.net_id
-        WHERE role = 'faculty'
-        """
-        params = []
-        if q != None: 
-            query += ''' AND (
-            LOWER(users.email) LIKE ?
+    columns = '''users.net_id, users.first_name, users.last_name, users.email, faculty.department'''
+    tables = '''users JOIN faculty ON users.net_id = faculty.net_id'''
+    conditions = ["role = 'faculty'"]
+    params = []
+    relevance = None
+    match = _search_match(q)
+    if match:
+        tables = '''faculty_fts
+            JOIN users ON users.net_id = faculty_fts.net_id
+            JOIN faculty ON users.net_id = faculty.net_id'''
+        conditions.append('faculty_fts MATCH ?')
+        params = [match]
+        relevance = Sort('relevance', 'bm25(faculty_fts, 2.0, 1.0, 5.0, 5.0)', 'faculty.net_id')
+    elif q:
+        conditions.append('''LOWER(users.email) LIKE ?
             OR LOWER(faculty.department) LIKE ?
             OR LOWER(users.first_name) LIKE ?
-            OR LOWER(users.last_name) LIKE ?)
-            '''
+            OR LOWER(users.last_name) LIKE ?''')
+        w = f"%{q.lower()}%"
+        params = [w, w, w, w]
 
-            w = f"%{q.lower()}%"
-    
-            params = [w, w, w, w]
-            cur.execute(query, params)
-        else:
-            cur.execute(query)
-        result = cur.fetchall()
+    with get_connection() as conn:
+        return fetch_page(conn.cursor(), columns, tables, conditions, params,
+                          _pick_sort(FACULTY_SORTS, sort, relevance), after, limit, Faculty)
 
-        for r in result:
-            f = Faculty(r[0], r[1], r[2], r[3], r[4])
-            faculty.append(f)
-
-    return faculty
-
-def get_labs_information(q = None):
+@_catalog(lambda result, *args, **kwargs: ('labs',))
+def get_labs_information(q = None, sort = None, after = None, limit = None):
     """
         Retrieve lab information from the database.
 
@@ -83,9 +322,14 @@ def get_labs_information(q = None):
             q (str, optional): A search query string. If provided, results will be filtered
                 by matching against lab name, email, department, location, description,
                 or faculty name. The search is case-insensitive and supports partial matches.
+                With the FTS5 index installed, each word is prefix-matched and results are
+                ranked by relevance.
+            sort (str, optional): A key of `LAB_SORTS`.
+            after (str, optional): Cursor of the previous page (`Page.next_cursor`).
+            limit (int, optional): Page size. None returns every row.
 
         Returns:
-            list[Labs]: A list of `Labs` objects containing:
+            Page[Labs]: A list of `Labs` objects containing:
                 - lab_num
                 - lab_name
                 - faculty_name
@@ -95,48 +339,39 @@ def get_labs_information(q = None):
                 - website
                 - location
         """
-    labs = []
-    with closing(connect(_DATABASE_URL)) as conn:
-        cur = conn.cursor()
-        query = '''SELECT l.lab_num , l.lab_name,
-         (u.first_name || ' ' || u.last_name) AS faculty_name, u.email, f.department,
-         l.description, l.website, l.location
-            FROM labs l
-                JOIN faculty f 
-                    ON l.faculty_net_id=f.net_id 
-                JOIN Users u 
-                    ON f.net_id=u.net_id
-                '''
-        
-        params = []
-        if q != None: 
-            query += '''
-            WHERE LOWER(l.lab_name) LIKE ?
+    columns = '''l.lab_num, l.lab_name,
+        (u.first_name || ' ' || u.last_name) AS faculty_name, u.email, f.department,
+        l.description, l.website, l.location'''
+    tables = '''labs l
+        JOIN faculty f ON l.faculty_net_id = f.net_id
+        JOIN users u ON f.net_id = u.net_id'''
+    conditions = []
+    params = []
+    relevance = None
+    match = _search_match(q)
+    if match:
+        tables = '''labs_fts
+        JOIN labs l ON l.lab_num = labs_fts.rowid
+        JOIN faculty f ON l.faculty_net_id = f.net_id
+        JOIN users u ON f.net_id = u.net_id'''
+        conditions.append('labs_fts MATCH ?')
+        params = [match]
+        relevance = Sort('relevance', 'bm25(labs_fts, 10.0, 2.0, 2.0, 1.0, 1.0, 5.0)', 'l.lab_num')
+    elif q:
+        conditions.append('''LOWER(l.lab_name) LIKE ?
             OR LOWER(u.email) LIKE ?
             OR LOWER(f.department) LIKE ?
             OR LOWER(l.location) LIKE ?
-
             OR LOWER(l.description) LIKE ?
-            OR LOWER(u.first_name || ' ' || u.last_name) LIKE ?
-
-            '''
-
-            w = f"%{q.lower()}%"
-    
-            params = [w, w, w, w, w, w]
-            cur.execute(query, params)
-        else:
-            cur.execute(query)
-        result = cur.fetchall()
-
-        for r in result:
-            # print(r)
-            l = Labs(r[0], r[1], r[2], r[3], r[4], r[5], r[6], r[7])
-            labs.append(l)
+            OR LOWER(u.first_name || ' ' || u.last_name) LIKE ?''')
+        w = f"%{q.lower()}%"
+        params = [w, w, w, w, w, w]
 
-    return labs
+    with get_connection() as conn:
+        return fetch_page(conn.cursor(), columns, tables, conditions, params,
+                          _pick_sort(LAB_SORTS, sort, relevance), after, limit, Labs)
 
-def get_fellowship_information(q = None):
+def get_fellowship_information(q = None, sort = None, after = None, limit = None):
     """
         Retrieve fellowship information from the database.
 
@@ -144,9 +379,16 @@ def get_fellowship_information(q = None):
             q (str, optional): A search query string. If provided, results will be filtered
                 by matching against fellowship name, description, class years, lab name,
                 or faculty name. The search is case-insensitive and supports partial matches.
+                With the FTS5 index installed, each word is prefix-matched and results are
+                ranked by relevance.
+            sort (str, optional): A key of `FELLOWSHIP_SORTS`: newest (the default
+                without a search), deadline, stipend or applications. Full-text
+                searches default to relevance.
+            after (str, optional): Cursor of the previous page (`Page.next_cursor`).
+            limit (int, optional): Page size. None returns every row.
 
         Returns:
-            list[Fellowship]: A list of `Fellowship` objects containing:
+            Page[Fellowship]: A list of `Fellowship` objects containing:
                 - fellowship_id
                 - name
                 - lab_name
@@ -155,95 +397,99 @@ def get_fellowship_information(q = None):
                 - description
                 - deadline
                 - stipend
+                - application_count
         """
-    fellowship = []
-    with closing(connect(_DATABASE_URL)) as conn:
-        cur = conn.cursor()
-
-        query = '''SELECT f.fellowship_id, f.name, l.lab_name, 
-        (u.first_name || ' ' || u.last_name) AS faculty_name, 
-        f.class_years, f.description, f.deadline, f.stipend,
-        COUNT(a.application_id) AS application_count
-         FROM fellowships f 
-        JOIN Labs l 
-            ON f.lab_num=l.lab_num
-        JOIN Users u
-            ON l.faculty_net_id=u.net_id
-        LEFT JOIN Applications a
-            ON f.fellowship_id = a.fellowship_id
-        '''
-
-        params = []
-        if q != None: 
-            query += '''
-            WHERE LOWER(f.name) LIKE ?
+    # application_count is kept up to date by triggers on applications
+    # (migrations/0003), so no listing has to count applications.
+    columns = '''f.fellowship_id, f.name, l.lab_name,
+        (u.first_name || ' ' || u.last_name) AS faculty_name,
+        f.class_years, f.description, f.deadline, f.stipend, f.application_count'''
+    tables = '''fellowships f
+        JOIN labs l ON f.lab_num = l.lab_num
+        JOIN users u ON l.faculty_net_id = u.net_id'''
+    conditions = []
+    params = []
+    relevance = None
+    match = _search_match(q)
+    if match:
+        tables = '''fellowships_fts
+        JOIN fellowships f ON f.fellowship_id = fellowships_fts.rowid
+        JOIN labs l ON f.lab_num = l.lab_num
+        JOIN users u ON l.faculty_net_id = u.net_id'''
+        conditions.append('fellowships_fts MATCH ?')
+        params = [match]
+        relevance = Sort('relevance', 'bm25(fellowships_fts, 10.0, 1.0, 2.0, 5.0, 5.0)', 'f.fellowship_id')
+    elif q:
+        conditions.append('''LOWER(f.name) LIKE ?
             OR LOWER(f.description) LIKE ?
             OR LOWER(f.class_years) LIKE ?
             OR LOWER(l.lab_name) LIKE ?
-            OR LOWER(u.first_name || ' ' || u.last_name) LIKE ?
-
-            '''
-
-            w = f"%{q.lower()}%"
-            query += '''
-                  GROUP BY
-                      f.fellowship_id,
-                      f.name,
-                      l.lab_name,
-                      faculty_name,
-                      f.class_years,
-                      f.description,
-                      f.deadline,
-                      f.stipend
-                  '''
-
-            params = [w, w, w, w, w]
-            cur.execute(query, params)
-        else:
-            cur.execute(query)
-        result = cur.fetchall()
-        for r in result:
-            f = Fellowship(r[0], r[1], r[2], r[3], r[4], r[5], r[6], r[7], r[8])
-            fellowship.append(f)
-    return fellowship
+            OR LOWER(u.first_name || ' ' || u.last_name) LIKE ?''')
+        w = f"%{q.lower()}%"
+        params = [w, w, w, w, w]
 
+    with get_connection() as conn:
+        return fetch_page(conn.cursor(), columns, tables, conditions, params,
+                          _pick_sort(FELLOWSHIP_SORTS, sort, relevance), after, limit, Fellowship)
 
-def get_user_by_netid_password(q=[]):
-    user = None
-    with closing(connect(_DATABASE_URL)) as conn:
-        cur = conn.cursor()
 
-        if q != [] and len(q) == 2:
-            query = '''SELECT u.net_id, u.first_name, 
-            u.last_name, u.email, u.role, u.password_hash 
-            FROM Users u
-            WHERE u.net_id = ?'''
-            net_id, password = q
-            params = [net_id]
-            cur.execute(query, params)
-            result = cur.fetchall()
-            if len(result) != 1:
-                return None
-            else:
-                net_id, first_name, last_name, email, role, stored_hash= result[0]
-                if check_password_hash(stored_hash, password):
-                    user = AuthUser(net_id=net_id, first_name=first_name, last_name=last_name, email=email, role=role)
-                    return user
-                else:
-                    return None
+def get_user_credentials(net_id):
+    """
+    Look up a user and their password hash for a login check.
+
+    The hash itself is checked by `auth.authenticate`, off the request thread.
+
+    Args:
+        net_id (str): The net id being logged in.
+
+    Returns:
+        tuple[AuthUser, str] | None: The user and their stored hash, or None if
+        there is no such user.
+    """
+    with get_connection() as conn:
+        row = conn.execute(
+            'SELECT net_id, first_name, last_name, email, role, password_hash FROM users WHERE net_id = ?',
+            (net_id,)
+        ).fetchone()
+    if row is None:
+        return None
+    user = AuthUser(net_id=row[0], first_name=row[1], last_name=row[2], email=row[3], role=row[4])
+    return user, row[5]
+
+
+def update_password_hash(net_id, password_hash, old_hash=None):
+    """
+    Store a new password hash for a user.
+
+    Args:
+        net_id (str): The user's net id.
+        password_hash (str): The new hash.
+        old_hash (str, optional): Only replace this hash. A rehash after login
+            passes the hash it checked, so it cannot undo a password change
+            that committed in the meantime.
+
+    Returns:
+        bool: True if the hash was replaced.
+    """
+    def write(conn):
+        if old_hash is None:
+            cur = conn.execute('UPDATE users SET password_hash = ? WHERE net_id = ?', (password_hash, net_id))
         else:
-            return None
+            cur = conn.execute('UPDATE users SET password_hash = ? WHERE net_id = ? AND password_hash = ?',
+                               (password_hash, net_id, old_hash))
+        return cur.rowcount == 1
 
+    return run_write(write)
 
 
 def get_user_by_netid(q):
     user = None
-    with closing(connect(_DATABASE_URL)) as conn:
+    with get_connection() as conn:
         cur = conn.cursor()
 
         if q and len(q) == 1:
-            query = '''SELECT u.net_id, u.first_name, 
-            u.last_name, u.email, u.role, u.password_hash 
+            query = '''SELECT u.net_id, u.first_name,
+            u.last_name, u.email, u.role
             FROM Users u
             WHERE u.net_id = ?'''
             net_id = q[0]
@@ -258,9 +504,41 @@ def get_user_by_netid(q):
                 return None
 
 
+def get_session_user(net_id):
+    """
+    Load the logged-in user for a request, from `user_cache` when possible.
+
+    Only the columns `AuthUser` needs are read, and a fresh `AuthUser` is
+    built on every call so a request can change its copy safely.
+
+    Args:
+        net_id (str): The user id stored in the session.
+
+    Returns:
+        AuthUser | None: The user, or None if they no longer exist.
+    """
+    row = _session_user_row(net_id)
+    if row is None:
+        return None
+    return AuthUser(net_id=row[0], first_name=row[1], last_name=row[2], email=row[3], role=row[4])
+
+
+@cached(user_cache, lambda row, net_id: (f'user:{net_id}',), scope=lambda: _DATABASE_URL)
+def _session_user_row(net_id):
+    with get_connection() as conn:
+        return conn.execute(
+            'SELECT net_id, first_name, last_name, email, role FROM users WHERE net_id = ?', (net_id,)
+        ).fetchone()
+
+
+def invalidate_user(net_id):
+    """Drop a user's cached session row. Call after committing a change to their users row."""
+    user_cache.invalidate(f'user:{net_id}')
+
+
 def get_user_by_email(q):
     user = None
-    with closing(connect(_DATABASE_URL)) as conn:
+    with get_connection() as conn:
         cur = conn.cursor()
 
         if q and len(q) == 1:
@@ -280,6 +558,7 @@ def get_user_by_email(q):
                 return None
 
 
+@_catalog(lambda result, faculty_net_id: (f'faculty:{faculty_net_id}',))
 def get_fellowships_by_faculty(faculty_net_id):
     """
     Retrieve all fellowships for a given faculty along with faculty name.
@@ -304,7 +583,7 @@ def get_fellowships_by_faculty(faculty_net_id):
         ORDER BY f.deadline DESC
     '''
 
-    with closing(connect(_DATABASE_URL)) as conn:
+    with get_connection() as conn:
         cur = conn.cursor()
         cur.execute(query, (faculty_net_id,))
         results = cur.fetchall()
@@ -326,6 +605,52 @@ def get_fellowships_by_faculty(faculty_net_id):
     return fellowships
 
 
+def _stream(query, params=()):
+    """
+    Yield the rows of `query` straight from the cursor.
+
+    The pooled connection stays checked out until the last row has been
+    read or the generator is closed, so a slow consumer holds one of the
+    pool's slots; outside WAL mode it also holds a read lock that keeps
+    writers waiting.
+    """
+    with get_connection() as conn:
+        cur = conn.execute(query, params)
+        try:
+            yield from cur
+        finally:
+            cur.close()
+
+
+APPLICANT_EXPORT_COLUMNS = ['application_id', 'net_id', 'first_name', 'last_name', 'email',
+                            'major', 'class_year', 'status', 'applied_at', 'questions']
+
+
+def iter_fellowship_applicants(faculty_net_id, fellowship_id):
+    """
+    Stream the applications to a fellowship of a faculty member, newest first.
+
+    Args:
+        faculty_net_id (str): Net ID of the faculty.
+        fellowship_id (int): ID of the fellowship.
+
+    Yields:
+        tuple: One row per application, in APPLICANT_EXPORT_COLUMNS order.
+    """
+    return _stream('''
+        SELECT a.application_id, s.net_id, su.first_name, su.last_name, su.email,
+               s.major, s.class_year, a.status, a.applied_at, a.questions
+        FROM applications a
+        JOIN students s ON a.student_net_id = s.net_id
+        JOIN users su ON s.net_id = su.net_id
+        JOIN fellowships f ON a.fellowship_id = f.fellowship_id
+        JOIN labs l ON f.lab_num = l.lab_num
+        WHERE f.fellowship_id = ?
+          AND l.faculty_net_id = ?
+        ORDER BY a.applied_at DESC
+    ''', (fellowship_id, faculty_net_id))
+
+
 # get applicant by faculty id and fellowship id
 def get_fellowship_applicants(faculty_net_id, fellowship_id):
     """
@@ -353,7 +678,7 @@ def get_fellowship_applicants(faculty_net_id, fellowship_id):
         ORDER BY a.applied_at DESC
     '''
 
-    with closing(connect(_DATABASE_URL)) as conn:
+    with get_connection() as conn:
         cur = conn.cursor()
         cur.execute(query, (fellowship_id, faculty_net_id))
         results = cur.fetchall()
@@ -376,7 +701,87 @@ def get_fellowship_applicants(faculty_net_id, fellowship_id):
     return applicants
 
 
+def get_faculty_fellowship_details(faculty_net_id):
+    """
+    Load applicants, rankings and matches for every fellowship of a faculty member.
+
+    Uses three set-based queries on one connection however many fellowships
+    the faculty member has.  Applicants come back in the faculty's ranking
+    order (unranked applicants last, newest first), so callers do not sort.
+
+    Args:
+        faculty_net_id (str): Net ID of the faculty.
+
+    Returns:
+        dict[int, dict]: fellowship_id -> {'applicants': List[Applicant],
+            'preferences': {student_net_id: rank}, 'matched_students': [net_ids]}
+            for every fellowship of the faculty member.
+    """
+    details = {}
+
+    def entry(fellowship_id):
+        if fellowship_id not in details:
+            details[fellowship_id] = {'applicants': [], 'preferences': {}, 'matched_students': []}
+        return details[fellowship_id]
+
+    faculty_fellowships = '''
+        SELECT f.fellowship_id
+        FROM fellowships f
+        JOIN labs l ON f.lab_num = l.lab_num
+        WHERE l.faculty_net_id = ?
+    '''
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f'''
+            SELECT a.fellowship_id, a.application_id, s.net_id, su.first_name, su.last_name, su.email,
+                   s.major, s.class_year, a.status, a.applied_at, a.questions
+            FROM applications a
+            JOIN students s ON a.student_net_id = s.net_id
+            JOIN users su ON s.net_id = su.net_id
+            LEFT JOIN faculty_preferences fp
+                   ON fp.fellowship_id = a.fellowship_id AND fp.student_net_id = a.student_net_id
+            WHERE a.fellowship_id IN ({faculty_fellowships})
+            ORDER BY a.fellowship_id, fp.preference_rank IS NULL, fp.preference_rank, a.applied_at DESC
+        ''', (faculty_net_id,))
+        for r in cur:
+            entry(r[0])['applicants'].append(Applicant(
+                application_id=r[1],
+                student_net_id=r[2],
+                student_first_name=r[3],
+                student_last_name=r[4],
+                email=r[5],
+                major=r[6],
+                class_year=r[7],
+                status=r[8],
+                applied_at=r[9],
+                questions=r[10]
+            ))
+
+        cur.execute(f'''
+            SELECT fellowship_id, student_net_id, preference_rank
+            FROM faculty_preferences
+            WHERE fellowship_id IN ({faculty_fellowships})
+            ORDER BY fellowship_id, preference_rank
+        ''', (faculty_net_id,))
+        for fellowship_id, student_net_id, rank in cur:
+            entry(fellowship_id)['preferences'][student_net_id] = rank
+
+        cur.execute(f'''
+            SELECT fellowship_id, student_net_id
+            FROM matches
+            WHERE match_run_id = (SELECT MAX(match_run_id) FROM match_runs)
+                AND fellowship_id IN ({faculty_fellowships})
+            ORDER BY fellowship_id, match_id
+        ''', (faculty_net_id,))
+        for fellowship_id, student_net_id in cur:
+            entry(fellowship_id)['matched_students'].append(student_net_id)
+
+    return details
+
+
 # get fellowship by id
+@_catalog(lambda result, fellowship_id: (f'fellowship:{fellowship_id}',))
 def get_fellowship_by_id(fellowship_id):
     """
     Retrieve a single fellowship from the database by its ID.
@@ -387,7 +792,7 @@ def get_fellowship_by_id(fellowship_id):
     Returns:
         Fellowship | None: A `Fellowship` object if found, else None.
     """
-    with closing(connect(_DATABASE_URL)) as conn:
+    with get_connection() as conn:
         cur = conn.cursor()
 
         query = '''
@@ -421,7 +826,7 @@ def get_student_applications(student_net_id):
     """
     applications = []
 
-    with closing(connect(_DATABASE_URL)) as conn:
+    with get_connection() as conn:
         cur = conn.cursor()
 
         query = '''
@@ -463,90 +868,209 @@ def get_student_applications(student_net_id):
 
 def get_student_resume(student_net_id):
     """
-    Retrieve resume data and filename for a student
+    Retrieve resume metadata for a student
     Args:
         student_net_id: Net ID of the student
     Returns:
-        dict: Contains 'data' (BLOB), 'filename' (str), and 'uploaded_at' (str), or None if no resume
+        dict: Contains 'filename' (str), 'uploaded_at' (str), 'sha256' (str),
+        'size' (int) and 'path' (file in the resume store), or None if no resume.
+        Resumes not yet moved out of the table by `move_resume_blobs` have no
+        'sha256'/'path' and carry their contents in 'data' instead.
     """
-    with closing(connect(_DATABASE_URL)) as conn:
+    with get_connection() as conn:
         cur = conn.cursor()
 
         query = '''
-            SELECT resume_data, resume_filename, resume_uploaded_at
+            SELECT resume_sha256, resume_size, resume_filename, resume_uploaded_at,
+                   resume_data IS NOT NULL
             FROM students
             WHERE net_id = ?
         '''
 
         cur.execute(query, (student_net_id,))
         result = cur.fetchone()
-        if result and result[0]:  
-            return {
-                'data': result[0],
-                'filename': result[1],
-                'uploaded_at': result[2]
-            }
+        if not result:
+            return None
+        sha256, size, filename, uploaded_at, has_blob = result
+        info = {
+            'sha256': sha256,
+            'size': size,
+            'filename': filename,
+            'uploaded_at': uploaded_at,
+            'path': None,
+            'data': None,
+        }
+        if sha256:
+            info['path'] = get_resume_store().path(sha256)
+            return info
+        if has_blob:
+            cur.execute('SELECT resume_data FROM students WHERE net_id = ?', (student_net_id,))
+            info['data'] = cur.fetchone()[0]
+            info['size'] = len(info['data'])
+            return info
         return None
 
-def update_student_resume(student_net_id, resume_data, resume_filename):
+def update_student_resume(student_net_id, resume_data, resume_filename, max_size=None):
     """
     Update or insert a student's resume.
+
+    The file goes into the resume store; the table only records its digest.
+    A file-like `resume_data` is streamed into the store in chunks.
     Args:
         student_net_id: Net ID of the student
-        resume_data : PDF file data
+        resume_data : PDF file data, or a file-like object to read it from
         resume_filename : Original filename
+        max_size : Largest accepted size in bytes (streamed uploads only)
     Returns:
         bool: True if successful, False otherwise.
+    Raises:
+        InvalidResume: If a streamed upload is too large or not a PDF.
     """
     from datetime import datetime
 
-    with closing(connect(_DATABASE_URL)) as conn:
-        cur = conn.cursor()
+    try:
+        if hasattr(resume_data, 'read'):
+            sha256, size = get_resume_store().put_stream(resume_data, max_size=max_size)
+        else:
+            sha256, size = get_resume_store().put(resume_data)
+    except OSError as e:
+        print(f"Error storing resume: {e}")
+        return False
 
-        try:
-            cur.execute('''
+    def write(conn):
+        conn.execute('''
+            UPDATE students
+            SET resume_data = NULL, resume_sha256 = ?, resume_size = ?,
+                resume_filename = ?, resume_uploaded_at = ?
+            WHERE net_id = ?
+        ''', (sha256, size, resume_filename, datetime.now().isoformat(), student_net_id))
+
+    try:
+        run_write(write)
+        return True
+    except Exception as e:
+        print(f"Error updating resume: {e}")
+        return False
+
+def move_resume_blobs(batch_size=50):
+    """
+    Move resumes still stored inline in `students.resume_data` into the resume store.
+
+    Works through the table `batch_size` rows at a time, committing after each
+    batch, so it can be stopped and rerun safely.
+
+    Args:
+        batch_size (int): Rows moved per transaction.
+
+    Yields:
+        int: Number of resumes moved in each batch.
+    """
+    store = get_resume_store()
+    while True:
+        with get_connection() as conn:
+            rows = conn.execute('''
+                SELECT net_id, resume_data FROM students
+                WHERE resume_data IS NOT NULL
+                LIMIT ?
+            ''', (batch_size,)).fetchall()
+        if not rows:
+            return
+        moved = [(*store.put(data), net_id) for net_id, data in rows]
+        del rows
+
+        def write(conn):
+            conn.executemany('''
                 UPDATE students
-                SET resume_data = ?, resume_filename = ?, resume_uploaded_at = ?
+                SET resume_sha256 = ?, resume_size = ?, resume_data = NULL
                 WHERE net_id = ?
-            ''', (resume_data, resume_filename, datetime.now().isoformat(), student_net_id))
+            ''', moved)
 
-            conn.commit()
-            return True
-        except Exception as e:
-            print(f"Error updating resume: {e}")
-            return False
+        run_write(write)
+        yield len(moved)
 
-def save_student_preferences(student_net_id, ranked_fellowship_ids):
+def prune_resume_files(min_age=3600):
     """
-    Save student's ranked preference list 
+    Delete stored resume files that no student refers to any more.
+
+    Args:
+        min_age (float): Files written or re-uploaded within this many seconds
+            are kept, so an upload that has stored its file but not yet
+            committed its row is not pruned.
+
+    Returns:
+        int: Number of files deleted.
     """
-    try:
-        with closing(connect(_DATABASE_URL)) as conn:
-            cur = conn.cursor()
+    store = get_resume_store()
+    with get_connection() as conn:
+        referenced = {r[0] for r in conn.execute(
+            'SELECT DISTINCT resume_sha256 FROM students WHERE resume_sha256 IS NOT NULL')}
+    removed = 0
+    for digest in list(store.digests()):
+        if digest not in referenced and store.age(digest) >= min_age:
+            store.delete(digest)
+            removed += 1
+    return removed
+
+def _save_ranking(conn, table, owner_column, owner, item_column, ranked_items):
+    """
+    Bring one owner's stored ranking in line with `ranked_items`, touching only the rows that differ.
 
-            # Delete existing preferences
-            cur.execute('DELETE FROM student_preferences WHERE student_net_id = ?', (student_net_id,))
+    Rows that left the ranking are deleted and new ones inserted.  Rows that
+    moved are updated in two steps, first to the negated new rank and then
+    back, so no intermediate state violates UNIQUE(owner, preference_rank)
+    while ranks are swapped or shifted.  Each step is one `executemany` (or
+    one UPDATE), all inside the caller's transaction.
 
-            # Insert new preferences
-            for rank, fellowship_id in enumerate(ranked_fellowship_ids, 1):
-                cur.execute('''
-                    INSERT INTO student_preferences (student_net_id, fellowship_id, preference_rank)
-                    VALUES (?, ?, ?)
-                ''', (student_net_id, fellowship_id, rank))
-                # print(f"DEBUG: Inserted preference - Student: {student_net_id}, Fellowship: {fellowship_id}, Rank: {rank}")
+    Args:
+        conn (sqlite3.Connection): Connection inside a write transaction.
+        table (str): `student_preferences` or `faculty_preferences`.
+        owner_column (str): Column identifying whose ranking it is.
+        owner: That column's value.
+        item_column (str): Column holding the ranked items.
+        ranked_items (list): Items, best first. Repeats after the first are ignored.
+
+    Returns:
+        dict: `added` [(item, rank)], `removed` [item] and `moved`
+            [(item, old_rank, new_rank)]; all empty if nothing changed.
+    """
+    new = {}
+    for item in ranked_items:
+        new.setdefault(item, len(new) + 1)
+    old = dict(conn.execute(f'SELECT {item_column}, preference_rank FROM {table} WHERE {owner_column} = ?',
+                            (owner,)))
+
+    removed = [item for item in old if item not in new]
+    added = [(item, rank) for item, rank in new.items() if item not in old]
+    moved = [(item, old[item], rank) for item, rank in new.items() if item in old and old[item] != rank]
+
+    conn.executemany(f'DELETE FROM {table} WHERE {owner_column} = ? AND {item_column} = ?',
+                     [(owner, item) for item in removed])
+    if moved:
+        conn.executemany(f'UPDATE {table} SET preference_rank = ? WHERE {owner_column} = ? AND {item_column} = ?',
+                         [(-rank, owner, item) for item, _, rank in moved])
+        conn.execute(f'UPDATE {table} SET preference_rank = -preference_rank '
+                     f'WHERE {owner_column} = ? AND preference_rank < 0', (owner,))
+    conn.executemany(f'INSERT INTO {table} ({owner_column}, {item_column}, preference_rank) VALUES (?, ?, ?)',
+                     [(owner, item, rank) for item, rank in added])
+    return {'added': added, 'removed': removed, 'moved': moved}
+
+
+def save_student_preferences(student_net_id, ranked_fellowship_ids):
+    """
+    Save student's ranked preference list, writing only the rows that changed.
+
+    Returns:
+        dict: What changed (see `_save_ranking`).
+    """
+    return run_write(lambda conn: _save_ranking(conn, 'student_preferences', 'student_net_id', student_net_id,
+                                                'fellowship_id', ranked_fellowship_ids))
 
-            conn.commit()
-            # print(f"DEBUG: Committed {len(ranked_fellowship_ids)} preferences for {student_net_id}")
-    except Exception as e:
-        print(f"ERROR saving student preferences: {e}")
-        import traceback
-        traceback.print_exc()
 
 def get_student_preferences(student_net_id):
     """
     Get student's ranked preference list.
     """
-    with closing(connect(_DATABASE_URL)) as conn:
+    with get_connection() as conn:
         cur = conn.cursor()
         cur.execute('''
             SELECT fellowship_id, preference_rank
@@ -558,27 +1082,20 @@ def get_student_preferences(student_net_id):
 
 def save_faculty_preferences(fellowship_id, ranked_student_ids):
     """
-    Save faculty's ranked preference list for a fellowship
-    """
-    with closing(connect(_DATABASE_URL)) as conn:
-        cur = conn.cursor()
+    Save faculty's ranked preference list for a fellowship, writing only the rows that changed.
 
-        # Delete existing preferences
-        cur.execute('DELETE FROM faculty_preferences WHERE fellowship_id = ?', (fellowship_id,))
-        # Insert new preferences
-        for rank, student_net_id in enumerate(ranked_student_ids, 1):
-            cur.execute('''
-                INSERT INTO faculty_preferences (fellowship_id, student_net_id, preference_rank)
-                VALUES (?, ?, ?)
-            ''', (fellowship_id, student_net_id, rank))
-        conn.commit()
+    Returns:
+        dict: What changed (see `_save_ranking`).
+    """
+    return run_write(lambda conn: _save_ranking(conn, 'faculty_preferences', 'fellowship_id', fellowship_id,
+                                                'student_net_id', ranked_student_ids))
 
 
 def get_faculty_preferences(fellowship_id):
     """
     Get faculty's ranked preference list for a fellowship.
     """
-    with closing(connect(_DATABASE_URL)) as conn:
+    with get_connection() as conn:
         cur = conn.cursor()
         cur.execute('''
             SELECT student_net_id, preference_rank
@@ -589,8 +1106,42 @@ def get_faculty_preferences(fellowship_id):
         return cur.fetchall()  
 
 
+STUDENT_PREFERENCE_EXPORT_COLUMNS = ['student_net_id', 'preference_rank', 'fellowship_id', 'fellowship_name']
+FACULTY_PREFERENCE_EXPORT_COLUMNS = ['fellowship_id', 'fellowship_name', 'preference_rank', 'student_net_id']
+
+
+def iter_student_preferences():
+    """
+    Stream every student's ranking, by student and then rank.
+
+    Yields:
+        tuple: One row per ranked fellowship, in STUDENT_PREFERENCE_EXPORT_COLUMNS order.
+    """
+    return _stream('''
+        SELECT p.student_net_id, p.preference_rank, p.fellowship_id, f.name
+        FROM student_preferences p
+        LEFT JOIN fellowships f ON f.fellowship_id = p.fellowship_id
+        ORDER BY p.student_net_id, p.preference_rank
+    ''')
+
+
+def iter_faculty_preferences():
+    """
+    Stream every fellowship's ranking of students, by fellowship and then rank.
+
+    Yields:
+        tuple: One row per ranked student, in FACULTY_PREFERENCE_EXPORT_COLUMNS order.
+    """
+    return _stream('''
+        SELECT p.fellowship_id, f.name, p.preference_rank, p.student_net_id
+        FROM faculty_preferences p
+        LEFT JOIN fellowships f ON f.fellowship_id = p.fellowship_id
+        ORDER BY p.fellowship_id, p.preference_rank
+    ''')
+
+
 def get_all_students_with_applications():
-    with closing(connect(_DATABASE_URL)) as conn:
+    with get_connection() as conn:
         cur = conn.cursor()
         cur.execute('''
             SELECT DISTINCT student_net_id FROM applications
@@ -598,43 +1149,260 @@ def get_all_students_with_applications():
         return [row[0] for row in cur.fetchall()]
 
 def get_all_fellowships():
-    with closing(connect(_DATABASE_URL)) as conn:
+    with get_connection() as conn:
         cur = conn.cursor()
         cur.execute('''
             SELECT fellowship_id, COALESCE(capacity, 1) FROM fellowships
         ''')
         return cur.fetchall()
 
-def save_matches(matches_dict):
+def load_matching_inputs(build):
     """
-    Save matching results. Clears old matches and inserts new ones.
+    Stream everything the matching engine needs into `build`.
+
+    Runs four queries on one connection, no matter how many students or
+    fellowships there are, and hands the open cursors to `build` so rows are
+    consumed as they are read rather than collected into lists first.
+
+    Args:
+        build (callable): Called as `build(students, fellowships, student_prefs,
+            faculty_prefs)` with iterables of `net_id`, `(fellowship_id, capacity)`,
+            `(student_net_id, fellowship_id)` ordered by student then rank, and
+            `(fellowship_id, student_net_id)` ordered by fellowship then rank.
+
+    Returns:
+        object: Whatever `build` returned.
     """
-    with closing(connect(_DATABASE_URL)) as conn:
-        cur = conn.cursor()
-        cur.execute('DELETE FROM matches')
-        for fellowship_id, students in matches_dict.items():
-            if isinstance(students, list):
-                for student_net_id in students:
-                    cur.execute('''
-                        INSERT INTO matches (fellowship_id, student_net_id)
-                        VALUES (?, ?)
-                    ''', (fellowship_id, student_net_id))
-            else:
-                cur.execute('''
-                    INSERT INTO matches (fellowship_id, student_net_id)
-                    VALUES (?, ?)
-                ''', (fellowship_id, students))
+    with get_connection() as conn:
+        students = conn.execute('SELECT DISTINCT student_net_id FROM applications')
+        fellowships = conn.execute('SELECT fellowship_id, COALESCE(capacity, 1) FROM fellowships')
+        student_prefs = conn.execute('''
+            SELECT student_net_id, fellowship_id
+            FROM student_preferences
+            ORDER BY student_net_id, preference_rank
+        ''')
+        faculty_prefs = conn.execute('''
+            SELECT fellowship_id, student_net_id
+            FROM faculty_preferences
+            ORDER BY fellowship_id, preference_rank
+        ''')
+        return build((r[0] for r in students), fellowships, student_prefs, faculty_prefs)
 
-        conn.commit()
+def _current_match_run(conn):
+    """Return the id of the latest match run, or None before the first one."""
+    return conn.execute('SELECT MAX(match_run_id) FROM match_runs').fetchone()[0]
+
+
+def _start_match_run(conn, copy_from=None, strategy=None, params=None, duration=None):
+    """
+    Create a new match run, dropping the oldest ones beyond MATCH_RUNS_KEPT.
+
+    Args:
+        conn (sqlite3.Connection): Connection inside a write transaction.
+        copy_from (int, optional): Run whose matches the new run starts with,
+            copied inside SQLite with INSERT ... SELECT.
+        strategy (str, optional): Strategy that produced the run.
+        params (dict, optional): The strategy's parameters.
+        duration (float, optional): Seconds the matching took.
+
+    Returns:
+        int: The new match_run_id.
+    """
+    run_id = conn.execute(
+        'INSERT INTO match_runs (strategy, params, duration_seconds) VALUES (?, ?, ?)',
+        (strategy, json.dumps(params or {}, sort_keys=True), duration)
+    ).lastrowid
+    if copy_from is not None:
+        conn.execute('''
+            INSERT INTO matches (match_run_id, fellowship_id, student_net_id)
+            SELECT ?, fellowship_id, student_net_id FROM matches
+            WHERE match_run_id = ?
+            ORDER BY fellowship_id, match_id
+        ''', (run_id, copy_from))
+    cutoff = conn.execute('SELECT match_run_id FROM match_runs ORDER BY match_run_id DESC LIMIT 1 OFFSET ?',
+                          (MATCH_RUNS_KEPT,)).fetchone()
+    if cutoff is not None:
+        conn.execute('DELETE FROM matches WHERE match_run_id <= ?', cutoff)
+        conn.execute('DELETE FROM match_runs WHERE match_run_id <= ?', cutoff)
+    return run_id
+
+
+def _count_match_run(conn, run_id):
+    conn.execute('''
+        UPDATE match_runs SET matched_count = counts.matched, fellowship_count = counts.fellowships
+        FROM (SELECT COUNT(*) AS matched, COUNT(DISTINCT fellowship_id) AS fellowships
+              FROM matches WHERE match_run_id = ?) AS counts
+        WHERE match_run_id = ?
+    ''', (run_id, run_id))
+
+
+def save_matches(matches_dict, strategy=None, params=None, duration=None):
+    """
+    Save matching results as a new match run.
+
+    The previous runs are kept (up to MATCH_RUNS_KEPT of them) and can still
+    be read with `get_matches(match_run_id)`.  Any saved proposal state is
+    dropped in the same write: it describes the previous matches, not these.
+
+    Args:
+        matches_dict (dict): {fellowship_id: [student_net_ids]}; a single
+            net_id instead of a list is accepted too.
+        strategy (str, optional): Strategy that produced the matches.
+        params (dict, optional): The strategy's parameters.
+        duration (float, optional): Seconds the matching took.
+
+    Returns:
+        int: The new match_run_id.
+    """
+    rows = []
+    for fellowship_id, students in matches_dict.items():
+        if not isinstance(students, list):
+            students = [students]
+        rows.extend((fellowship_id, student_net_id) for student_net_id in students)
+    # In (match_run_id, fellowship_id) order the unique index is appended to
+    # instead of updated all over; the sort is stable, so each list keeps its order.
+    rows.sort(key=lambda row: row[0])
+
+    def write(conn):
+        run_id = _start_match_run(conn, strategy=strategy, params=params, duration=duration)
+        conn.executemany('INSERT INTO matches (match_run_id, fellowship_id, student_net_id) VALUES (?, ?, ?)',
+                         [(run_id, fellowship_id, student_net_id) for fellowship_id, student_net_id in rows])
+        _count_match_run(conn, run_id)
+        _clear_matching_state(conn)
+        return run_id
+
+    return run_write(write)
+
+
+def _matching_state_version(conn):
+    row = conn.execute('SELECT version FROM matching_state WHERE id = 1').fetchone()
+    return (_current_match_run(conn), row[0] if row else None)
+
+
+def get_matching_state_version():
+    """
+    Return a token that changes whenever the matches or their proposal state are saved.
+
+    Read it before loading the state and pass it to `save_matching_state`, which
+    then refuses to write a diff computed from a state that has since changed.
 
-def get_matches():
-    """Get all matches as {fellowship_id: [student_net_ids]}."""
-    with closing(connect(_DATABASE_URL)) as conn:
+    Returns:
+        tuple: The current match_run_id and the state's write count.
+    """
+    with get_connection() as conn:
+        return _matching_state_version(conn)
+
+
+def load_matching_state():
+    """
+    Load the saved proposal state behind the current matches.
+
+    Returns:
+        dict | None: `strategy`, `top_k`, `next_choice` ({net_id: position}),
+            `rejected` ({fellowship_id: set of net_ids}) and `held` (the current
+            matches), or None if the matches were not saved with a state.
+    """
+    with get_connection() as conn:
+        row = conn.execute('SELECT strategy, top_k FROM matching_state WHERE id = 1').fetchone()
+        if row is None:
+            return None
+        next_choice = dict(conn.execute('SELECT student_net_id, next_choice FROM matching_progress'))
+        rejected = {}
+        for fellowship_id, student_net_id in conn.execute(
+                'SELECT fellowship_id, student_net_id FROM matching_rejections'):
+            rejected.setdefault(fellowship_id, set()).add(student_net_id)
+    return {
+        'strategy': row[0],
+        'top_k': row[1],
+        'next_choice': next_choice,
+        'rejected': rejected,
+        'held': get_matches(),
+    }
+
+
+def save_matching_state(strategy, top_k, diff, new_run=False, duration=None, version=None):
+    """
+    Write the changes from one incremental matching step.
+
+    Only the rows named in `diff` are touched, so a small re-match is a small write.
+
+    Args:
+        strategy (str): Strategy the state belongs to.
+        top_k (int | None): Cutoff the state was computed with.
+        diff (dict): `progress` ({net_id: next_choice, or None to delete}),
+            `rejections_added`, `rejections_removed`, `matches_added` and
+            `matches_removed` (lists of (fellowship_id, net_id)).
+        new_run (bool): Apply the match changes to a new match run copied from
+            the current one, keeping the current one as it is. Otherwise the
+            current run is updated in place.
+        duration (float, optional): Seconds the matching took, recorded on a new run.
+        version (tuple, optional): `get_matching_state_version()` as read before
+            the state the diff was computed from.  If the state has changed
+            since, nothing is written.
+
+    Returns:
+        int | None: The match_run_id the matches were written to, or None if
+            `version` was out of date.
+    """
+    def write(conn):
+        if version is not None and _matching_state_version(conn) != version:
+            return None
+        run_id = _current_match_run(conn)
+        if new_run or run_id is None:
+            run_id = _start_match_run(conn, copy_from=run_id, strategy=strategy,
+                                      params={'top_k': top_k}, duration=duration)
+        conn.execute('''
+            INSERT INTO matching_state (id, strategy, top_k, version, updated_at)
+            VALUES (1, ?, ?, 1, CURRENT_TIMESTAMP)
+            ON CONFLICT(id) DO UPDATE SET strategy = excluded.strategy,
+                top_k = excluded.top_k, version = matching_state.version + 1,
+                updated_at = excluded.updated_at
+        ''', (strategy, top_k))
+        progress = diff['progress']
+        conn.executemany('DELETE FROM matching_progress WHERE student_net_id = ?',
+                         [(s,) for s, n in progress.items() if n is None])
+        conn.executemany('INSERT OR REPLACE INTO matching_progress (student_net_id, next_choice) VALUES (?, ?)',
+                         [(s, n) for s, n in progress.items() if n is not None])
+        conn.executemany('DELETE FROM matching_rejections WHERE fellowship_id = ? AND student_net_id = ?',
+                         diff['rejections_removed'])
+        conn.executemany('INSERT OR IGNORE INTO matching_rejections (fellowship_id, student_net_id) VALUES (?, ?)',
+                         diff['rejections_added'])
+        conn.executemany('DELETE FROM matches WHERE match_run_id = ? AND fellowship_id = ? AND student_net_id = ?',
+                         [(run_id, f, s) for f, s in diff['matches_removed']])
+        conn.executemany('INSERT INTO matches (match_run_id, fellowship_id, student_net_id) VALUES (?, ?, ?)',
+                         [(run_id, f, s) for f, s in diff['matches_added']])
+        if new_run or diff['matches_added'] or diff['matches_removed']:
+            _count_match_run(conn, run_id)
+        return run_id
+
+    return run_write(write)
+
+
+def _clear_matching_state(conn):
+    conn.execute('DELETE FROM matching_state')
+    conn.execute('DELETE FROM matching_progress')
+    conn.execute('DELETE FROM matching_rejections')
+
+
+def get_matches(match_run_id=None):
+    """
+    Get the matches of one match run as {fellowship_id: [student_net_ids]}.
+
+    Args:
+        match_run_id (int, optional): The run to read. Defaults to the latest.
+
+    Returns:
+        dict: Empty if the run does not exist.
+    """
+    with get_connection() as conn:
+        if match_run_id is None:
+            match_run_id = _current_match_run(conn)
         cur = conn.cursor()
         cur.execute('''
             SELECT fellowship_id, student_net_id FROM matches
+            WHERE match_run_id = ?
             ORDER BY fellowship_id
-        ''')
+        ''', (match_run_id,))
         matches_dict = {}
         for fellowship_id, student_net_id in cur.fetchall():
             if fellowship_id not in matches_dict:
@@ -643,31 +1411,157 @@ def get_matches():
 
         return matches_dict
 
+
+MATCH_EXPORT_COLUMNS = ['match_run_id', 'fellowship_id', 'fellowship_name', 'student_net_id',
+                        'first_name', 'last_name', 'email']
+
+
+def iter_matches(match_run_id):
+    """
+    Stream the matches of one match run, by fellowship and then student.
+
+    Args:
+        match_run_id (int): The run to read (see `get_match_runs`).
+
+    Yields:
+        tuple: One row per matched student, in MATCH_EXPORT_COLUMNS order.
+    """
+    return _stream('''
+        SELECT m.match_run_id, m.fellowship_id, f.name, m.student_net_id, u.first_name, u.last_name, u.email
+        FROM matches m
+        LEFT JOIN fellowships f ON f.fellowship_id = m.fellowship_id
+        LEFT JOIN users u ON u.net_id = m.student_net_id
+        WHERE m.match_run_id = ?
+        ORDER BY m.fellowship_id, m.student_net_id
+    ''', (match_run_id,))
+
+
+def get_fellowship_names(fellowship_ids):
+    """Return {fellowship_id: name} for the given ids; deleted fellowships are left out."""
+    fellowship_ids = list(set(fellowship_ids))
+    if not fellowship_ids:
+        return {}
+    placeholders = ', '.join('?' * len(fellowship_ids))
+    with get_connection() as conn:
+        return dict(conn.execute(
+            f'SELECT fellowship_id, name FROM fellowships WHERE fellowship_id IN ({placeholders})', fellowship_ids))
+
+
+_MATCH_RUN_COLUMNS = 'match_run_id, created_at, strategy, params, duration_seconds, matched_count, fellowship_count'
+
+
+def _match_run(row):
+    return {
+        'match_run_id': row[0],
+        'created_at': row[1],
+        'strategy': row[2],
+        'params': json.loads(row[3]) if row[3] else {},
+        'duration_seconds': row[4],
+        'matched_count': row[5],
+        'fellowship_count': row[6],
+    }
+
+
+def get_match_runs():
+    """
+    List the stored match runs, newest first.
+
+    Returns:
+        list[dict]: `match_run_id`, `created_at`, `strategy`, `params`,
+            `duration_seconds`, `matched_count` and `fellowship_count` of each run.
+    """
+    with get_connection() as conn:
+        rows = conn.execute(f'SELECT {_MATCH_RUN_COLUMNS} FROM match_runs ORDER BY match_run_id DESC').fetchall()
+    return [_match_run(r) for r in rows]
+
+
+def get_match_run(match_run_id):
+    """Return one run's metadata (see `get_match_runs`), or None if it is not stored."""
+    with get_connection() as conn:
+        row = conn.execute(f'SELECT {_MATCH_RUN_COLUMNS} FROM match_runs WHERE match_run_id = ?',
+                           (match_run_id,)).fetchone()
+    return _match_run(row) if row else None
+
+
+def diff_match_runs(old_run_id, new_run_id):
+    """
+    Compare two match runs inside SQLite.
+
+    Only the pairs that differ are returned to Python.  A pair is added or
+    removed if the other run does not have it (a lookup in the unique index);
+    an added and a removed pair of the same student (found through
+    idx_matches_run_student) make a move.  Every step is an index lookup, so
+    the cost grows with the size of the two runs, not with the number of runs
+    stored or the size of the diff squared.
+
+    Args:
+        old_run_id (int): The run to compare from.
+        new_run_id (int): The run to compare to.
+
+    Returns:
+        dict: `added` [(student_net_id, fellowship_id)] for students matched
+            only in the new run, `removed` [(student_net_id, fellowship_id)]
+            for students matched only in the old one, and `moved`
+            [(student_net_id, old_fellowship_id, new_fellowship_id)].
+    """
+    with get_connection() as conn:
+        rows = conn.execute('''
+            SELECT n.student_net_id, o.fellowship_id, n.fellowship_id
+            FROM matches n
+            LEFT JOIN matches o ON o.match_run_id = :old AND o.student_net_id = n.student_net_id
+                AND NOT EXISTS (SELECT 1 FROM matches k WHERE k.match_run_id = :new
+                                AND k.fellowship_id = o.fellowship_id AND k.student_net_id = o.student_net_id)
+            WHERE n.match_run_id = :new
+                AND NOT EXISTS (SELECT 1 FROM matches k WHERE k.match_run_id = :old
+                                AND k.fellowship_id = n.fellowship_id AND k.student_net_id = n.student_net_id)
+            UNION ALL
+            SELECT o.student_net_id, o.fellowship_id, NULL
+            FROM matches o
+            WHERE o.match_run_id = :old
+                AND NOT EXISTS (SELECT 1 FROM matches k WHERE k.match_run_id = :new
+                                AND k.fellowship_id = o.fellowship_id AND k.student_net_id = o.student_net_id)
+                AND NOT EXISTS (
+                    SELECT 1 FROM matches n WHERE n.match_run_id = :new AND n.student_net_id = o.student_net_id
+                        AND NOT EXISTS (SELECT 1 FROM matches k WHERE k.match_run_id = :old
+                                        AND k.fellowship_id = n.fellowship_id AND k.student_net_id = n.student_net_id))
+            ORDER BY 1, 2, 3
+        ''', {'old': old_run_id, 'new': new_run_id}).fetchall()
+
+    diff = {'added': [], 'removed': [], 'moved': []}
+    for student_net_id, old_fellowship, new_fellowship in rows:
+        if old_fellowship is None:
+            diff['added'].append((student_net_id, new_fellowship))
+        elif new_fellowship is None:
+            diff['removed'].append((student_net_id, old_fellowship))
+        else:
+            diff['moved'].append((student_net_id, old_fellowship, new_fellowship))
+    return diff
+
 def save_fellowship(student_net_id, fellowship_id):
-    with closing(connect(_DATABASE_URL)) as conn:
-        cur = conn.cursor()
-        try:
-            cur.execute('''
-                INSERT INTO saved_fellowships (student_net_id, fellowship_id)
-                VALUES (?, ?)
-            ''', (student_net_id, fellowship_id))
-            conn.commit()
-            return True
-        except Exception:
-            return False
+    def write(conn):
+        conn.execute('''
+            INSERT INTO saved_fellowships (student_net_id, fellowship_id)
+            VALUES (?, ?)
+        ''', (student_net_id, fellowship_id))
+
+    try:
+        run_write(write)
+        return True
+    except Exception:
+        return False
 
 def unsave_fellowship(student_net_id, fellowship_id):
-    with closing(connect(_DATABASE_URL)) as conn:
-        cur = conn.cursor()
-        cur.execute('''
+    def write(conn):
+        conn.execute('''
             DELETE FROM saved_fellowships
             WHERE student_net_id = ? AND fellowship_id = ?
         ''', (student_net_id, fellowship_id))
-        conn.commit()
-        return True
+
+    run_write(write)
+    return True
 
 def get_saved_fellowship_ids(student_net_id):
-    with closing(connect(_DATABASE_URL)) as conn:
+    with get_connection() as conn:
         cur = conn.cursor()
         cur.execute('''
             SELECT fellowship_id FROM saved_fellowships
@@ -677,7 +1571,7 @@ def get_saved_fellowship_ids(student_net_id):
         return [row[0] for row in cur.fetchall()]
 
 def is_fellowship_saved(student_net_id, fellowship_id):
-    with closing(connect(_DATABASE_URL)) as conn:
+    with get_connection() as conn:
         cur = conn.cursor()
         cur.execute('''
             SELECT 1 FROM saved_fellowships
@@ -685,37 +1579,29 @@ def is_fellowship_saved(student_net_id, fellowship_id):
         ''', (student_net_id, fellowship_id))
         return cur.fetchone() is not None
 
-def get_saved_fellowships(student_net_id):
-    fellowships = []
-    with closing(connect(_DATABASE_URL)) as conn:
-        cur = conn.cursor()
-        query = '''SELECT fellowships.fellowship_id, fellowships.name, Labs.lab_name,
-                (Users.first_name || ' ' || Users.last_name) AS faculty_name,
-                fellowships.class_years, fellowships.description, fellowships.deadline, fellowships.stipend,
-                COUNT(Applications.application_id) AS application_count
-            FROM saved_fellowships
-            JOIN fellowships ON saved_fellowships.fellowship_id = fellowships.fellowship_id
-            JOIN Labs ON fellowships.lab_num = Labs.lab_num
-            JOIN Users ON Labs.faculty_net_id = Users.net_id
-            LEFT JOIN Applications ON fellowships.fellowship_id = Applications.fellowship_id
-            WHERE saved_fellowships.student_net_id = ?
-            GROUP BY
-                fellowships.fellowship_id,
-                fellowships.name,
-                Labs.lab_name,
-                faculty_name,
-                fellowships.class_years,
-                fellowships.description,
-                fellowships.deadline,
-                fellowships.stipend
-            ORDER BY saved_fellowships.saved_at DESC
-        '''
-        cur.execute(query, (student_net_id,))
-        results = cur.fetchall()
-        for r in results:
-            f = Fellowship(r[0], r[1], r[2], r[3], r[4], r[5], r[6], r[7], r[8])
-            fellowships.append(f)
-    return fellowships
+def get_saved_fellowships(student_net_id, after=None, limit=None):
+    """
+    Get a student's saved fellowships, most recently saved first.
+
+    Args:
+        student_net_id (str): The student.
+        after (str, optional): Cursor of the previous page (`Page.next_cursor`).
+        limit (int, optional): Page size. None returns every row.
+
+    Returns:
+        Page[Fellowship]: The saved fellowships.
+    """
+    columns = '''fellowships.fellowship_id, fellowships.name, Labs.lab_name,
+        (Users.first_name || ' ' || Users.last_name) AS faculty_name,
+        fellowships.class_years, fellowships.description, fellowships.deadline, fellowships.stipend,
+        fellowships.application_count'''
+    tables = '''saved_fellowships
+        JOIN fellowships ON saved_fellowships.fellowship_id = fellowships.fellowship_id
+        JOIN Labs ON fellowships.lab_num = Labs.lab_num
+        JOIN Users ON Labs.faculty_net_id = Users.net_id'''
+    with get_connection() as conn:
+        return fetch_page(conn.cursor(), columns, tables, ['saved_fellowships.student_net_id = ?'],
+                          [student_net_id], SAVED_SORT, after, limit, Fellowship)
 
 # get the number of applications of a fellowship
 
@@ -724,12 +1610,10 @@ def delete_application(fellowship_id, net_id):
     Deletes an application from the database
     """ 
     try:
-        with closing(connect(_DATABASE_URL)) as conn:
-            cur = conn.cursor()
-            cur.execute('DELETE FROM applications WHERE fellowship_id = ? AND student_net_id = ?',
-                        (fellowship_id, net_id))
-            conn.commit()
-            return True
+        run_write(lambda conn: conn.execute(
+            'DELETE FROM applications WHERE fellowship_id = ? AND student_net_id = ?',
+            (fellowship_id, net_id)))
+        return True
     except Exception as e: 
         print(f"Error deleting application: {e}")
         return False
@@ -738,45 +1622,85 @@ def delete_fellowship(fellowship_id):
     """
     Delete fellowship
     """
+    def write(conn):
+        owner = conn.execute('''
+            SELECT l.faculty_net_id FROM fellowships f JOIN labs l ON f.lab_num = l.lab_num
+            WHERE f.fellowship_id = ?
+        ''', (fellowship_id,)).fetchone()
+        conn.execute('DELETE FROM fellowships WHERE fellowship_id = ?', (fellowship_id,))
+        return owner[0] if owner else None
+
     try:
-        with closing(connect(_DATABASE_URL)) as conn:
-            cur = conn.cursor()
-            cur.execute('DELETE FROM fellowships WHERE fellowship_id = ?', (fellowship_id,))
-            conn.commit()
-            return True
+        faculty_net_id = run_write(write)
     except Exception as e:
         print(f"Error deleting fellowship {fellowship_id}: {e}")
         return False
+    invalidate_fellowship(fellowship_id, faculty_net_id)
+    return True
+
+def get_cache_stats():
+    """Return the catalog cache's hit/miss/eviction counts and size."""
+    return catalog_cache.snapshot()
+
+
+def invalidate_faculty(faculty_net_id):
+    """
+    Drop cached catalog data showing a faculty member: the lab and faculty
+    listings, their fellowship list and each of their fellowships.  Call after
+    committing a change to the faculty member's user, faculty or lab row.
+    """
+    with get_connection() as conn:
+        fellowship_ids = [r[0] for r in conn.execute('''
+            SELECT f.fellowship_id FROM fellowships f JOIN labs l ON f.lab_num = l.lab_num
+            WHERE l.faculty_net_id = ?
+        ''', (faculty_net_id,))]
+    catalog_cache.invalidate('labs', 'faculty', f'faculty:{faculty_net_id}',
+                             *(f'fellowship:{fid}' for fid in fellowship_ids))
+
+
+def invalidate_fellowship(fellowship_id, faculty_net_id=None):
+    """
+    Drop cached data for one fellowship and its faculty member's fellowship
+    list.  Call after committing an insert (with fellowship_id None), update
+    or delete of a fellowship row.
+    """
+    tags = [] if fellowship_id is None else [f'fellowship:{fellowship_id}']
+    if faculty_net_id is not None:
+        tags.append(f'faculty:{faculty_net_id}')
+    catalog_cache.invalidate(*tags)
+
 
 def subscribe_to_notifications(net_id):
+    def write(conn):
+        cur = conn.cursor()
+        cur.execute('UPDATE students SET subscribed = 1 WHERE net_id = ?', (net_id,))
+        if cur.rowcount == 0:
+            cur.execute('INSERT INTO students (net_id, subscribed) VALUES (?, ?)', (net_id, 1))
+
     try:
-        with closing(connect(_DATABASE_URL)) as conn:
-            cur = conn.cursor()
-            cur.execute('UPDATE students SET subscribed = 1 WHERE net_id = ?', (net_id,))
-            if cur.rowcount == 0:
-                cur.execute('INSERT INTO students (net_id, subscribed) VALUES (?, ?)', (net_id, 1))
-            conn.commit()
-            return True
+        run_write(write)
+        return True
     except Exception as e:
         print(f"Error subscribing {net_id}: {e}")
         return False
 
 def unsubscribe_from_notifications(net_id):
+    def write(conn):
+        cur = conn.cursor()
+        cur.execute('UPDATE students SET subscribed = 0 WHERE net_id = ?', (net_id,))
+        if cur.rowcount == 0:
+            cur.execute('INSERT INTO students (net_id, subscribed) VALUES (?, ?)', (net_id, 0))
+
     try:
-        with closing(connect(_DATABASE_URL)) as conn:
-            cur = conn.cursor()
-            cur.execute('UPDATE students SET subscribed = 0 WHERE net_id = ?', (net_id,))
-            if cur.rowcount == 0:
-                cur.execute('INSERT INTO students (net_id, subscribed) VALUES (?, ?)', (net_id, 0))
-            conn.commit()
-            return True
+        run_write(write)
+        return True
     except Exception as e:
         print(f"Error unsubscribing {net_id}: {e}")
         return False
 
 def is_subscribed(net_id):
     try:
-        with closing(connect(_DATABASE_URL)) as conn:
+        with get_connection() as conn:
             cur = conn.cursor()
             cur.execute('SELECT subscribed FROM students WHERE net_id = ?', (net_id,))
             r = cur.fetchone()
@@ -787,17 +1711,216 @@ def is_subscribed(net_id):
         print(f"Error checking subscription for {net_id}: {e}")
         return False
 
-def get_notification_subscribers():
+def get_notification_subscribers(class_years=None):
+    """
+    Get subscribed students as (net_id, email) rows.
+
+    Args:
+        class_years (iterable, optional): Only students in these class years.
+            Uses the partial index on subscribed students' class_year.
+    """
+    query = '''
+        SELECT u.net_id, u.email
+        FROM students s
+        JOIN users u ON s.net_id = u.net_id
+        WHERE s.subscribed = 1
+    '''
+    params = []
+    if class_years is not None:
+        params = [int(y) for y in class_years]
+        if not params:
+            return []
+        query += f" AND s.class_year IN ({', '.join('?' for _ in params)})"
     try:
-        with closing(connect(_DATABASE_URL)) as conn:
+        with get_connection() as conn:
             cur = conn.cursor()
-            cur.execute('''
-                SELECT u.net_id, u.email
-                FROM students s
-                JOIN users u ON s.net_id = u.net_id
-                WHERE s.subscribed = 1
-            ''')
+            cur.execute(query, params)
             return cur.fetchall()
     except Exception as e:
         print(f"Error fetching notification subscribers: {e}")
-        return []
\ No newline at end of file
+        return []
+
+
+def enqueue_email(to_addrs, message):
+    """
+    Add a message to the email outbox for the background mailer to send.
+
+    Args:
+        to_addrs (list[str]): Envelope recipients.
+        message (str): The full message, as from `Message.as_string()`.
+
+    Returns:
+        int: The outbox id of the message.
+    """
+    def write(conn):
+        cur = conn.execute('''
+            INSERT INTO email_outbox (to_addrs, message, next_attempt_at)
+            VALUES (?, ?, ?)
+        ''', (json.dumps(list(to_addrs)), message, time.time()))
+        return cur.lastrowid
+
+    return run_write(write)
+
+
+def claim_emails(limit, lease):
+    """
+    Claim up to `limit` due messages for one worker.
+
+    Claimed messages are marked 'sending' and hidden from other workers for
+    `lease` seconds; if the worker dies before reporting back, they become
+    due again once the lease runs out.
+
+    Args:
+        limit (int): Most messages to claim.
+        lease (float): Seconds before an unreported claim expires.
+
+    Returns:
+        list[tuple[int, list[str], str, int]]: (email_id, to_addrs, message,
+            attempts so far) for each claimed message.
+    """
+    now = time.time()
+
+    def write(conn):
+        return conn.execute('''
+            UPDATE email_outbox
+            SET status = 'sending', next_attempt_at = ?
+            WHERE email_id IN (
+                SELECT email_id FROM email_outbox
+                WHERE status IN ('pending', 'sending') AND next_attempt_at <= ?
+                ORDER BY next_attempt_at
+                LIMIT ?
+            )
+            RETURNING email_id, to_addrs, message, attempts
+        ''', (now + lease, now, limit)).fetchall()
+
+    return [(email_id, json.loads(to_addrs), message, attempts)
+            for email_id, to_addrs, message, attempts in run_write(write)]
+
+
+def enqueue_notification(subject, class_years, batches):
+    """
+    Add one notification, split into batches, to the email outbox.
+
+    Args:
+        subject (str): Subject line, kept for the metrics.
+        class_years (list): Class years the notification targets.
+        batches (list[tuple[list[str], str]]): (to_addrs, message) per batch.
+
+    Returns:
+        int: The notification id.
+    """
+    now = time.time()
+
+    def write(conn):
+        cur = conn.execute('''
+            INSERT INTO notifications (subject, class_years, recipients, batches)
+            VALUES (?, ?, ?, ?)
+        ''', (subject, ','.join(str(y) for y in class_years), sum(len(to) for to, _ in batches), len(batches)))
+        notification_id = cur.lastrowid
+        conn.executemany('''
+            INSERT INTO email_outbox (to_addrs, message, next_attempt_at, notification_id, recipients)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(json.dumps(list(to)), message, now, notification_id, len(to)) for to, message in batches])
+        return notification_id
+
+    return run_write(write)
+
+
+def mark_email_sent(email_id, send_seconds=None):
+    """Record that a claimed message was delivered, and how long the SMTP send took."""
+    run_write(lambda conn: conn.execute('''
+        UPDATE email_outbox
+        SET status = 'sent', attempts = attempts + 1, last_error = NULL, sent_at = CURRENT_TIMESTAMP,
+            send_seconds = ?
+        WHERE email_id = ?
+    ''', (send_seconds, email_id)))
+
+
+def mark_email_failed(email_id, error, retry_at=None):
+    """
+    Record a failed delivery attempt.
+
+    Args:
+        email_id (int): The message.
+        error (str): What went wrong.
+        retry_at (float, optional): Unix time to try again; None gives up.
+    """
+    run_write(lambda conn: conn.execute('''
+        UPDATE email_outbox
+        SET status = ?, attempts = attempts + 1, last_error = ?, next_attempt_at = COALESCE(?, next_attempt_at)
+        WHERE email_id = ?
+    ''', ('pending' if retry_at is not None else 'failed', error, retry_at, email_id)))
+
+
+def rebuild_application_counts():
+    """
+    Recount `fellowships.application_count` from the applications table.
+
+    The triggers keep the counts exact; this repairs them after rows were
+    changed with the triggers missing (e.g. a bulk load into a copy of the
+    table) and is safe to run at any time.
+
+    Returns:
+        int: Number of fellowships whose count was wrong.
+    """
+    def write(conn):
+        return conn.execute('''
+            UPDATE fellowships SET application_count = counts.n
+            FROM (
+                SELECT f.fellowship_id,
+                       (SELECT COUNT(*) FROM applications a WHERE a.fellowship_id = f.fellowship_id) AS n
+                FROM fellowships f
+            ) AS counts
+            WHERE counts.fellowship_id = fellowships.fellowship_id
+              AND fellowships.application_count != counts.n
+        ''').rowcount
+    return run_write(write)
+
+
+def get_outbox_counts():
+    """Return the number of outbox messages in each status."""
+    with get_connection() as conn:
+        return dict(conn.execute('SELECT status, COUNT(*) FROM email_outbox GROUP BY status'))
+
+
+def get_notification_metrics(notification_id):
+    """
+    Delivery metrics for one notification fan-out.
+
+    Returns:
+        dict | None: `subject`, `class_years`, `recipients`, `created_at`, a
+            count of batches per `status`, and `batches`: one dict per outbox
+            message with `email_id`, `recipients`, `status`, `attempts`,
+            `send_seconds`, `queued_seconds` (queue to delivery) and `last_error`.
+    """
+    with get_connection() as conn:
+        row = conn.execute('''
+            SELECT subject, class_years, recipients, created_at
+            FROM notifications WHERE notification_id = ?
+        ''', (notification_id,)).fetchone()
+        if row is None:
+            return None
+        batches = [
+            {
+                'email_id': r[0], 'recipients': r[1], 'status': r[2], 'attempts': r[3],
+                'send_seconds': r[4], 'queued_seconds': r[5], 'last_error': r[6],
+            }
+            for r in conn.execute('''
+                SELECT email_id, recipients, status, attempts, send_seconds,
+                       (julianday(sent_at) - julianday(created_at)) * 86400, last_error
+                FROM email_outbox
+                WHERE notification_id = ?
+                ORDER BY email_id
+            ''', (notification_id,))
+        ]
+    status = {}
+    for batch in batches:
+        status[batch['status']] = status.get(batch['status'], 0) + 1
+    return {
+        'subject': row[0],
+        'class_years': row[1].split(',') if row[1] else [],
+        'recipients': row[2],
+        'created_at': row[3],
+        'status': status,
+        'batches': batches,
+    }
@@ -0,0 +1,142 @@
+"""
+Streaming CSV and JSON exports.
+
+An export is built from an iterator of row tuples, normally a cursor that
+`database.iter_*` is still reading from, and is encoded a chunk at a time,
+so a 500,000-row export holds about one chunk in memory rather than the
+whole file.  The chunks go out through a generator-based Flask `Response`;
+with no Content-Length the server sends them with chunked transfer encoding.
+
+Gzip is applied on the fly with one `zlib.compressobj`: each chunk is
+compressed as it is produced and the gzip trailer is written after the
+last row.
+
+Functions:
+    - csv_chunks(columns, rows)
+    - json_chunks(columns, rows)
+    - gzip_chunks(chunks, level=GZIP_LEVEL)
+    - export_response(name, fmt, columns, rows, compress=False)
+"""
+import csv
+import io
+import json
+import zlib
+from itertools import islice
+
+from flask import Response
+
+CHUNK_SIZE = 64 * 1024
+ROW_BATCH = 1000
+GZIP_LEVEL = 6
+FORMATS = {
+    'csv': 'text/csv',
+    'json': 'application/json',
+}
+
+
+def _batches(rows):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, ROW_BATCH))
+        if not batch:
+            return
+        yield batch
+
+
+def csv_chunks(columns, rows):
+    """
+    Encode rows as CSV with a header line.
+
+    Args:
+        columns (list[str]): Header names.
+        rows (iterable[tuple]): Row values, in column order.
+
+    Yields:
+        bytes: UTF-8 chunks of about CHUNK_SIZE bytes.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for batch in _batches(rows):
+        writer.writerows(batch)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def json_chunks(columns, rows):
+    """
+    Encode rows as a JSON array of objects keyed by column name.
+
+    Args:
+        columns (list[str]): Object keys.
+        rows (iterable[tuple]): Row values, in column order.
+
+    Yields:
+        bytes: UTF-8 chunks of about CHUNK_SIZE bytes.
+    """
+    # One encoder call per batch: the objects are encoded as a list and its
+    # brackets are dropped, so batches join into a single array.
+    encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+    parts, size, separator = ['['], 1, '\n'
+    for batch in _batches(rows):
+        part = separator + encode([dict(zip(columns, row)) for row in batch])[1:-1]
+        separator = ',\n'
+        parts.append(part)
+        size += len(part)
+        if size >= CHUNK_SIZE:
+            yield ''.join(parts).encode('utf-8')
+            parts, size = [], 0
+    parts.append('\n]\n')
+    yield ''.join(parts).encode('utf-8')
+
+
+def gzip_chunks(chunks, level=GZIP_LEVEL):
+    """
+    Gzip a stream of byte chunks as they arrive.
+
+    Args:
+        chunks (iterable[bytes]): The uncompressed stream.
+        level (int): zlib compression level.
+
+    Yields:
+        bytes: The gzip stream; chunks the compressor buffered whole are skipped.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(name, fmt, columns, rows, compress=False):
+    """
+    Build a streamed download of `rows`.
+
+    Nothing is read from `rows` until the server starts sending the body, and
+    a download the client abandons closes the generator, which closes the
+    cursor behind it.
+
+    Args:
+        name (str): File name without extension.
+        fmt (str): 'csv' or 'json'.
+        columns (list[str]): Column names.
+        rows (iterable[tuple]): The rows to export.
+        compress (bool): Gzip the body and send Content-Encoding: gzip.
+
+    Returns:
+        flask.Response: The streaming response.
+    """
+    chunks = csv_chunks(columns, rows) if fmt == 'csv' else json_chunks(columns, rows)
+    headers = {
+        'Content-Disposition': f'attachment; filename="{name}.{fmt}"',
+        'Vary': 'Accept-Encoding',
+        'Cache-Control': 'no-store',
+    }
+    if compress:
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    return Response(chunks, mimetype=FORMATS[fmt], headers=headers)
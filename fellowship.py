@@ -1,32 +1,52 @@
 from contextlib import closing
-from sqlite3 import connect
 
 from itsdangerous import URLSafeTimedSerializer
-from flask import Flask, request, make_response, redirect, url_for, flash, Response, jsonify
+from flask import Flask, request, make_response, redirect, url_for, flash, jsonify
 from flask import render_template, session, send_file, current_app
 from database import get_faculty_information, get_labs_information, get_fellowship_information, \
-    get_user_by_netid_password, get_user_by_netid, get_fellowship_by_id, get_student_applications, \
+    get_user_by_netid, get_fellowship_by_id, get_student_applications, \
     get_fellowships_by_faculty, get_fellowship_applicants, get_student_resume, update_student_resume, \
     save_student_preferences, get_student_preferences, save_faculty_preferences, \
-    get_faculty_preferences, save_matches, get_matches, get_user_by_email, \
+    get_faculty_preferences, get_matches, get_user_by_email, \
     save_fellowship, unsave_fellowship, get_saved_fellowship_ids, is_fellowship_saved, get_saved_fellowships, \
     delete_application, delete_fellowship, get_notification_subscribers, \
-    subscribe_to_notifications, unsubscribe_from_notifications, is_subscribed
-from matching import run_matching
+    subscribe_to_notifications, unsubscribe_from_notifications, is_subscribed, get_connection, run_write, \
+    get_faculty_fellowship_details, FELLOWSHIP_SORTS, invalidate_faculty, invalidate_fellowship, \
+    get_session_user, invalidate_user, update_password_hash, get_match_runs, get_match_run, diff_match_runs, \
+    get_fellowship_names, iter_fellowship_applicants, iter_matches, iter_student_preferences, \
+    iter_faculty_preferences, APPLICANT_EXPORT_COLUMNS, MATCH_EXPORT_COLUMNS, STUDENT_PREFERENCE_EXPORT_COLUMNS, \
+    FACULTY_PREFERENCE_EXPORT_COLUMNS
+from matching import STRATEGIES, DEFAULT_STRATEGY
+from simulation import MAX_SCENARIOS, MAX_WORKERS, simulate
+from incremental import match_and_save, rematch
+from resume_store import InvalidResume
+from pagination import page_size
+from export import export_response
+from auth import PoolBusy, RateLimited, authenticate, check_login_rate, hash_password, login_succeeded
+import instrumentation
+import profiling
+from mailer import NOTIFY_BATCH_SIZE, SMTP_EMAIL, queue_email, queue_notification
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 from keys import APP_SECRET_KEY
+import hashlib
 import io
+import math
+import os
 
 from email.mime.text import MIMEText
 from email.mime.image import MIMEImage
 from email.mime.application import MIMEApplication
 from email.mime.multipart import MIMEMultipart
-import smtplib
 
 app = Flask(__name__)
 app.secret_key = APP_SECRET_KEY
+
+MAX_RESUME_SIZE = 10 * 1024 * 1024
+# Reject request bodies far larger than any allowed resume before parsing them.
+app.config['MAX_CONTENT_LENGTH'] = MAX_RESUME_SIZE + 1024 * 1024
+profiling.init_app(app)
+instrumentation.init_app(app, get_connection)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
@@ -39,7 +59,7 @@ def clear_stale_session():
 
 @login_manager.user_loader
 def load_user(net_id):
-    return get_user_by_netid([net_id])
+    return get_session_user(net_id)
 
 @app.route('/', methods=['GET'])
 @app.route('/index', methods=['GET'])
@@ -51,24 +71,26 @@ def index():
 @app.route('/faculty')
 def faculty():
     q = (request.args.get('q') or "").strip()
-    f= get_faculty_information(q)
+    f= get_faculty_information(q, after=request.args.get('after'), limit=page_size(request.args.get('limit')))
     fellowship_id = _get_faculty_fellowship_id() if current_user.is_authenticated and current_user.role == 'faculty' else None
     return render_template('faculty.html', faculty_list=f, q=q, fellowship_id=fellowship_id)
 
 @app.route('/labs')
 def labs():
     q = (request.args.get('q') or "").strip()
-    l = get_labs_information(q)
+    l = get_labs_information(q, after=request.args.get('after'), limit=page_size(request.args.get('limit')))
     fellowship_id = _get_faculty_fellowship_id() if current_user.is_authenticated and current_user.role == 'faculty' else None
     return render_template('labs.html', labs_list=l, q=q, fellowship_id=fellowship_id)
 
 @app.route('/fellowships')
 def fellowships():
     q = (request.args.get('q') or "").strip()
-    f = get_fellowship_information(q)
+    sort = request.args.get('sort') if request.args.get('sort') in FELLOWSHIP_SORTS else None
+    f = get_fellowship_information(q, sort=sort, after=request.args.get('after'),
+                                   limit=page_size(request.args.get('limit')))
     fellowship_id = _get_faculty_fellowship_id() if current_user.is_authenticated and current_user.role == 'faculty' else None
     saved_ids = get_saved_fellowship_ids(current_user.net_id) if current_user.is_authenticated and current_user.role == 'student' else []
-    return render_template('fellowships.html', fellowships_list=f, q=q, fellowship_id=fellowship_id, saved_fellowship_ids=saved_ids)
+    return render_template('fellowships.html', fellowships_list=f, q=q, sort=sort, fellowship_id=fellowship_id, saved_fellowship_ids=saved_ids)
 
 @app.route('/save/<int:fellowship_id>', methods=['POST'])
 @login_required
@@ -84,7 +106,8 @@ def toggle_save(fellowship_id):
 @app.route('/saved_fellowships')
 @login_required
 def saved_fellowships():
-    saved_list = get_saved_fellowships(current_user.net_id)
+    saved_list = get_saved_fellowships(current_user.net_id, after=request.args.get('after'),
+                                       limit=page_size(request.args.get('limit')))
     fellowship_id = None
     saved_ids = get_saved_fellowship_ids(current_user.net_id)
     return render_template('saved_fellowships.html', fellowships_list=saved_list, fellowship_id=fellowship_id, saved_fellowship_ids=saved_ids)
@@ -121,16 +144,51 @@ def _handle_faculty_ranking():
     ranked_ids = request.form.getlist('applicant_rank[]')
     ranked_ids = [sid for sid in ranked_ids if sid]
     if ranked_ids:
-        save_faculty_preferences(fellowship_id, ranked_ids)
+        try:
+            changes = save_faculty_preferences(fellowship_id, ranked_ids)
+        except Exception as e:
+            flash(f"Error saving your rankings: {str(e)}", "danger")
+            return
+        if _ranking_changed(changes):
+            _rematch(fellowships=[fellowship_id])
         flash("Your applicant rankings have been saved!", "success")
     else:
         flash("Please rank at least one applicant.", "warning")
 
 
+def _matching_options():
+    strategy = request.form.get('strategy') or DEFAULT_STRATEGY
+    params = {}
+    top_k = (request.form.get('top_k') or '').strip()
+    if top_k:
+        params['top_k'] = int(top_k)
+    return strategy, params
+
+
+def _ranking_changed(changes):
+    # Saving an unchanged ranking leaves the matches as they are.
+    return any(changes.values())
+
+
+def _rematch(students=(), fellowships=()):
+    # Keep saved matches current after a ranking change.  This runs in the
+    # request, before the response: it reloads every ranking and replays the
+    # proposals the change affects, so set REMATCH_ON_RANKING_SAVE to False
+    # where that is too slow and re-run the matching instead.  A failure is
+    # logged, not raised, so the ranking that was just saved is kept; the
+    # matches stay stale until the next full matching.
+    if not app.config.get('REMATCH_ON_RANKING_SAVE', True):
+        return
+    try:
+        rematch(students=students, fellowships=fellowships)
+    except Exception:
+        app.logger.exception("Re-matching after a ranking change failed")
+
+
 def _handle_matching():
     try:
-        matches = run_matching()
-        save_matches(matches)
+        strategy, params = _matching_options()
+        matches = match_and_save(strategy, **params)
         flash(f"Matching complete! {sum(len(v) for v in matches.values())} students matched.", "success")
     except Exception as e:
         flash(f"Error running matching: {str(e)}", "danger")
@@ -145,22 +203,16 @@ def _get_faculty_fellowship_id():
 
 
 def _build_fellowship_data(faculty_net_id, fellowships):
+    details = get_faculty_fellowship_details(faculty_net_id)
+    empty = {'applicants': [], 'preferences': {}, 'matched_students': []}
     fellowship_data = []
-    all_matches = get_matches()
     for fellowship in fellowships:
-        applicants = get_fellowship_applicants(faculty_net_id, fellowship.fellowship_id)
-        matched_students = all_matches.get(fellowship.fellowship_id, [])
-        current_prefs = get_faculty_preferences(fellowship.fellowship_id)
-        pref_dict = {student_net_id: rank for student_net_id, rank in current_prefs}
-
-        if pref_dict:
-            applicants = sorted(applicants, key=lambda app: pref_dict.get(app.student_net_id, float('inf')))
-
+        entry = details.get(fellowship.fellowship_id, empty)
         fellowship_data.append({
             'fellowship': fellowship,
-            'applicants': applicants,
-            'matched_students': matched_students,
-            'preferences': pref_dict
+            'applicants': entry['applicants'],
+            'matched_students': entry['matched_students'],
+            'preferences': entry['preferences']
         })
 
     return fellowship_data
@@ -180,7 +232,8 @@ def faculty_fellowships():
     fellowship_data = _build_fellowship_data(faculty_net_id, fellowships_f)
     fellowship_id = _get_faculty_fellowship_id()
     current_prefs = get_faculty_preferences(fellowship_id)
-    return render_template('faculty_fellowships.html', fellowship_data=fellowship_data, fellowship_id=fellowship_id, preferences=current_prefs)
+    return render_template('faculty_fellowships.html', fellowship_data=fellowship_data, fellowship_id=fellowship_id, preferences=current_prefs,
+                           strategies=list(STRATEGIES), default_strategy=DEFAULT_STRATEGY)
 
 @app.route('/faculty/applicants')
 @login_required
@@ -230,16 +283,13 @@ def apply_fellowship(fellowship_id):
         student_net_id = current_user.net_id
         questions = request.form.get('questions', '')
 
-        with connect('labsatyale.sqlite', isolation_level=None, uri=True) as conn:
-            with closing(conn.cursor()) as cursor:
-                try:
-                    cursor.execute("""
-                                   INSERT INTO applications (fellowship_id, student_net_id, questions)
-                                   VALUES (?, ?, ?)
-                               """, (fellowship_id, student_net_id, questions))
-                    conn.commit()
-                except Exception as e:
-                    return "You have already applied to this fellowship."
+        try:
+            run_write(lambda conn: conn.execute("""
+                           INSERT INTO applications (fellowship_id, student_net_id, questions)
+                           VALUES (?, ?, ?)
+                       """, (fellowship_id, student_net_id, questions)))
+        except Exception as e:
+            return "You have already applied to this fellowship."
 
         return render_template("apply_success.html", fellowship=fellowship)
     else:
@@ -263,6 +313,31 @@ def apply_fellowship(fellowship_id):
 
             return render_template("apply_fellowship.html", fellowship=fellowship, resume_info=resume_info)
 
+def _send_resume(resume_info, as_attachment=False):
+    """
+    Send a resume with ETag and Range support.
+
+    Stored files go out through send_file with their path, so the server can
+    use sendfile(); resumes still held in the table are sent from memory.
+    """
+    path = resume_info['path']
+    if path:
+        if not os.path.isfile(path):
+            return "Resume file is missing.", 404
+        source, etag = path, resume_info['sha256']
+    else:
+        source, etag = io.BytesIO(resume_info['data']), hashlib.sha256(resume_info['data']).hexdigest()
+
+    return send_file(
+        source,
+        mimetype='application/pdf',
+        as_attachment=as_attachment,
+        download_name=resume_info['filename'] or 'resume.pdf',
+        conditional=True,
+        etag=etag
+    )
+
+
 @app.route('/view-resume/<student_net_id>')
 @login_required
 def view_resume_student(student_net_id):
@@ -275,21 +350,20 @@ def view_resume_student(student_net_id):
     if not resume_info:
         return "No resume uploaded by this student.", 404
 
-    resume_data = resume_info['data']
-    filename = resume_info['filename']
-
-    return Response(
-        resume_data,
-        mimetype="application/pdf",
-        headers={"Content-Disposition": f"inline; filename={filename}"}
-    )
+    return _send_resume(resume_info)
 
 def _handle_student_ranking(student_net_id):
     ranked_ids = request.form.getlist('fellowship_rank[]')
     ranked_ids = [int(fid) for fid in ranked_ids if fid]
 
     if ranked_ids:
-        save_student_preferences(student_net_id, ranked_ids)
+        try:
+            changes = save_student_preferences(student_net_id, ranked_ids)
+        except Exception as e:
+            flash(f"Error saving your preferences: {str(e)}", "danger")
+            return
+        if _ranking_changed(changes):
+            _rematch(students=[student_net_id])
         flash("Your preferences have been saved!", "success")
     else:
         flash("Please rank at least one fellowship.", "warning")
@@ -330,7 +404,9 @@ def add_fellowship():
             if count != len(class_years)-1:
                 years += ","
             count += 1
-        with connect('labsatyale.sqlite', isolation_level=None, uri=True) as conn:
+        current_user_net_id = current_user.net_id
+
+        def write(conn):
             with closing(conn.cursor()) as cursor:
                 query = '''SELECT l.lab_num , l.lab_name,
                  (u.first_name || ' ' || u.last_name) AS faculty_name
@@ -341,7 +417,7 @@ def add_fellowship():
                             ON f.net_id=u.net_id
                         WHERE u.net_id = ?
                         '''
-                cursor.execute(query, (current_user.net_id,))
+                cursor.execute(query, (current_user_net_id,))
                 result = cursor.fetchall()
                 lab_num, lab_name, faculty_name = result[0]
 
@@ -350,9 +426,10 @@ def add_fellowship():
                         VALUES (?, ?, ?, ?, ?, ?)
                 ''', (lab_num, fellow_name, years, description, deadline, stipend))
 
-                conn.commit()
-                notify_users(fellow_name, class_years)
-                return redirect(url_for('fellowships'))
+        run_write(write)
+        invalidate_fellowship(None, current_user_net_id)
+        notify_users(fellow_name, class_years)
+        return redirect(url_for('fellowships'))
     if current_user.role != 'faculty':
         flash("You do not have permission to access this page.", "danger")
         return redirect(url_for('index'))
@@ -378,17 +455,20 @@ def register():
             return render_template('register.html', role="Student", msg="Email already exists")
         else:
             ## Add the user to the database and redirect to profile
-            with connect('labsatyale.sqlite', isolation_level=None, uri=True) as conn:
+            password_hash = hash_password(password)
+
+            def write(conn):
                 with closing(conn.cursor()) as cursor:
                     cursor.execute('''
                         INSERT INTO users (net_id, first_name, last_name, email, password_hash, role)
                         VALUES (?, ?, ?, ?, ?, ?)
-                    ''',(net_id, first_name, last_name, email, generate_password_hash(password), role.lower()))
+                    ''',(net_id, first_name, last_name, email, password_hash, role.lower()))
                     cursor.execute('''
                         INSERT INTO students (net_id, class_year, major)
                         VALUES (?, ?, ?)
                     ''',(net_id, class_year, major))
-                    conn.commit()
+
+            run_write(write)
             send_signup_email(email, first_name)
             return redirect(url_for('profile'))
     elif role == "Faculty":
@@ -402,12 +482,14 @@ def register():
         elif get_user_by_email([email]):
             return render_template('register.html', role="Faculty", msg="Email already exists")
         else:
-            with connect('labsatyale.sqlite', isolation_level=None, uri=True) as conn:
+            password_hash = hash_password(password)
+
+            def write(conn):
                 with closing(conn.cursor()) as cursor:
                     cursor.execute('''
                         INSERT INTO users (net_id, first_name, last_name, email, password_hash, role)
                         VALUES (?, ?, ?, ?, ?, ?)
-                    ''',(net_id, first_name, last_name, email, generate_password_hash(password), role.lower()))
+                    ''',(net_id, first_name, last_name, email, password_hash, role.lower()))
                     cursor.execute('''
                         INSERT INTO faculty (net_id, department)
                         VALUES (?, ?)
@@ -416,7 +498,9 @@ def register():
                         INSERT INTO labs (lab_name, description, website, location, faculty_net_id)
                         VALUES (?, ?, ?, ?, ?)
                     ''', (lab_name, lab_description, lab_website, lab_location, net_id))
-                    conn.commit()
+
+            run_write(write)
+            invalidate_faculty(net_id)
             send_signup_email(email, first_name)
             return redirect(url_for('profile'))
 
@@ -425,8 +509,17 @@ def login():
     if request.method == 'POST':
         net_id = request.form['net_id']
         password = request.form['password']
-        user = get_user_by_netid_password([net_id, password])
+        try:
+            check_login_rate(net_id, request.remote_addr)
+        except RateLimited as e:
+            retry_after = math.ceil(e.retry_after)
+            response = make_response(render_template(
+                'login.html', msg=f"Too many login attempts. Try again in {retry_after} seconds."), 429)
+            response.headers['Retry-After'] = str(retry_after)
+            return response
+        user = authenticate(net_id, password)
         if user:
+            login_succeeded(net_id)
             remember = 'remember' in request.form
             login_user(user, remember=remember)
             return redirect(url_for('profile'))
@@ -475,15 +568,8 @@ def reset_password(token):
         new_password = request.form['password']
         user = get_user_by_email([email])
         net_id = user.net_id
-        with connect('labsatyale.sqlite') as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                '''UPDATE users
-                   SET password_hash = ?
-                   WHERE net_id = ?''',
-                (generate_password_hash(new_password), net_id)
-            )
-            conn.commit()
+        update_password_hash(net_id, hash_password(new_password))
+        invalidate_user(net_id)
 
         return render_template(
             'message.html',
@@ -501,7 +587,7 @@ def profile():
     email_subscribed = False
 
     if current_user.role == 'student':
-        with closing(connect('labsatyale.sqlite')) as conn:
+        with get_connection() as conn:
             cur = conn.cursor()
             cur.execute('SELECT class_year, major FROM students WHERE net_id = ?', (current_user.net_id,))
             result = cur.fetchone()
@@ -509,7 +595,7 @@ def profile():
                 student_info = {'class_year': result[0], 'major': result[1]}
         email_subscribed = is_subscribed(current_user.net_id)
     elif current_user.role == 'faculty':
-        with closing(connect('labsatyale.sqlite')) as conn:
+        with get_connection() as conn:
             cur = conn.cursor()
             cur.execute('SELECT department FROM faculty WHERE net_id = ?', (current_user.net_id,))
             result = cur.fetchone()
@@ -529,22 +615,45 @@ def profile():
 def change_password():
     if request.method == 'POST':
         new_password = request.form['password']
-
-        with connect('labsatyale.sqlite') as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                '''UPDATE users
-                   SET password_hash = ?
-                   WHERE net_id = ?''',
-                (generate_password_hash(new_password), current_user.net_id)
-            )
-            conn.commit()
+        net_id = current_user.net_id
+        update_password_hash(net_id, hash_password(new_password))
+        invalidate_user(net_id)
 
         flash("Password updated successfully.", "success")
         return redirect(url_for('profile'))
 
     return render_template('change_password.html')
 
+@app.errorhandler(PoolBusy)
+def password_hashing_busy(e):
+    # Every hashing thread is busy and the queue is full: ask the client to come
+    # back shortly instead of queueing more work behind a burst of logins.
+    response = make_response(render_template(
+        'message.html', msg="The server is busy. Please try again in a moment."), 503)
+    response.headers['Retry-After'] = '1'
+    return response
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    flash(f"File size must be less than {MAX_RESUME_SIZE // (1024 * 1024)} MB", "error")
+    return redirect(request.referrer or url_for('profile'))
+
+
+def _store_resume_upload(file):
+    # Streams the upload into the resume store; the size cap and PDF header
+    # are checked chunk by chunk instead of after reading the whole file.
+    filename = secure_filename(file.filename)
+    try:
+        saved = update_student_resume(current_user.net_id, file.stream, filename, max_size=MAX_RESUME_SIZE)
+    except InvalidResume as e:
+        flash(str(e), "error")
+        return
+    if saved:
+        flash("Resume uploaded successfully", "success")
+    else:
+        flash("Failed to upload resume", "error")
+
+
 @app.route('/upload-resume-apply/<int:fellowship_id>', methods=['POST'])
 @login_required
 def upload_resume_application(fellowship_id):
@@ -563,21 +672,7 @@ def upload_resume_application(fellowship_id):
         flash("Only PDF files are allowed", "error")
         return redirect(url_for('apply_fellowship', fellowship_id=fellowship_id))
 
-    file.seek(0, 2)
-    file_size = file.tell()
-    file.seek(0)
-
-    if file_size > 10 * 1024 * 1024:
-        flash("File size must be less than 10 MB", "error")
-        return redirect(url_for('apply_fellowship', fellowship_id=fellowship_id))
-
-    resume_data = file.read()
-    filename = secure_filename(file.filename)
-
-    if update_student_resume(current_user.net_id, resume_data, filename):
-        flash("Resume uploaded successfully", "success")
-    else:
-        flash("Failed to upload resume", "error")
+    _store_resume_upload(file)
 
     return redirect(url_for('apply_fellowship', fellowship_id=fellowship_id))
 
@@ -598,21 +693,7 @@ def upload_resume():
         flash("Only PDF files are allowed", "error")
         return redirect(url_for('profile'))
 
-    file.seek(0, 2)  
-    file_size = file.tell()
-    file.seek(0) 
-
-    if file_size > 10 * 1024 * 1024:
-        flash("File size must be less than 10 MB", "error")
-        return redirect(url_for('profile'))
-
-    resume_data = file.read()
-    filename = secure_filename(file.filename)
-
-    if update_student_resume(current_user.net_id, resume_data, filename):
-        flash("Resume uploaded successfully", "success")
-    else:
-        flash("Failed to upload resume", "error")
+    _store_resume_upload(file)
 
     return redirect(url_for('profile'))
 
@@ -624,14 +705,7 @@ def view_resume():
     if not resume_info:
         return "No resume uploaded", 404
 
-    resume_data = resume_info['data']
-    filename = resume_info['filename']
-
-    return Response(
-        resume_data,
-        mimetype="application/pdf",
-        headers={"Content-Disposition": f"inline; filename={filename}"}
-    )
+    return _send_resume(resume_info)
 
 @app.route('/download-resume')
 @login_required
@@ -641,12 +715,7 @@ def download_resume():
         flash("No resume found", "error")
         return redirect(url_for('profile'))
 
-    return send_file(
-        io.BytesIO(resume_info['data']),
-        mimetype='application/pdf',
-        as_attachment=True,
-        download_name=resume_info['filename']
-    )
+    return _send_resume(resume_info, as_attachment=True)
 
 @app.route('/update-profile', methods=['POST'])
 @login_required
@@ -658,27 +727,32 @@ def update_profile():
         flash("First name and last name are required", "error")
         return redirect(url_for('profile'))
 
-    try:
-        with closing(connect('labsatyale.sqlite', timeout=10.0)) as conn:
-            cur = conn.cursor()
+    net_id = current_user.net_id
+    is_student = current_user.role == 'student'
+    major = request.form.get('major', '').strip()
+    class_year = request.form.get('class_year', '')
+
+    def write(conn):
+        cur = conn.cursor()
+        cur.execute('''
+            UPDATE users
+            SET first_name = ?, last_name = ?
+            WHERE net_id = ?
+        ''', (first_name, last_name, net_id))
+
+        if is_student and major:
             cur.execute('''
-                UPDATE users
-                SET first_name = ?, last_name = ?
+                UPDATE students
+                SET major = ?, class_year = ?
                 WHERE net_id = ?
-            ''', (first_name, last_name, current_user.net_id))
+            ''', (major, class_year if class_year else None, net_id))
 
-            if current_user.role == 'student':
-                major = request.form.get('major', '').strip()
-                class_year = request.form.get('class_year', '')
-
-                if major:
-                    cur.execute('''
-                        UPDATE students
-                        SET major = ?, class_year = ?
-                        WHERE net_id = ?
-                    ''', (major, class_year if class_year else None, current_user.net_id))
-
-            conn.commit()
+    try:
+        run_write(write)
+        invalidate_user(net_id)
+        if not is_student:
+            # Faculty names appear in the cached lab, faculty and fellowship data.
+            invalidate_faculty(net_id)
 
         current_user.first_name = first_name
         current_user.last_name = last_name
@@ -712,8 +786,8 @@ def run_matching_route():
         return redirect(url_for('index'))
 
     try:
-        matches = run_matching()
-        save_matches(matches)
+        strategy, params = _matching_options()
+        matches = match_and_save(strategy, **params)
         flash(f"Matching complete!", "success")
     except Exception as e:
         print(f"Matching error: {e}")
@@ -721,6 +795,36 @@ def run_matching_route():
     return redirect(url_for('view_matches'))
 
 
+@app.route('/run-matching/simulate', methods=['POST'])
+@login_required
+def simulate_matching_route():
+    """
+    Runs what-if matching scenarios without saving anything.
+
+    Expects a JSON body {"scenarios": [...], "workers": n}; see simulation.py
+    for the scenario fields.  At most MAX_SCENARIOS scenarios and MAX_WORKERS
+    workers are accepted.
+    """
+    if current_user.role != 'faculty':
+        return jsonify({'error': 'Only faculty can run matching simulations.'}), 403
+
+    body = request.get_json(silent=True) or {}
+    scenarios = body.get('scenarios') or [{}]
+    workers = body.get('workers')
+    if not isinstance(scenarios, list) or len(scenarios) > MAX_SCENARIOS:
+        return jsonify({'error': f'Send a list of at most {MAX_SCENARIOS} scenarios.'}), 400
+    if workers is not None and (type(workers) is not int or not 1 <= workers <= MAX_WORKERS):
+        return jsonify({'error': f'workers must be between 1 and {MAX_WORKERS}.'}), 400
+    try:
+        for scenario in scenarios:
+            if 'capacity' in scenario:
+                scenario['capacity'] = {int(fid): int(cap) for fid, cap in scenario['capacity'].items()}
+        results = simulate(scenarios, workers=workers)
+    except (ValueError, TypeError, AttributeError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'results': results})
+
+
 @app.route('/matches', methods=['GET'])
 @login_required
 def view_matches():
@@ -744,48 +848,129 @@ def view_matches():
         fellowship_matches=fellowship_matches
     )
 
+
+def _match_run_pair():
+    runs = get_match_runs()
+    new_run_id = request.args.get('new', type=int)
+    old_run_id = request.args.get('old', type=int)
+    if new_run_id is None and runs:
+        new_run_id = runs[0]['match_run_id']
+    if old_run_id is None:
+        older = [run['match_run_id'] for run in runs if new_run_id is not None and run['match_run_id'] < new_run_id]
+        old_run_id = older[0] if older else None
+    return runs, old_run_id, new_run_id
+
+
+@app.route('/matches/runs', methods=['GET'])
+@login_required
+def match_runs():
+    """
+    Lists the stored matching runs and shows what changed between two of
+    them (?old=&new=, by default the latest run and the one before it).
+    """
+    if current_user.role != 'faculty':
+        return redirect(url_for('index'))
+
+    runs, old_run_id, new_run_id = _match_run_pair()
+    diff, names = None, {}
+    known = {run['match_run_id'] for run in runs}
+    if old_run_id in known and new_run_id in known:
+        diff = diff_match_runs(old_run_id, new_run_id)
+        names = get_fellowship_names([f for _, f in diff['added']] + [f for _, f in diff['removed']] +
+                                     [f for _, old, new in diff['moved'] for f in (old, new)])
+    return render_template('match_runs.html', runs=runs, old_run_id=old_run_id, new_run_id=new_run_id,
+                           diff=diff, names=names)
+
+
+@app.route('/matches/runs/<int:old_run_id>/diff/<int:new_run_id>', methods=['GET'])
+@login_required
+def match_run_diff(old_run_id, new_run_id):
+    """Returns the two runs' metadata and the students added, removed and moved between them, as JSON."""
+    if current_user.role != 'faculty':
+        return jsonify({'error': 'Only faculty can view matching runs.'}), 403
+
+    old_run, new_run = get_match_run(old_run_id), get_match_run(new_run_id)
+    if old_run is None or new_run is None:
+        return jsonify({'error': 'No such matching run.'}), 404
+    diff = diff_match_runs(old_run_id, new_run_id)
+    return jsonify({
+        'old': old_run,
+        'new': new_run,
+        'added': [{'student_net_id': s, 'fellowship_id': f} for s, f in diff['added']],
+        'removed': [{'student_net_id': s, 'fellowship_id': f} for s, f in diff['removed']],
+        'moved': [{'student_net_id': s, 'old_fellowship_id': old, 'new_fellowship_id': new}
+                  for s, old, new in diff['moved']],
+    })
+
+
+def _export(name, fmt, columns, rows):
+    return export_response(name, fmt, columns, rows, compress=request.accept_encodings['gzip'] > 0)
+
+
+@app.route('/export/fellowships/<int:fellowship_id>/applicants.<any(csv, json):fmt>', methods=['GET'])
+@login_required
+def export_applicants(fellowship_id, fmt):
+    """Streams the applications to one of the faculty member's fellowships as CSV or JSON."""
+    if current_user.role != 'faculty':
+        return redirect(url_for('index'))
+    if not any(f.get_fellowship_id() == fellowship_id for f in get_fellowships_by_faculty(current_user.net_id)):
+        return render_template('message.html', msg='Fellowship not found.'), 404
+
+    return _export(f'fellowship-{fellowship_id}-applicants', fmt, APPLICANT_EXPORT_COLUMNS,
+                   iter_fellowship_applicants(current_user.net_id, fellowship_id))
+
+
+@app.route('/export/matches.<any(csv, json):fmt>', methods=['GET'])
+@login_required
+def export_matches(fmt):
+    """Streams the matches of one matching run (?run=, by default the latest) as CSV or JSON."""
+    if current_user.role != 'faculty':
+        return redirect(url_for('index'))
+    run_id = request.args.get('run', type=int)
+    if run_id is None:
+        runs = get_match_runs()
+        run_id = runs[0]['match_run_id'] if runs else None
+    if run_id is None or get_match_run(run_id) is None:
+        return render_template('message.html', msg='No such matching run.'), 404
+
+    return _export(f'matches-run-{run_id}', fmt, MATCH_EXPORT_COLUMNS, iter_matches(run_id))
+
+
+@app.route('/export/preferences/<any(student, faculty):side>.<any(csv, json):fmt>', methods=['GET'])
+@login_required
+def export_preferences(side, fmt):
+    """Streams every student's (or every fellowship's) ranking as CSV or JSON."""
+    if current_user.role != 'faculty':
+        return redirect(url_for('index'))
+    if side == 'student':
+        return _export('student-preferences', fmt, STUDENT_PREFERENCE_EXPORT_COLUMNS, iter_student_preferences())
+    return _export('faculty-preferences', fmt, FACULTY_PREFERENCE_EXPORT_COLUMNS, iter_faculty_preferences())
+
+
 def notify_users(fellow_name, class_years):
-    print("in this loop...")
     try:
-        subscribers = get_notification_subscribers()
-        if not subscribers:
-            print("No subscribers to notify.")
-            return
-
+        subscribers = get_notification_subscribers(class_years)
         emails = [s[1] for s in subscribers if s[1]]
-        print(emails)
         if not emails:
-            print("No valid email addresses found.")
-            return
-
-        smtp_email = "labsatyale@gmail.com"
-        smtp_password = "ncozncushzevtgts"
-
-        if not smtp_email or not smtp_password:
-            print("SMTP_EMAIL and SMTP_PASSWORD environment variables not set")
-            flash(f"Notification system not configured. Please set SMTP_EMAIL and SMTP_PASSWORD environment variables.", "warning")
+            print("No subscribers to notify.")
             return
 
-        smtp = smtplib.SMTP('smtp.gmail.com', 587)
-        smtp.ehlo()
-        smtp.starttls()
-        smtp.login(smtp_email, smtp_password)
         subject = f"New Fellowship Posted: {fellow_name} for Class Years {', '.join(class_years)}"
-        msg = MIMEMultipart()
-        msg['Subject'] = subject
         text = f"A new fellowship '{fellow_name}' has been posted for class years {', '.join(class_years)}. Check it out at LabsAtYale. To unsubscribe from these notifications, update your profile settings."
-        msg.attach(MIMEText(text))
-        smtp.sendmail(from_addr=smtp_email, to_addrs=emails, msg=msg.as_string())
-        smtp.quit()
-        print("Ok it worked!")
+
+        def make_message():
+            msg = MIMEMultipart()
+            msg['Subject'] = subject
+            msg.attach(MIMEText(text))
+            return msg
+
+        queue_notification(make_message, emails, class_years,
+                           batch_size=app.config.get('NOTIFY_BATCH_SIZE', NOTIFY_BATCH_SIZE))
     except Exception as e:
         print(f"Error notifying users: {e}")
 
 def send_signup_email(email, first_name):
     try:
-        smtp_email = "labsatyale@gmail.com"
-        smtp_password = "ncozncushzevtgts"
-
         subject = "Welcome to LabsAtYale 🎉"
         body = f"""
 Hi {first_name},
@@ -800,21 +985,15 @@ If you did not create this account, please contact us immediately.
 """
 
         msg = MIMEMultipart()
-        msg["From"] = smtp_email
+        msg["From"] = SMTP_EMAIL
         msg["To"] = email
         msg["Subject"] = subject
         msg.attach(MIMEText(body))
 
-        smtp = smtplib.SMTP("smtp.gmail.com", 587)
-        smtp.starttls()
-        smtp.login(smtp_email, smtp_password)
-        smtp.sendmail(smtp_email, email, msg.as_string())
-        smtp.quit()
-
-        print("Signup email sent")
+        queue_email(msg)
 
     except Exception as e:
-        print(f"Error sending signup email: {e}")
+        print(f"Error queueing signup email: {e}")
 
 def generate_reset_token(email):
     s = URLSafeTimedSerializer(current_app.config['SECRET_KEY'])
@@ -832,9 +1011,6 @@ def send_password_reset_email(email):
     token = generate_reset_token(email)
     reset_url = url_for('reset_password', token=token, _external=True)
 
-    smtp_email = "labsatyale@gmail.com"
-    smtp_password = "ncozncushzevtgts"
-
     subject = "Reset your LabsAtYale password"
     body = f"""
 We received a request to reset your password.
@@ -848,15 +1024,11 @@ If you did not request this, you can safely ignore this email.
 """
 
     msg = MIMEMultipart()
-    msg['From'] = smtp_email
+    msg['From'] = SMTP_EMAIL
     msg['To'] = email
     msg['Subject'] = subject
     msg.attach(MIMEText(body))
 
-    smtp = smtplib.SMTP('smtp.gmail.com', 587)
-    smtp.starttls()
-    smtp.login(smtp_email, smtp_password)
-    smtp.sendmail(smtp_email, email, msg.as_string())
-    smtp.quit()
+    queue_email(msg)
 
 
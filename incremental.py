@@ -0,0 +1,263 @@
+"""
+Incremental re-matching for Labs at Yale.
+
+A full matching run starts every student from the top of their ranking.  When
+a single student or a single fellowship changes its ranking, most of that work
+would be repeated unchanged, so this module saves the proposal state behind
+the current matches (how far down their ranking each student has proposed,
+and which students each fellowship has turned down) and, on a change, replays
+only the proposals that the change can affect.
+
+The affected set is found by closure:
+    - a student whose ranking changed starts over, giving up their seat and
+      withdrawing the proposals that made fellowships turn others down, so
+      those fellowships are replayed as well;
+    - a fellowship whose ranking changed drops every student it holds or
+      turned down, since its decisions may now differ;
+    - a fellowship that loses a student has a free seat, so every student it
+      turned down starts over too, which may free further seats.
+
+Student-proposing deferred acceptance ends in the same matching whatever order
+proposals are made in, so resuming from this state gives the same result as a
+full run.  Only the strategies built on that loop (`INCREMENTAL_STRATEGIES`)
+can be updated this way; the others always run in full.
+
+Functions:
+    - match_and_save(strategy, **params)
+    - rematch(students=(), fellowships=())
+"""
+import time
+from heapq import heapify
+
+from database import (get_matches, get_matching_state_version, load_matching_state, save_matches,
+                      save_matching_state)
+from matching import DEFAULT_STRATEGY, TOP_K, load_preferences, propose, run_strategy
+
+# Strategy name -> default top_k, for strategies that `propose()` implements.
+INCREMENTAL_STRATEGIES = {
+    'mutual_top_k': TOP_K,
+    'student_proposing': None,
+}
+# Times a save is recomputed when another save changed the state first.
+SAVE_ATTEMPTS = 5
+
+
+class MatchingState:
+    """
+    Proposal state behind a matching, keyed by net_id and fellowship_id.
+
+    Attributes:
+        strategy (str): Strategy the state was computed with.
+        top_k (int | None): Cutoff the state was computed with.
+        next_choice (dict[str, int]): Position each student proposes to next.
+        held (dict[int, list[str]]): Current matches.
+        rejected (dict[int, set[str]]): Students each fellowship has turned down.
+    """
+    def __init__(self, strategy, top_k, next_choice, held, rejected):
+        self.strategy = strategy
+        self.top_k = top_k
+        self.next_choice = next_choice
+        self.held = held
+        self.rejected = rejected
+
+    @classmethod
+    def empty(cls, strategy, top_k):
+        """Return the state before any proposals."""
+        return cls(strategy, top_k, {}, {}, {})
+
+    def diff(self, old):
+        """
+        Return the rows that change when going from `old` to this state.
+
+        Returns:
+            dict: In the format `database.save_matching_state` expects.
+        """
+        progress = {s: n for s, n in self.next_choice.items() if old.next_choice.get(s) != n}
+        progress.update({s: None for s in old.next_choice if s not in self.next_choice})
+        old_rejections, new_rejections = _pairs(old.rejected), _pairs(self.rejected)
+        old_matches, new_matches = _pairs(old.held), _pairs(self.held)
+        return {
+            'progress': progress,
+            'rejections_added': sorted(new_rejections - old_rejections),
+            'rejections_removed': sorted(old_rejections - new_rejections),
+            'matches_added': sorted(new_matches - old_matches),
+            'matches_removed': sorted(old_matches - new_matches),
+        }
+
+
+def match_and_save(strategy=DEFAULT_STRATEGY, **params):
+    """
+    Run a full matching and save it as a new match run.
+
+    The run records the strategy, its parameters and how long the matching
+    took (loading the preferences included, saving not).  For incremental
+    strategies the proposal state is saved too; the new run starts as a copy
+    of the current one and only rows that differ from the previous state are
+    written.
+
+    Returns:
+        dict[int, list[str]]: The new matches.
+    """
+    start = time.perf_counter()
+    if strategy not in INCREMENTAL_STRATEGIES:
+        matches = run_strategy(strategy, **params)
+        save_matches(matches, strategy=strategy, params=params, duration=time.perf_counter() - start)
+        return matches
+
+    top_k = params.get('top_k', INCREMENTAL_STRATEGIES[strategy])
+    data = load_preferences()
+    state = update(MatchingState.empty(strategy, top_k), data, students=data.student_ids)
+    duration = time.perf_counter() - start
+    # The new run is written as a diff from the current one, so the diff is
+    # recomputed if the current one changes before it is written.
+    for _ in range(SAVE_ATTEMPTS):
+        version = get_matching_state_version()
+        old = _saved_state() or MatchingState(strategy, top_k, {}, get_matches(), {})
+        if save_matching_state(strategy, top_k, state.diff(old), new_run=True, duration=duration,
+                               version=version) is not None:
+            return state.held
+    raise RuntimeError('matches kept changing while they were being saved')
+
+
+def rematch(students=(), fellowships=()):
+    """
+    Bring the saved matches up to date after some rankings changed.
+
+    The current match run is updated in place; only full matchings start a new run.
+    If another save changes the state while this one is being computed, the
+    update is recomputed from the new state rather than written over it.
+
+    Does nothing if the current matches were not produced by an incremental
+    strategy (or no matching has been run yet).
+
+    Args:
+        students (iterable[str]): net_ids whose rankings or applications changed.
+        fellowships (iterable[int]): fellowship_ids whose faculty ranking changed.
+
+    Returns:
+        dict | None: The diff that was written, or None if nothing was done.
+
+    Raises:
+        RuntimeError: If the state changed under every one of SAVE_ATTEMPTS tries.
+    """
+    students, fellowships = list(students), list(fellowships)
+    for _ in range(SAVE_ATTEMPTS):
+        version = get_matching_state_version()
+        old = _saved_state()
+        if old is None or old.strategy not in INCREMENTAL_STRATEGIES:
+            return None
+        state = update(old, load_preferences(), students=students, fellowships=fellowships)
+        diff = state.diff(old)
+        if save_matching_state(state.strategy, state.top_k, diff, version=version) is not None:
+            return diff
+    raise RuntimeError('matches kept changing while they were being updated')
+
+
+def update(state, data, students=(), fellowships=()):
+    """
+    Replay the proposals affected by changed rankings.
+
+    Students and fellowships that appear in `data` but not in `state` (or the
+    other way round) are treated as changed, so a new application or a deleted
+    fellowship is picked up without being named.
+
+    Args:
+        state (MatchingState): State computed before the change.
+        data (PreferenceTable): Preferences after the change.
+        students (iterable[str]): net_ids whose rankings changed.
+        fellowships (iterable[int]): fellowship_ids whose rankings changed.
+
+    Returns:
+        MatchingState: The new state. `state` is not modified.
+    """
+    student_index = {s: i for i, s in enumerate(data.student_ids)}
+    fellowship_index = {fid: f for f, fid in enumerate(data.fellowship_ids)}
+
+    reset = {student_index[s] for s in students if s in student_index}
+    reset.update(i for s, i in student_index.items() if s not in state.next_choice)
+    changed = {fellowship_index[fid] for fid in fellowships if fid in fellowship_index}
+    freed = set()
+
+    owner = {}
+    for fid, net_ids in state.held.items():
+        f = fellowship_index.get(fid)
+        for net_id in net_ids:
+            s = student_index.get(net_id)
+            if s is None:
+                if f is not None:
+                    freed.add(f)
+            elif f is None:
+                reset.add(s)
+            else:
+                owner[s] = f
+                if s not in data.faculty_rank[f]:
+                    changed.add(f)
+
+    rejected = [set() for _ in data.fellowship_ids]
+    rejected_by = {}
+    for fid, net_ids in state.rejected.items():
+        f = fellowship_index.get(fid)
+        if f is not None:
+            rejected[f] = {student_index[s] for s in net_ids if s in student_index}
+            for s in rejected[f]:
+                rejected_by.setdefault(s, []).append(f)
+
+    # Close over everything the change can reach.  A reset student's old
+    # proposals are withdrawn, so the fellowship holding them and every
+    # fellowship that turned them down (possibly bumping someone else to
+    # hold them) are replayed too.
+    pending_students = list(reset)
+    pending_fellowships = [(f, True) for f in changed] + [(f, False) for f in freed]
+    seen = {}
+    while pending_students or pending_fellowships:
+        while pending_students:
+            s = pending_students.pop()
+            f = owner.pop(s, None)
+            if f is not None:
+                pending_fellowships.append((f, False))
+            pending_fellowships.extend((g, False) for g in rejected_by.get(s, ()))
+        while pending_fellowships:
+            f, ranking_changed = pending_fellowships.pop()
+            if seen.get(f) is True or (seen.get(f) is False and not ranking_changed):
+                continue
+            seen[f] = ranking_changed
+            victims = set(rejected[f])
+            if ranking_changed:
+                victims.update(s for s, held_at in owner.items() if held_at == f)
+            for s in victims - reset:
+                reset.add(s)
+                pending_students.append(s)
+
+    for f in range(len(rejected)):
+        rejected[f] -= reset
+
+    held = [[] for _ in data.fellowship_ids]
+    for s, f in owner.items():
+        held[f].append((-data.faculty_rank[f][s], s))
+    for holders in held:
+        heapify(holders)
+
+    student_next = [0 if i in reset else state.next_choice.get(s, 0) for i, s in enumerate(data.student_ids)]
+    propose(data, state.top_k, held, student_next, list(reset), rejected)
+
+    return MatchingState(
+        state.strategy,
+        state.top_k,
+        dict(zip(data.student_ids, student_next)),
+        {data.fellowship_ids[f]: [data.student_ids[s] for _, s in sorted(holders, reverse=True)]
+         for f, holders in enumerate(held) if holders},
+        {data.fellowship_ids[f]: {data.student_ids[s] for s in students_turned_down}
+         for f, students_turned_down in enumerate(rejected) if students_turned_down},
+    )
+
+
+def _saved_state():
+    saved = load_matching_state()
+    if saved is None:
+        return None
+    return MatchingState(saved['strategy'], saved['top_k'], saved['next_choice'],
+                         saved['held'], saved['rejected'])
+
+
+def _pairs(mapping):
+    return {(fid, s) for fid, students in mapping.items() for s in students}
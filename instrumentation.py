@@ -0,0 +1,336 @@
+"""
+Per-request query instrumentation for Labs at Yale.
+
+Every connection the database module opens is an `InstrumentedConnection`,
+whose cursors time each statement and count the rows fetched from it.  While
+a request is being handled, those numbers are added to the request's
+`QueryStats`; outside a request (the writer thread, scripts, tests) the
+cursors only pay for one thread-local lookup.
+
+At the end of each request `init_app` hooks:
+    - log one JSON line with the endpoint, status, query count, DB time, rows
+      and the slowest statements, with `EXPLAIN QUERY PLAN` output for any
+      statement slower than `QUERY_SLOW_MS`;
+    - add X-DB-Queries / X-DB-Time-ms / X-DB-Rows / X-DB-Slowest-ms headers
+      when the app is in debug mode (or `QUERY_DEBUG_HEADERS` is set);
+    - add the numbers to per-endpoint counters served at `/metrics` in the
+      Prometheus text format.
+
+The metrics name every endpoint and how busy it is, so they are not served
+unless `METRICS_ACCESS` allows it: 'off' (the default) answers 404, 'local'
+serves loopback clients only and 'any' serves everyone.  Behind a reverse
+proxy on the same host every client looks local, so use 'off' there.
+
+Writes handed to the WAL writer thread run outside the request and are not
+counted against it.
+
+Classes:
+    - QueryStats: Numbers for one request.
+    - InstrumentedConnection / InstrumentedCursor: sqlite3 subclasses that record them.
+
+Functions:
+    - init_app(app, get_connection)
+    - current_stats()
+    - add_metrics_renderer(render)
+    - metrics_allowed()
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from flask import Response, abort, current_app, g, request
+
+logger = logging.getLogger('labsatyale.queries')
+
+SLOW_MS = 100
+SLOWEST_KEPT = 5
+METRICS_ACCESS = ('off', 'local', 'any')
+_LOOPBACK = ('127.0.0.1', '::1')
+
+_local = threading.local()
+_metrics_lock = threading.Lock()
+_metrics = {}
+_metric_renderers = []
+
+
+class QueryStats:
+    """
+    Query numbers for one request.
+
+    Attributes:
+        queries (int): Statements executed.
+        seconds (float): Time spent in execute and fetch calls.
+        rows (int): Rows fetched.
+        statements (list[dict]): `sql`, `params`, `seconds` and `rows` of each statement.
+    """
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.statements = []
+
+    def slowest(self, n=SLOWEST_KEPT):
+        return sorted(self.statements, key=lambda s: s['seconds'], reverse=True)[:n]
+
+
+def current_stats():
+    """Return the QueryStats being collected on this thread, or None."""
+    return getattr(_local, 'stats', None)
+
+
+def start_collecting():
+    _local.stats = QueryStats()
+    return _local.stats
+
+
+def stop_collecting():
+    stats = getattr(_local, 'stats', None)
+    _local.stats = None
+    return stats
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that reports statement time and fetched rows to the current QueryStats."""
+    _entry = None
+
+    def execute(self, sql, parameters=()):
+        stats = getattr(_local, 'stats', None)
+        if stats is None:
+            self._entry = None
+            return super().execute(sql, parameters)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._record(stats, sql, parameters, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        stats = getattr(_local, 'stats', None)
+        if stats is None:
+            self._entry = None
+            return super().executemany(sql, seq_of_parameters)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._record(stats, sql, None, time.perf_counter() - start)
+
+    def executescript(self, sql_script):
+        stats = getattr(_local, 'stats', None)
+        if stats is None:
+            self._entry = None
+            return super().executescript(sql_script)
+        start = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            self._record(stats, sql_script, None, time.perf_counter() - start)
+
+    def fetchone(self):
+        if self._entry is None:
+            return super().fetchone()
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(time.perf_counter() - start, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size=None):
+        if self._entry is None:
+            return super().fetchmany(self.arraysize if size is None else size)
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(time.perf_counter() - start, len(rows))
+        return rows
+
+    def fetchall(self):
+        if self._entry is None:
+            return super().fetchall()
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(time.perf_counter() - start, len(rows))
+        return rows
+
+    def __iter__(self):
+        # Only wrap iteration while collecting, so plain iteration stays in C.
+        if self._entry is None:
+            return self
+        return self._iterate()
+
+    def _iterate(self):
+        next_row = super().__next__
+        clock = time.perf_counter
+        seconds = 0.0
+        rows = 0
+        try:
+            while True:
+                start = clock()
+                try:
+                    row = next_row()
+                except StopIteration:
+                    seconds += clock() - start
+                    return
+                seconds += clock() - start
+                rows += 1
+                yield row
+        finally:
+            self._fetched(seconds, rows)
+
+    def _record(self, stats, sql, parameters, seconds):
+        self._entry = {'sql': sql, 'params': parameters, 'seconds': seconds, 'rows': 0}
+        self._stats = stats
+        stats.queries += 1
+        stats.seconds += seconds
+        stats.statements.append(self._entry)
+
+    def _fetched(self, seconds, rows):
+        self._entry['seconds'] += seconds
+        self._entry['rows'] += rows
+        self._stats.seconds += seconds
+        self._stats.rows += rows
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors (including the implicit ones) are InstrumentedCursors."""
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+def explain(conn, sql, params):
+    """Return the EXPLAIN QUERY PLAN lines for a statement, or None if it cannot be explained."""
+    try:
+        rows = sqlite3.Connection.execute(conn, f'EXPLAIN QUERY PLAN {sql}', params or ()).fetchall()
+    except sqlite3.Error:
+        return None
+    return [r[3] for r in rows]
+
+
+def init_app(app, get_connection):
+    """
+    Collect query stats for every request of `app` and serve `/metrics`.
+
+    Register this before other `before_request` hooks so their queries count.
+
+    Args:
+        app (Flask): The application.
+        get_connection (callable): The database module's `get_connection`,
+            used to run EXPLAIN QUERY PLAN for slow statements.
+    """
+    app.config.setdefault('QUERY_SLOW_MS', SLOW_MS)
+    app.config.setdefault('QUERY_DEBUG_HEADERS', False)
+    app.config.setdefault('METRICS_ACCESS', 'off')
+
+    @app.before_request
+    def start_query_stats():
+        g.query_stats = start_collecting()
+
+    @app.after_request
+    def report_query_stats(response):
+        stats = stop_collecting()
+        if stats is None or request.endpoint == 'metrics':
+            return response
+        endpoint = request.endpoint or 'unknown'
+        slow_seconds = app.config['QUERY_SLOW_MS'] / 1000
+        slowest = stats.slowest()
+        slow = [s for s in slowest if s['seconds'] >= slow_seconds]
+        if slow:
+            with get_connection() as conn:
+                for statement in slow:
+                    statement['plan'] = explain(conn, statement['sql'], statement['params'])
+
+        _add_metrics(endpoint, stats, len(slow))
+        logger.info(json.dumps({
+            'endpoint': endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': stats.queries,
+            'db_ms': round(stats.seconds * 1000, 3),
+            'rows': stats.rows,
+            'slow_queries': len(slow),
+            'slowest': [
+                {'sql': ' '.join(s['sql'].split()), 'ms': round(s['seconds'] * 1000, 3),
+                 'rows': s['rows'], 'plan': s.get('plan')}
+                for s in slowest
+            ],
+        }))
+
+        if app.debug or app.config['QUERY_DEBUG_HEADERS']:
+            response.headers['X-DB-Queries'] = str(stats.queries)
+            response.headers['X-DB-Time-ms'] = f'{stats.seconds * 1000:.3f}'
+            response.headers['X-DB-Rows'] = str(stats.rows)
+            if slowest:
+                response.headers['X-DB-Slowest-ms'] = f"{slowest[0]['seconds'] * 1000:.3f}"
+        return response
+
+    @app.teardown_request
+    def discard_query_stats(exc):
+        stop_collecting()
+
+    @app.route('/metrics')
+    def metrics():
+        if not metrics_allowed():
+            abort(404)
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+
+def _add_metrics(endpoint, stats, slow):
+    with _metrics_lock:
+        m = _metrics.setdefault(endpoint, {'requests': 0, 'queries': 0, 'seconds': 0.0, 'rows': 0, 'slow': 0})
+        m['requests'] += 1
+        m['queries'] += stats.queries
+        m['seconds'] += stats.seconds
+        m['rows'] += stats.rows
+        m['slow'] += slow
+
+
+_METRICS = [
+    ('requests', 'labsatyale_requests_total', 'Requests handled.'),
+    ('queries', 'labsatyale_db_queries_total', 'SQL statements executed.'),
+    ('seconds', 'labsatyale_db_seconds_total', 'Time spent executing and fetching SQL.'),
+    ('rows', 'labsatyale_db_rows_total', 'Rows fetched from SQL statements.'),
+    ('slow', 'labsatyale_db_slow_queries_total', 'Statements slower than QUERY_SLOW_MS.'),
+]
+
+
+def metric_label(value):
+    """Escape a Prometheus label value."""
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def metrics_allowed():
+    """Return whether the current request may read the metrics endpoints (see `METRICS_ACCESS`)."""
+    access = current_app.config.get('METRICS_ACCESS', 'off')
+    if access == 'any':
+        return True
+    return access == 'local' and request.remote_addr in _LOOPBACK
+
+
+def add_metrics_renderer(render):
+    """Append the lines returned by `render()` to every `/metrics` response."""
+    _metric_renderers.append(render)
+
+
+def render_metrics():
+    """Return the per-endpoint counters in the Prometheus text exposition format."""
+    with _metrics_lock:
+        snapshot = {endpoint: dict(m) for endpoint, m in _metrics.items()}
+    lines = []
+    for key, name, help_text in _METRICS:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for endpoint in sorted(snapshot):
+            lines.append(f'{name}{{endpoint="{metric_label(endpoint)}"}} {snapshot[endpoint][key]}')
+    for render in _metric_renderers:
+        lines.extend(render())
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,314 @@
+"""
+Background email delivery for Labs at Yale.
+
+Request handlers used to open an SMTP connection, STARTTLS, log in and send
+before returning, so `/register`, `/add_fellowship` and `/forgot-password`
+waited on the mail server.  They now call `queue_email()`, which only inserts
+the message into the `email_outbox` table, and a pool of `EmailWorker`
+threads delivers it in the background.
+
+Each worker thread keeps one authenticated SMTP session open and reuses it
+for every message it sends, reconnecting only when the server drops it.  A
+failed delivery is retried with exponential backoff until `max_attempts`;
+refused recipients are not retried.  Because the outbox is a table, messages
+queued while no worker is running (or lost by a crashed one) are sent once a
+worker picks them up.
+
+Transports are pluggable: anything with `send(from_addr, to_addrs, message)`
+and `close()` works.  `SMTPTransport` talks to a real server; to try it
+against a local debugging server, run `python -m aiosmtpd -n -l localhost:8025`
+and set SMTP_HOST=localhost, SMTP_PORT=8025, SMTP_STARTTLS=0.
+
+Notifications to many students go through `queue_notification()`, which
+splits the recipients into batches of `batch_size` and queues one message per
+batch, so the worker threads send the batches concurrently over their SMTP
+sessions and each batch's delivery is recorded on its own outbox row (see
+`database.get_notification_metrics`).
+
+Classes:
+    - SMTPTransport: A reusable SMTP session.
+    - MemoryTransport: Records messages instead of sending them (for tests).
+    - EmailWorker: Pool of threads draining the outbox.
+
+Functions:
+    - queue_email(msg, to_addrs=None)
+    - queue_notification(make_message, recipients, class_years, batch_size)
+    - start_email_worker(transport_factory=None, workers=2)
+    - stop_email_worker()
+"""
+import os
+import smtplib
+import threading
+import time
+
+from database import claim_emails, enqueue_email, enqueue_notification, mark_email_failed, mark_email_sent
+
+SMTP_HOST = os.environ.get('SMTP_HOST', 'smtp.gmail.com')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', 587))
+SMTP_STARTTLS = os.environ.get('SMTP_STARTTLS', '1') != '0'
+SMTP_EMAIL = os.environ.get('SMTP_EMAIL', 'labsatyale@gmail.com')
+SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD', 'ncozncushzevtgts')
+NOTIFY_BATCH_SIZE = 50
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+class SMTPTransport:
+    """
+    One SMTP session, opened on first use and kept for later messages.
+
+    Attributes:
+        idle_timeout (float): After this many idle seconds the session is checked
+            with NOOP before use, since servers drop idle clients.
+    """
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, username=SMTP_EMAIL, password=SMTP_PASSWORD,
+                 starttls=SMTP_STARTTLS, timeout=30, idle_timeout=60):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.connections = 0
+        self._smtp = None
+        self._last_used = 0.0
+
+    def send(self, from_addr, to_addrs, message):
+        """
+        Send one message, reconnecting once if the session was dropped.
+
+        Raises:
+            smtplib.SMTPException, OSError: If delivery fails.
+        """
+        smtp = self._session()
+        try:
+            smtp.sendmail(from_addr, to_addrs, message)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            self.close()
+            self._session().sendmail(from_addr, to_addrs, message)
+        self._last_used = time.monotonic()
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+
+    def _session(self):
+        if self._smtp is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            try:
+                self._smtp.noop()
+            except (smtplib.SMTPException, OSError):
+                self.close()
+        if self._smtp is None:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            smtp.ehlo()
+            if self.starttls:
+                smtp.starttls()
+                smtp.ehlo()
+            if self.username and self.password:
+                smtp.login(self.username, self.password)
+            self._smtp = smtp
+            self.connections += 1
+        return self._smtp
+
+
+class MemoryTransport:
+    """Keeps every message in `sent` as (from_addr, to_addrs, message)."""
+    def __init__(self):
+        self.sent = []
+
+    def send(self, from_addr, to_addrs, message):
+        self.sent.append((from_addr, list(to_addrs), message))
+
+    def close(self):
+        pass
+
+
+class EmailWorker:
+    """
+    Threads that claim due outbox messages and deliver them.
+
+    Attributes:
+        stats (dict): Counts of `sent`, `retried` and `failed` deliveries.
+    """
+    def __init__(self, transport_factory=SMTPTransport, workers=2, from_addr=SMTP_EMAIL, claim_size=1,
+                 poll_interval=5.0, lease=300.0, max_attempts=5, backoff=30.0, max_backoff=3600.0):
+        """
+        Initialize an EmailWorker and start its threads.
+
+        Args:
+            transport_factory (callable): Returns a new transport; each thread gets its own.
+            workers (int): Number of threads, i.e. SMTP sessions kept open.
+            from_addr (str): Envelope sender.
+            claim_size (int): Messages a thread claims at a time. Small claims
+                spread a notification's batches across the threads.
+            poll_interval (float): Seconds between outbox checks when idle.
+            lease (float): Seconds a claimed message stays hidden from other threads.
+            max_attempts (int): Attempts before a message is marked failed.
+            backoff (float): Delay before the first retry; doubles each attempt.
+            max_backoff (float): Longest delay between retries.
+        """
+        self.from_addr = from_addr
+        self.claim_size = claim_size
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stats = {'sent': 0, 'retried': 0, 'failed': 0}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._run, args=(transport_factory,), name=f'mailer-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def wake(self):
+        """Check the outbox now instead of at the next poll."""
+        self._wake.set()
+
+    def stop(self):
+        """Finish the messages already claimed, then stop every thread."""
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join()
+
+    def retry_delay(self, attempts):
+        """Seconds to wait after the `attempts`-th failed attempt."""
+        return min(self.backoff * 2 ** (attempts - 1), self.max_backoff)
+
+    def _run(self, transport_factory):
+        transport = transport_factory()
+        try:
+            while not self._stop.is_set():
+                try:
+                    batch = claim_emails(self.claim_size, self.lease)
+                except Exception as e:
+                    print(f"Error claiming emails: {e}")
+                    batch = []
+                if not batch:
+                    self._wake.wait(self.poll_interval)
+                    self._wake.clear()
+                    continue
+                for email_id, to_addrs, message, attempts in batch:
+                    try:
+                        self._deliver(transport, email_id, to_addrs, message, attempts + 1)
+                    except Exception as e:
+                        # Recording the outcome failed (e.g. the database was locked).  Keep
+                        # the thread alive; the message is claimed again once its lease expires.
+                        print(f"Error recording delivery of email {email_id}: {e}")
+        finally:
+            transport.close()
+
+    def _deliver(self, transport, email_id, to_addrs, message, attempt):
+        start = time.perf_counter()
+        try:
+            transport.send(self.from_addr, to_addrs, message)
+        except smtplib.SMTPRecipientsRefused as e:
+            mark_email_failed(email_id, f"recipients refused: {e.recipients}")
+            self._count('failed')
+            return
+        except Exception as e:
+            if attempt >= self.max_attempts:
+                mark_email_failed(email_id, str(e))
+                self._count('failed')
+            else:
+                mark_email_failed(email_id, str(e), retry_at=time.time() + self.retry_delay(attempt))
+                self._count('retried')
+            return
+        mark_email_sent(email_id, send_seconds=time.perf_counter() - start)
+        self._count('sent')
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+
+def queue_email(msg, to_addrs=None):
+    """
+    Queue a message for background delivery and return at once.
+
+    Args:
+        msg (email.message.Message): The message. A missing From header is
+            filled in with the sending account.
+        to_addrs (list[str], optional): Envelope recipients. Defaults to the
+            message's To header.
+
+    Returns:
+        int: The outbox id of the message.
+    """
+    if msg['From'] is None:
+        msg['From'] = SMTP_EMAIL
+    if to_addrs is None:
+        to_addrs = [msg['To']]
+    email_id = enqueue_email(to_addrs, msg.as_string())
+    if _worker is not None:
+        _worker.wake()
+    return email_id
+
+
+def queue_notification(make_message, recipients, class_years=(), batch_size=NOTIFY_BATCH_SIZE):
+    """
+    Queue one message per batch of `batch_size` recipients.
+
+    Args:
+        make_message (callable): Returns a new Message; called once per batch.
+        recipients (list[str]): Email addresses to notify.
+        class_years (iterable): Class years targeted, recorded with the metrics.
+        batch_size (int): Most envelope recipients per message.
+
+    Returns:
+        int | None: The notification id, or None if there was nobody to notify.
+    """
+    if not recipients:
+        return None
+    batches = []
+    subject = None
+    for i in range(0, len(recipients), batch_size):
+        msg = make_message()
+        if msg['From'] is None:
+            msg['From'] = SMTP_EMAIL
+        subject = msg['Subject']
+        batches.append((recipients[i:i + batch_size], msg.as_string()))
+    notification_id = enqueue_notification(subject or '', list(class_years), batches)
+    if _worker is not None:
+        _worker.wake()
+    return notification_id
+
+
+def start_email_worker(transport_factory=None, workers=2, **options):
+    """
+    Start the shared background worker (replacing any running one).
+
+    Args:
+        transport_factory (callable, optional): Defaults to `SMTPTransport`.
+        workers (int): Number of threads / SMTP sessions.
+        **options: Passed to `EmailWorker`.
+
+    Returns:
+        EmailWorker: The running worker.
+    """
+    global _worker
+    with _worker_lock:
+        if _worker is not None:
+            _worker.stop()
+        _worker = EmailWorker(transport_factory or SMTPTransport, workers=workers, **options)
+        return _worker
+
+
+def stop_email_worker():
+    """Stop the shared background worker, if one is running."""
+    global _worker
+    with _worker_lock:
+        if _worker is not None:
+            _worker.stop()
+            _worker = None
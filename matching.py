@@ -1,77 +1,332 @@
-from database import (
-    get_all_students_with_applications,
-    get_all_fellowships,
-    get_student_preferences,
-    get_faculty_preferences,
-)
+import sys
+from heapq import heappush, heapreplace
 
+from database import load_matching_inputs
 
-def run_matching():
+# Students only propose to their top TOP_K fellowships, and a fellowship only
+# accepts students it ranked in its top TOP_K.
+TOP_K = 2
+
+
+class PreferenceTable:
     """
-    Runs algorithm where it only match if professors and students are both ranked top 2 
-    in the list of preferences
+    Compact, integer-indexed snapshot of everything the matching engine reads.
+
+    Students and fellowships are numbered 0..n-1 in the order they were loaded,
+    so the matching loop works on lists and small ints instead of net_id strings.
+
+    Attributes:
+        student_ids (list[str]): Interned net_id of each student index.
+        fellowship_ids (list[int]): fellowship_id of each fellowship index.
+        capacity (list[int]): Number of seats for each fellowship index.
+        student_prefs (list[list[int]]): Each student's ranked fellowship indexes.
+            A fellowship that no longer exists is kept as -1 so later choices
+            keep their position.
+        faculty_rank (list[dict[int, int]]): For each fellowship, student index ->
+            position in the faculty's ranking (0 is the top choice).
     """
-    students = get_all_students_with_applications()
-    fellowship_list = get_all_fellowships()
-
-    student_match = {s: None for s in students}
-    fellowship_matches = {fid: [] for fid, _ in fellowship_list}
-    student_next = {s: 0 for s in students}
-    unmatched = set(students)
-
-    student_prefs = {}
-    for s in students:
-        prefs = get_student_preferences(s)
-        student_prefs[s] = [fid for fid, _ in prefs]
-
-    faculty_prefs = {}
-    for fid, capacity in fellowship_list:
-        prefs = get_faculty_preferences(fid)
-        faculty_prefs[fid] = {
-            "rank_list": [s for s, _ in prefs],
-            "rank_index": {s: i for i, (s, _) in enumerate(prefs)},
-            "capacity": capacity
-        }
+    __slots__ = ('student_ids', 'fellowship_ids', 'capacity', 'student_prefs', 'faculty_rank')
+
+    def __init__(self, student_ids, fellowship_ids, capacity, student_prefs, faculty_rank):
+        self.student_ids = student_ids
+        self.fellowship_ids = fellowship_ids
+        self.capacity = capacity
+        self.student_prefs = student_prefs
+        self.faculty_rank = faculty_rank
+
+    @classmethod
+    def from_rows(cls, students, fellowships, student_pref_rows, faculty_pref_rows):
+        """
+        Build a table from the row streams produced by `load_matching_inputs`.
+
+        Args:
+            students (iterable[str]): net_ids of students taking part.
+            fellowships (iterable[tuple[int, int]]): (fellowship_id, capacity) rows.
+            student_pref_rows (iterable[tuple[str, int]]): (student_net_id, fellowship_id)
+                rows ordered by student, then rank.
+            faculty_pref_rows (iterable[tuple[int, str]]): (fellowship_id, student_net_id)
+                rows ordered by fellowship, then rank.
+
+        Returns:
+            PreferenceTable: The packed preferences.
+        """
+        student_ids = [sys.intern(s) for s in students]
+        student_index = {s: i for i, s in enumerate(student_ids)}
+
+        fellowship_ids = []
+        capacity = []
+        for fid, cap in fellowships:
+            fellowship_ids.append(fid)
+            capacity.append(cap)
+        fellowship_index = {fid: i for i, fid in enumerate(fellowship_ids)}
+
+        student_prefs = [[] for _ in student_ids]
+        for net_id, fid in student_pref_rows:
+            s = student_index.get(net_id)
+            if s is not None:
+                student_prefs[s].append(fellowship_index.get(fid, -1))
+
+        faculty_rank = [{} for _ in fellowship_ids]
+        current, position = None, 0
+        for fid, net_id in faculty_pref_rows:
+            if fid != current:
+                current, position = fid, 0
+            f = fellowship_index.get(fid)
+            s = student_index.get(net_id)
+            if f is not None and s is not None:
+                faculty_rank[f][s] = position
+            position += 1
+
+        return cls(student_ids, fellowship_ids, capacity, student_prefs, faculty_rank)
+
+
+def load_preferences():
+    """Load a PreferenceTable from the database in a fixed number of queries."""
+    return load_matching_inputs(PreferenceTable.from_rows)
+
+
+def propose(data, top_k, held, student_next, unmatched, rejected=None):
+    """
+    Let students propose until each one in `unmatched` is held or out of choices.
+
+    This is the student-proposing deferred-acceptance loop.  It picks up from
+    whatever state it is given, which is how the incremental engine replays
+    only part of a matching.
+
+    Args:
+        data (PreferenceTable): Preferences being matched.
+        top_k (int | None): Cutoff on both sides' rankings; None for no cutoff.
+        held (list[list[tuple[int, int]]]): Per fellowship, a heap of
+            (-faculty_rank, student) for the students it currently holds.
+            Updated in place.
+        student_next (list[int]): Per student, the position in their ranking
+            they propose to next. Updated in place.
+        unmatched (list[int]): Students who still have to propose. Consumed.
+        rejected (list[set[int]], optional): If given, every student a fellowship
+            turns down or bumps is added to that fellowship's set.
+    """
+    if top_k is None:
+        top_k = float('inf')
+    student_prefs = data.student_prefs
+    faculty_rank = data.faculty_rank
+    capacity = data.capacity
 
     while unmatched:
         student = unmatched.pop()
-        prefs = student_prefs.get(student, [])
+        prefs = student_prefs[student]
+        choice = student_next[student]
 
-        if student_next[student] >= len(prefs):
+        if choice >= len(prefs) or choice >= top_k:
             continue
+        student_next[student] = choice + 1
 
-        fid = prefs[student_next[student]]
-        student_next[student] += 1
+        fid = prefs[choice]
+        if fid < 0:
+            unmatched.append(student)
+            continue
+        student_rank = faculty_rank[fid].get(student)
+        if student_rank is None or student_rank >= top_k or capacity[fid] <= 0:
+            if rejected is not None:
+                rejected[fid].add(student)
+            unmatched.append(student)
+            continue
 
-        if student_next[student] - 1 > 1:
+        # Entries are (-rank, student), so held[0] is the worst-ranked holder.
+        holders = held[fid]
+        if len(holders) < capacity[fid]:
+            heappush(holders, (-student_rank, student))
             continue
 
-        faculty_data = faculty_prefs.get(fid, {})
-        rank_idx = faculty_data.get("rank_index", {})
-        student_rank = rank_idx.get(student, float('inf'))
+        if student_rank < -holders[0][0]:
+            _, loser = heapreplace(holders, (-student_rank, student))
+        else:
+            loser = student
+        if rejected is not None:
+            rejected[fid].add(loser)
+        unmatched.append(loser)
 
-        if student_rank > 1:
-            unmatched.add(student)
-            continue
 
-        matched_list = fellowship_matches[fid]
-        cap = faculty_data["capacity"]
+def run_matching(data=None, top_k=TOP_K):
+    """
+    Runs algorithm where it only match if professors and students are both ranked top 2
+    in the list of preferences
 
-        if len(matched_list) < cap:
-            matched_list.append(student)
-            student_match[student] = fid
-            continue
+    Each fellowship's tentative matches are kept in a max-heap keyed on the
+    faculty's rank, so finding and replacing the worst holder of a full
+    fellowship is O(log capacity).
 
-        ranked_matches = [(rank_idx.get(s, float('inf')), s) for s in matched_list]
-        worst_rank, worst_student = max(ranked_matches, key=lambda x: x[0])
+    Args:
+        data (PreferenceTable, optional): Preferences to match. Loaded from the
+            database when omitted.
+        top_k (int | None): How far down both sides' rankings a match may reach.
+            None lifts the cutoff (plain student-proposing deferred acceptance).
 
-        if student_rank < worst_rank:
-            matched_list.remove(worst_student)
-            matched_list.append(student)
-            student_match[student] = fid
-            student_match[worst_student] = None
-            unmatched.add(worst_student)
-        else:
-            unmatched.add(student)
+    Returns:
+        dict[int, list[str]]: fellowship_id -> matched student net_ids, best-ranked
+            first, for every fellowship with at least one match.
+    """
+    if data is None:
+        data = load_preferences()
+
+    fellowship_matches = [[] for _ in data.fellowship_ids]
+    student_next = [0] * len(data.student_ids)
+    propose(data, top_k, fellowship_matches, student_next, list(range(len(data.student_ids))))
+
+    return {
+        data.fellowship_ids[f]: [data.student_ids[s] for _, s in sorted(held, reverse=True)]
+        for f, held in enumerate(fellowship_matches) if held
+    }
+
+
+STRATEGIES = {}
+DEFAULT_STRATEGY = 'mutual_top_k'
+
+
+def register_strategy(name):
+    """
+    Register a matching strategy under `name`.
+
+    A strategy is a function `fn(data, **params)` taking a PreferenceTable and
+    returning {fellowship_id: [student net_ids]}.
+    """
+    def decorator(fn):
+        STRATEGIES[name] = fn
+        return fn
+    return decorator
+
+
+def run_strategy(name=DEFAULT_STRATEGY, data=None, **params):
+    """
+    Run a registered matching strategy.
+
+    Args:
+        name (str): Key in STRATEGIES.
+        data (PreferenceTable, optional): Preferences to match. Loaded from the
+            database when omitted.
+        **params: Passed through to the strategy, e.g. `top_k`.
+
+    Returns:
+        dict[int, list[str]]: fellowship_id -> matched student net_ids.
+
+    Raises:
+        ValueError: If no strategy is registered under `name`.
+    """
+    if name not in STRATEGIES:
+        raise ValueError(f"Unknown matching strategy: {name}")
+    if data is None:
+        data = load_preferences()
+    return STRATEGIES[name](data, **params)
+
+
+@register_strategy('mutual_top_k')
+def mutual_top_k(data, top_k=TOP_K):
+    """Only match pairs that rank each other in their top `top_k` (the original rule)."""
+    return run_matching(data, top_k=top_k)
+
+
+@register_strategy('student_proposing')
+def student_proposing(data, top_k=None):
+    """Classic student-proposing Gale-Shapley over the full rankings."""
+    return run_matching(data, top_k=top_k)
+
+
+@register_strategy('fellowship_proposing')
+def fellowship_proposing(data, top_k=None):
+    """
+    Fellowship-proposing Gale-Shapley.
+
+    Each fellowship with open seats offers them to students in its faculty's
+    ranking order; a student holds the offer they ranked highest and releases
+    the rest.  With `top_k`, a fellowship only offers to its top `top_k`
+    students and a student only accepts one of their top `top_k` fellowships.
+    """
+    if top_k is None:
+        top_k = float('inf')
+
+    student_rank = [{} for _ in data.student_ids]
+    for s, prefs in enumerate(data.student_prefs):
+        for position, f in enumerate(prefs):
+            if f >= 0 and position < top_k and f not in student_rank[s]:
+                student_rank[s][f] = position
+
+    offer_lists = [
+        [s for s, position in sorted(ranks.items(), key=lambda item: item[1]) if position < top_k]
+        for ranks in data.faculty_rank
+    ]
+    capacity = data.capacity
+    next_offer = [0] * len(data.fellowship_ids)
+    filled = [0] * len(data.fellowship_ids)
+    held_by = [-1] * len(data.student_ids)
+    open_fellowships = [f for f in range(len(data.fellowship_ids)) if capacity[f] > 0]
+
+    while open_fellowships:
+        f = open_fellowships.pop()
+        offers = offer_lists[f]
+        while filled[f] < capacity[f] and next_offer[f] < len(offers):
+            s = offers[next_offer[f]]
+            next_offer[f] += 1
+            rank = student_rank[s].get(f)
+            if rank is None:
+                continue
+            current = held_by[s]
+            if current == -1:
+                held_by[s] = f
+                filled[f] += 1
+            elif rank < student_rank[s][current]:
+                held_by[s] = f
+                filled[f] += 1
+                filled[current] -= 1
+                open_fellowships.append(current)
+
+    matches = {}
+    for s, f in enumerate(held_by):
+        if f >= 0:
+            matches.setdefault(f, []).append(s)
+    return {
+        data.fellowship_ids[f]: [data.student_ids[s] for s in sorted(held, key=data.faculty_rank[f].__getitem__)]
+        for f, held in matches.items()
+    }
+
+
+def count_blocking_pairs(data, matches):
+    """
+    Count the student/fellowship pairs that would both rather be matched to each other.
+
+    Only pairs that appear in both sides' full rankings count.  A stable
+    matching has none.
+
+    Args:
+        data (PreferenceTable): The preferences the matching was run on.
+        matches (dict[int, list[str]]): Result of a strategy.
+
+    Returns:
+        int: Number of blocking pairs.
+    """
+    fellowship_index = {fid: f for f, fid in enumerate(data.fellowship_ids)}
+    student_index = {s: i for i, s in enumerate(data.student_ids)}
+    match_of = [-1] * len(data.student_ids)
+    worst_rank = [None] * len(data.fellowship_ids)
+    seats_used = [0] * len(data.fellowship_ids)
+    for fid, students in matches.items():
+        f = fellowship_index[fid]
+        seats_used[f] = len(students)
+        for net_id in students:
+            s = student_index[net_id]
+            match_of[s] = f
+            rank = data.faculty_rank[f].get(s, float('inf'))
+            if worst_rank[f] is None or rank > worst_rank[f]:
+                worst_rank[f] = rank
 
-    return {fid: s for fid, s in fellowship_matches.items() if s}
+    blocking = 0
+    for s, prefs in enumerate(data.student_prefs):
+        for f in prefs:
+            if f < 0:
+                continue
+            if f == match_of[s]:
+                break
+            rank = data.faculty_rank[f].get(s)
+            if rank is None:
+                continue
+            if seats_used[f] < data.capacity[f] or rank < worst_rank[f]:
+                blocking += 1
+    return blocking
@@ -0,0 +1,184 @@
+"""
+migrate.py
+
+Versioned schema migrations for the Labs at Yale database.
+
+`schema.sql` creates the tables; changes made since (indexes for now) are
+numbered SQL scripts in `migrations/`, named `NNNN_description.sql`.  The
+`schema_version` table records which scripts have run.  `upgrade()` runs the
+pending ones in order, each in its own transaction together with its
+`schema_version` row, so a failing script leaves the database at the last
+good version.
+
+runserver.py applies pending migrations on startup; this script does the same
+from the command line and can show the current status:
+
+    python migrate.py                 # apply every pending migration
+    python migrate.py --to 1          # apply up to version 1
+    python migrate.py --status        # list applied and pending migrations
+    python migrate.py --rebuild-counts  # recount fellowships.application_count
+"""
+import argparse
+import os
+import re
+import sqlite3
+import sys
+from sys import stderr
+
+import database
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+_FILENAME = re.compile(r'^(\d{4})_([a-z0-9_]+)\.sql$')
+
+
+class Migration:
+    """One migration script."""
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+
+    def sql(self):
+        with open(self.path) as f:
+            return f.read()
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """
+    Return the migration scripts in `directory`, ordered by version.
+
+    Raises:
+        ValueError: If two scripts share a version number.
+    """
+    migrations = {}
+    for filename in sorted(os.listdir(directory)):
+        match = _FILENAME.match(filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise ValueError(f"duplicate migration version {version}: {filename}")
+        migrations[version] = Migration(version, match.group(2), os.path.join(directory, filename))
+    return [migrations[v] for v in sorted(migrations)]
+
+
+def ensure_version_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at DATETIME DEFAULT (CURRENT_TIMESTAMP)
+        )
+    ''')
+    conn.commit()
+
+
+def current_version(conn):
+    """Return the highest applied migration version, 0 if none."""
+    ensure_version_table(conn)
+    return conn.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
+
+
+def applied_versions(conn):
+    ensure_version_table(conn)
+    return {row[0] for row in conn.execute('SELECT version FROM schema_version')}
+
+
+def pending(conn, directory=MIGRATIONS_DIR):
+    """Return the migrations in `directory` that have not been applied to `conn`."""
+    applied = applied_versions(conn)
+    return [m for m in load_migrations(directory) if m.version not in applied]
+
+
+def upgrade(conn, target=None, directory=MIGRATIONS_DIR):
+    """
+    Apply pending migrations in version order.
+
+    Args:
+        conn (sqlite3.Connection): Database to migrate.
+        target (int, optional): Stop after this version. Defaults to the latest.
+        directory (str): Where the migration scripts are.
+
+    Returns:
+        list[Migration]: The migrations applied.
+
+    Raises:
+        sqlite3.Error: If a script fails; it is rolled back and later ones are not run.
+    """
+    applied = []
+    for migration in pending(conn, directory):
+        if target is not None and migration.version > target:
+            break
+        try:
+            conn.executescript(
+                f"BEGIN;\n{migration.sql()}\n;"
+                f"INSERT INTO schema_version (version, name) VALUES ({migration.version}, '{migration.name}');\n"
+                "COMMIT;"
+            )
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        applied.append(migration)
+    return applied
+
+
+def upgrade_database():
+    """Apply every pending migration to the database module's database."""
+    with database.get_connection() as conn:
+        return upgrade(conn)
+
+
+def parse_arguments():
+    """
+    Parse command-line arguments for the migration tool.
+
+    Returns:
+        argparse.Namespace: Parsed arguments.
+    """
+    parser = argparse.ArgumentParser(
+        prog='migrate.py',
+        description='Apply schema migrations to the Labs at Yale database',
+        allow_abbrev=False
+    )
+    parser.add_argument("--database", default=database._DATABASE_URL, help="database file to migrate")
+    parser.add_argument("--to", type=int, help="stop after this migration version")
+    parser.add_argument("--status", action="store_true", help="list migrations without applying any")
+    parser.add_argument("--rebuild-counts", action="store_true",
+                        help="after migrating, recount every fellowship's application_count")
+    return parser.parse_args()
+
+
+def main():
+    """
+        Creates any missing tables, then applies or lists the migrations
+    """
+    args = parse_arguments()
+    if not os.path.exists(args.database):
+        print(f"Database '{args.database}' does not exist", file=stderr)
+        sys.exit(1)
+    database._DATABASE_URL = args.database
+    database.ensure_schema()
+
+    with database.get_connection() as conn:
+        if args.status:
+            applied = applied_versions(conn)
+            for migration in load_migrations():
+                state = 'applied' if migration.version in applied else 'pending'
+                print(f"{migration.version:04d} {migration.name:<40} {state}")
+            return
+        try:
+            done = upgrade(conn, target=args.to)
+        except sqlite3.Error as e:
+            print(f"Migration failed: {e}", file=stderr)
+            sys.exit(1)
+        for migration in done:
+            print(f"applied {migration.version:04d} {migration.name}")
+        print(f"database is at version {current_version(conn)}")
+
+    if args.rebuild_counts:
+        print(f"fixed application_count on {database.rebuild_application_counts()} fellowships")
+
+
+if __name__ == '__main__':
+    main()
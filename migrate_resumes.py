@@ -0,0 +1,63 @@
+"""
+migrate_resumes.py
+
+Moves resumes stored inline in `students.resume_data` into the resume file
+store, a batch at a time.  Safe to stop and rerun: each batch is committed on
+its own and only rows that still have inline data are picked up.
+"""
+import argparse
+import sys
+from sys import stderr
+
+import database
+
+
+def parse_arguments():
+    """
+    Parse command-line arguments for the migration.
+
+    Returns:
+        argparse.Namespace: Parsed arguments.
+    """
+    parser = argparse.ArgumentParser(
+        prog='migrate_resumes.py',
+        description='Move resume BLOBs out of the database into the resume file store',
+        allow_abbrev=False
+    )
+    parser.add_argument("--database", default=database._DATABASE_URL, help="database file to migrate")
+    parser.add_argument("--resume-dir", default=database._RESUME_DIR, help="resume store directory")
+    parser.add_argument("--batch-size", type=int, default=50, help="resumes moved per transaction")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM afterwards to shrink the database file")
+    parser.add_argument("--prune", action="store_true", help="delete stored files no student refers to")
+    return parser.parse_args()
+
+
+def main():
+    """
+        Moves every inline resume, then optionally vacuums and prunes
+    """
+    args = parse_arguments()
+    if args.batch_size <= 0:
+        print("Batch size must be a positive integer", file=stderr)
+        sys.exit(1)
+
+    database._DATABASE_URL = args.database
+    database._RESUME_DIR = args.resume_dir
+    database.ensure_schema()
+
+    total = 0
+    for moved in database.move_resume_blobs(args.batch_size):
+        total += moved
+        print(f"moved {total} resumes")
+    print(f"done: {total} resumes moved to {args.resume_dir}")
+
+    if args.prune:
+        print(f"pruned {database.prune_resume_files()} unreferenced files")
+    if args.vacuum:
+        with database.get_connection() as conn:
+            conn.execute('VACUUM')
+        print("vacuumed database")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,15 @@
+-- Indexes for lookups that used to scan their table.
+
+-- get_student_applications (WHERE student_net_id = ? ORDER BY applied_at DESC)
+-- and the DISTINCT student_net_id scans of the matching code.
+CREATE INDEX IF NOT EXISTS idx_applications_student
+    ON applications (student_net_id, applied_at, fellowship_id, status);
+
+-- Every fellowship listing joins fellowships to labs on lab_num.
+CREATE INDEX IF NOT EXISTS idx_fellowships_lab ON fellowships (lab_num);
+
+-- get_saved_fellowship_ids / get_saved_fellowships (ORDER BY saved_at DESC).
+CREATE INDEX IF NOT EXISTS idx_saved_fellowships_student_saved_at
+    ON saved_fellowships (student_net_id, saved_at, fellowship_id);
+
+CREATE INDEX IF NOT EXISTS idx_password_resets_email ON password_resets (email, created_at);
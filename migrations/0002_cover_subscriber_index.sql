@@ -0,0 +1,5 @@
+-- get_notification_subscribers reads net_id for subscribed students; adding it
+-- (and subscribed, which SQLite needs to see in the index to use it as covering)
+-- to the partial index lets the lookup skip the students table.
+DROP INDEX IF EXISTS idx_students_subscribed_class_year;
+CREATE INDEX IF NOT EXISTS idx_students_subscribed ON students (class_year, net_id, subscribed) WHERE subscribed = 1;
@@ -0,0 +1,26 @@
+-- Keep each fellowship's number of applications on the fellowship row, so the
+-- listing reads it instead of counting applications on every view.
+ALTER TABLE fellowships ADD COLUMN application_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE fellowships SET application_count = (
+    SELECT COUNT(*) FROM applications a WHERE a.fellowship_id = fellowships.fellowship_id
+);
+
+CREATE TRIGGER IF NOT EXISTS applications_count_ai AFTER INSERT ON applications BEGIN
+    UPDATE fellowships SET application_count = application_count + 1
+    WHERE fellowship_id = NEW.fellowship_id;
+END;
+
+-- Also fires for rows removed by ON DELETE CASCADE (student or fellowship deleted).
+CREATE TRIGGER IF NOT EXISTS applications_count_ad AFTER DELETE ON applications BEGIN
+    UPDATE fellowships SET application_count = application_count - 1
+    WHERE fellowship_id = OLD.fellowship_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS applications_count_au AFTER UPDATE OF fellowship_id ON applications
+WHEN NEW.fellowship_id IS NOT OLD.fellowship_id BEGIN
+    UPDATE fellowships SET application_count = application_count - 1
+    WHERE fellowship_id = OLD.fellowship_id;
+    UPDATE fellowships SET application_count = application_count + 1
+    WHERE fellowship_id = NEW.fellowship_id;
+END;
@@ -0,0 +1,7 @@
+-- Sort keys of the paginated fellowship listing (database.FELLOWSHIP_SORTS).
+-- The expressions must match the ORDER BY exactly for SQLite to use them.
+-- Fellowships without a deadline sort last; without a stipend, last too
+-- (the stipend sort is descending).
+CREATE INDEX IF NOT EXISTS idx_fellowships_deadline ON fellowships (IFNULL(deadline, '9999-12-31'));
+CREATE INDEX IF NOT EXISTS idx_fellowships_stipend ON fellowships (IFNULL(stipend, -1));
+CREATE INDEX IF NOT EXISTS idx_fellowships_application_count ON fellowships (application_count);
@@ -0,0 +1,29 @@
+-- Keep every saved matching as a numbered run instead of replacing the
+-- matches table. The current matches are the latest run's.
+CREATE TABLE match_runs (
+    match_run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at DATETIME DEFAULT (CURRENT_TIMESTAMP)
+);
+
+-- Matches saved before runs existed become run 1.
+INSERT INTO match_runs (match_run_id, created_at)
+SELECT 1, MIN(created_at) FROM matches HAVING COUNT(*) > 0;
+
+CREATE TABLE matches_by_run (
+    match_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    match_run_id INTEGER NOT NULL,
+    fellowship_id INTEGER NOT NULL,
+    student_net_id TEXT NOT NULL,
+    created_at DATETIME DEFAULT (CURRENT_TIMESTAMP),
+    FOREIGN KEY (match_run_id) REFERENCES match_runs(match_run_id) ON DELETE CASCADE,
+    FOREIGN KEY (fellowship_id) REFERENCES fellowships(fellowship_id) ON DELETE CASCADE,
+    FOREIGN KEY (student_net_id) REFERENCES students(net_id) ON DELETE CASCADE,
+    -- Also the index reading one run, in fellowship order, without touching the others.
+    UNIQUE (match_run_id, fellowship_id, student_net_id)
+);
+
+INSERT INTO matches_by_run (match_id, match_run_id, fellowship_id, student_net_id, created_at)
+SELECT match_id, 1, fellowship_id, student_net_id, created_at FROM matches;
+
+DROP TABLE matches;
+ALTER TABLE matches_by_run RENAME TO matches;
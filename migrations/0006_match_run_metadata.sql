@@ -0,0 +1,16 @@
+-- Describe each match run: how it was produced and what it contains.
+-- `params` is the strategy's parameters as JSON.
+ALTER TABLE match_runs ADD COLUMN strategy TEXT;
+ALTER TABLE match_runs ADD COLUMN params TEXT;
+ALTER TABLE match_runs ADD COLUMN duration_seconds REAL;
+ALTER TABLE match_runs ADD COLUMN matched_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE match_runs ADD COLUMN fellowship_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE match_runs SET
+    matched_count = (SELECT COUNT(*) FROM matches m WHERE m.match_run_id = match_runs.match_run_id),
+    fellowship_count = (SELECT COUNT(DISTINCT fellowship_id) FROM matches m
+                        WHERE m.match_run_id = match_runs.match_run_id);
+
+-- The diff between two runs pairs a student's removed and added matches by
+-- student; this index finds a student's matches within a run.
+CREATE INDEX idx_matches_run_student ON matches (match_run_id, student_net_id, fellowship_id);
@@ -0,0 +1,5 @@
+-- get_fellowship_applicants and the applicant export read one fellowship's
+-- applications newest first; with this index they come back in order
+-- instead of being collected and sorted before the first row.
+CREATE INDEX IF NOT EXISTS idx_applications_fellowship_applied_at
+    ON applications (fellowship_id, applied_at);
@@ -0,0 +1,5 @@
+-- Sort keys of the faculty and lab listings (database.FACULTY_SORTS and
+-- LAB_SORTS), so sorting by name reads the index in order.  As in 0004, the
+-- expression must match the ORDER BY exactly.
+CREATE INDEX IF NOT EXISTS idx_users_name ON users (last_name || ' ' || first_name, net_id);
+CREATE INDEX IF NOT EXISTS idx_labs_name ON labs (lab_name);
@@ -0,0 +1,155 @@
+"""
+Keyset pagination for the listing pages.
+
+A page is fetched with `ORDER BY <sort key>, <id>` and, after the first page,
+a condition that starts strictly after the last row already shown, instead
+of an OFFSET.  With an index on the sort key SQLite seeks straight to the
+start of the page and reads `limit + 1` rows, however deep the page is.
+
+The position is handed to the browser as an opaque cursor: the sort name
+plus the last row's sort key and id, JSON-encoded and base64'd.  A cursor
+for a different sort, or one that does not decode to a name and two
+scalars, starts from the top.
+
+Classes:
+    - Sort: One way of ordering a listing.
+    - Page: A list of results that also knows where the next page starts.
+
+Functions:
+    - page_size(value)
+    - fetch_page(cur, columns, tables, conditions, params, sort, after, limit, make)
+"""
+import base64
+import binascii
+import json
+
+PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+_CURSOR_TYPES = (str, int, float, type(None))
+
+
+class Sort:
+    """
+    One ordering of a listing.
+
+    Attributes:
+        name (str): Name used in URLs (`?sort=deadline`).
+        key (str | None): SQL expression to order by, or None to order by id only.
+            Should match an index (expression indexes included) so the page is
+            read in order instead of sorted.
+        id_column (str): Unique column breaking ties between equal keys.
+        descending (bool): Largest key first. Ties are broken in the same direction.
+    """
+    def __init__(self, name, key, id_column, descending=False):
+        self.name = name
+        self.key = key
+        self.id_column = id_column
+        self.descending = descending
+
+    def order_by(self):
+        direction = 'DESC' if self.descending else 'ASC'
+        if self.key is None:
+            return f'{self.id_column} {direction}'
+        return f'{self.key} {direction}, {self.id_column} {direction}'
+
+    def after(self, position):
+        """Return the SQL condition and parameters selecting the rows after `position`."""
+        value, last_id = position
+        op = '<' if self.descending else '>'
+        if self.key is None:
+            return f'{self.id_column} {op} ?', [last_id]
+        # The first half is a range the index can seek to; the second skips
+        # the rows tied with the last one that were already shown.
+        return (f'{self.key} {op}= ? AND ({self.key} {op} ? OR {self.id_column} {op} ?)',
+                [value, value, last_id])
+
+
+class Page(list):
+    """
+    The rows of one page.
+
+    Attributes:
+        sort (Sort): How the rows are ordered.
+        next_cursor (str | None): Cursor for the following page, None on the last one.
+    """
+    def __init__(self, items=(), sort=None, next_cursor=None):
+        super().__init__(items)
+        self.sort = sort
+        self.next_cursor = next_cursor
+
+
+def page_size(value, default=PAGE_SIZE):
+    """Parse a requested page size, falling back to `default` and capping it at MAX_PAGE_SIZE."""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def encode_cursor(sort, value, last_id):
+    data = json.dumps([sort.name, value, last_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    """
+    Return the (sort key, id) position encoded in `cursor`.
+
+    Returns:
+        tuple | None: None if there is no cursor, it is malformed or it belongs to another sort.
+            A cursor whose values are not scalars SQLite can bind counts as malformed.
+    """
+    if not cursor:
+        return None
+    try:
+        name, value, last_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError, TypeError):
+        return None
+    if name != sort.name or not all(isinstance(v, _CURSOR_TYPES) for v in (value, last_id)):
+        return None
+    return value, last_id
+
+
+def fetch_page(cur, columns, tables, conditions, params, sort, after=None, limit=None, make=tuple):
+    """
+    Run a listing query one page at a time.
+
+    Args:
+        cur (sqlite3.Cursor): Cursor to run the query on.
+        columns (str): The SELECT list; `make` receives these columns.
+        tables (str): The FROM clause, joins included.
+        conditions (list[str]): WHERE conditions, ANDed together.
+        params (list): Parameters for `tables` and `conditions`, in order.
+        sort (Sort): Ordering of the listing.
+        after (str, optional): Cursor from the previous page.
+        limit (int, optional): Page size. None fetches every remaining row.
+        make (callable): Builds a result object from a row.
+
+    Returns:
+        Page: Up to `limit` results, with the cursor for the next page.
+    """
+    conditions = list(conditions)
+    params = list(params)
+    position = decode_cursor(after, sort)
+    if position is not None:
+        condition, extra = sort.after(position)
+        conditions.append(condition)
+        params.extend(extra)
+
+    key = sort.key if sort.key is not None else 'NULL'
+    query = f'SELECT {columns}, {key}, {sort.id_column} FROM {tables}'
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(f'({c})' for c in conditions)
+    query += f' ORDER BY {sort.order_by()}'
+    if limit is not None:
+        query += ' LIMIT ?'
+        params.append(limit + 1)
+    cur.execute(query, params)
+    rows = cur.fetchall()
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(sort, rows[-1][-2], rows[-1][-1])
+    return Page([make(*r[:-2]) for r in rows], sort, next_cursor)
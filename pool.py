@@ -0,0 +1,189 @@
+"""
+Connection pooling for the Labs at Yale SQLite database.
+
+SQLite connections are cheap compared to a network database, but opening one
+still costs a file open, a schema parse on first use and whatever PRAGMAs we
+apply.  A single page render used to pay for that 3-6 times.  This module keeps
+one connection per worker thread alive between uses, bounds how many
+connections can be active at once, and applies the configured PRAGMAs exactly
+once, when the connection is opened.
+
+sqlite3 connections may only be used from the thread that created them, so
+the pool is per-thread: each thread reuses its own cached connection, and the
+size limit bounds the number of threads that can hold a checked-out connection
+at the same time.
+
+Classes:
+    - PoolTimeout: Raised when no connection slot frees up in time.
+    - ConnectionPool: Per-thread connection cache with a bounded number of slots.
+"""
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PoolTimeout(Exception):
+    """Raised when a thread waits longer than the pool timeout for a slot."""
+
+
+class ConnectionPool:
+    """
+    Hands out reusable SQLite connections, one per thread.
+
+    Attributes:
+        size (int): Maximum number of connections checked out at once.
+        pragmas (list[tuple[str, object]]): PRAGMAs applied to every new connection.
+    """
+    def __init__(self, factory, size=8, pragmas=None, timeout=30.0, health_check_after=30.0):
+        """
+        Initialize a ConnectionPool.
+
+        Args:
+            factory (callable): Zero-argument callable returning a new sqlite3 connection.
+            size (int): Maximum number of connections checked out at the same time.
+            pragmas (list[tuple[str, object]], optional): (name, value) pairs applied
+                once to every connection the pool opens.
+            timeout (float): Seconds to wait for a free slot before raising PoolTimeout.
+            health_check_after (float): A cached connection idle for longer than this is
+                checked with `SELECT 1` before it is handed out again.
+        """
+        if size < 1:
+            raise ValueError("pool size must be at least 1")
+        self.size = size
+        self.pragmas = list(pragmas or [])
+        self._factory = factory
+        self._timeout = timeout
+        self._health_check_after = health_check_after
+        self._slots = threading.BoundedSemaphore(size)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._in_use = 0
+        self._stats = {
+            'opened': 0,
+            'reused': 0,
+            'waited': 0,
+            'discarded': 0,
+        }
+
+    @contextmanager
+    def connection(self):
+        """
+        Check out this thread's connection for the duration of a `with` block.
+
+        Nested blocks in the same thread share the connection; only the outermost
+        block takes a slot.  Work left uncommitted when the outermost block exits is
+        rolled back, the same as closing a connection without committing.
+
+        Yields:
+            sqlite3.Connection: The thread's connection.
+        """
+        local = self._local
+        if getattr(local, 'depth', 0):
+            local.depth += 1
+            self._count('reused')
+            try:
+                yield local.conn
+            finally:
+                local.depth -= 1
+            return
+
+        self._acquire_slot()
+        try:
+            conn = self._checkout(local)
+            local.depth = 1
+            try:
+                yield conn
+            finally:
+                local.depth = 0
+                self._checkin(local, conn)
+        finally:
+            self._release_slot()
+
+    def stats(self):
+        """
+        Return a snapshot of the pool counters.
+
+        Returns:
+            dict: `opened`, `reused`, `waited` and `discarded` counts plus the
+                configured `size` and the number of connections currently `in_use`.
+        """
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['in_use'] = self._in_use
+        snapshot['size'] = self.size
+        return snapshot
+
+    def reset(self):
+        """
+        Drop every cached connection.
+
+        The calling thread's connection is closed right away; other threads reopen
+        theirs the next time they check one out.
+        """
+        with self._lock:
+            self._generation += 1
+        local = self._local
+        if getattr(local, 'conn', None) is not None and not getattr(local, 'depth', 0):
+            self._discard(local)
+
+    def _acquire_slot(self):
+        if not self._slots.acquire(blocking=False):
+            self._count('waited')
+            if not self._slots.acquire(timeout=self._timeout):
+                raise PoolTimeout(f"no database connection available after {self._timeout}s")
+        with self._lock:
+            self._in_use += 1
+
+    def _release_slot(self):
+        with self._lock:
+            self._in_use -= 1
+        self._slots.release()
+
+    def _checkout(self, local):
+        conn = getattr(local, 'conn', None)
+        if conn is not None:
+            if local.generation == self._generation and self._is_healthy(local):
+                self._count('reused')
+                return conn
+            self._discard(local)
+
+        conn = self._factory()
+        for name, value in self.pragmas:
+            conn.execute(f'PRAGMA {name} = {value}')
+        local.conn = conn
+        local.generation = self._generation
+        local.last_used = time.monotonic()
+        self._count('opened')
+        return conn
+
+    def _checkin(self, local, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(local)
+            return
+        local.last_used = time.monotonic()
+
+    def _is_healthy(self, local):
+        if time.monotonic() - local.last_used < self._health_check_after:
+            return True
+        try:
+            local.conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, local):
+        try:
+            local.conn.close()
+        except sqlite3.Error:
+            pass
+        local.conn = None
+        self._count('discarded')
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
@@ -0,0 +1,225 @@
+"""
+Route latency histograms and sampled profiles for Labs at Yale.
+
+`init_app` times every request from the first `before_request` hook to
+teardown and splits the time three ways:
+    - db: time spent in SQL, taken from the request's `QueryStats`
+      (see instrumentation.py);
+    - template: time inside `render_template`, measured with Flask's
+      `before_render_template` / `template_rendered` signals;
+    - total: the whole request.
+Each is added to a per-endpoint `Histogram` with fixed log-spaced buckets,
+so recording is a bisect and three additions, and p50/p95/p99 are estimated
+from the buckets.  The histograms are served at `/metrics` (Prometheus
+histograms) and as JSON percentiles at `/metrics/latency`; both follow
+`METRICS_ACCESS` (see instrumentation.py) and are off by default.
+
+With `PROFILE_SAMPLE_RATE` above 0, that fraction of requests also runs
+under cProfile and the stats are dumped to `PROFILE_DIR` as
+`<endpoint>-<time>-<ms>ms-<pid>-<n>.prof`, for `python -m pstats`, snakeviz
+or flameprof.  At the default rate of 0 no profiler is ever created.
+
+Config:
+    LATENCY_HISTOGRAMS (bool): Record histograms. Default True.
+    PROFILE_SAMPLE_RATE (float): Fraction of requests to profile. Default 0.
+    PROFILE_DIR (str): Where profiles are written. Default 'profiles'.
+
+Classes:
+    - Histogram: Fixed-bucket latency histogram.
+
+Functions:
+    - init_app(app)
+    - latency_summary()
+"""
+import bisect
+import cProfile
+import itertools
+import os
+import random
+import threading
+import time
+
+from flask import abort, g, jsonify, request, template_rendered, before_render_template
+
+from instrumentation import add_metrics_renderer, metric_label, metrics_allowed
+
+PROFILE_DIR = 'profiles'
+
+# Bucket upper bounds in seconds: 0.5 ms to ~75 s, 25% apart.
+BUCKETS = tuple(0.0005 * 1.25 ** i for i in range(54))
+KINDS = ('total', 'db', 'template')
+
+_lock = threading.Lock()
+_histograms = {}
+_profile_ids = itertools.count(1)
+
+
+class Histogram:
+    """
+    Counts of observations per bucket of `BUCKETS` (plus one overflow bucket).
+
+    Attributes:
+        counts (list[int]): Observations per bucket.
+        count (int): Total observations.
+        sum (float): Sum of the observations, in seconds.
+    """
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def percentile(self, p):
+        """
+        Estimate the p-th percentile, interpolating inside its bucket.
+
+        Args:
+            p (float): Percentile between 0 and 100.
+
+        Returns:
+            float | None: Seconds, or None if nothing was observed.
+        """
+        if not self.count:
+            return None
+        rank = p / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                low = BUCKETS[i - 1] if i else 0.0
+                high = BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1]
+                return low + (high - low) * (rank - seen) / n
+            seen += n
+        return BUCKETS[-1]
+
+
+def _observe(endpoint, total, db, template):
+    with _lock:
+        histograms = _histograms.get(endpoint)
+        if histograms is None:
+            histograms = _histograms[endpoint] = {kind: Histogram() for kind in KINDS}
+        histograms['total'].observe(total)
+        histograms['db'].observe(db)
+        histograms['template'].observe(template)
+
+
+def latency_summary():
+    """
+    Return p50/p95/p99 per endpoint.
+
+    Returns:
+        dict: {endpoint: {'requests': int, kind: {'p50_ms', 'p95_ms', 'p99_ms', 'mean_ms'}}}
+            for each kind in total, db and template.
+    """
+    summary = {}
+    with _lock:
+        for endpoint, histograms in _histograms.items():
+            entry = {'requests': histograms['total'].count}
+            for kind, h in histograms.items():
+                entry[kind] = {f'p{p}_ms': round(h.percentile(p) * 1000, 3) for p in (50, 95, 99)}
+                entry[kind]['mean_ms'] = round(h.sum / h.count * 1000, 3)
+            summary[endpoint] = entry
+    return summary
+
+
+def reset():
+    """Forget every recorded observation."""
+    with _lock:
+        _histograms.clear()
+
+
+def _render_histograms():
+    name = 'labsatyale_request_seconds'
+    lines = [f'# HELP {name} Request latency by endpoint and part (total, db, template).',
+             f'# TYPE {name} histogram']
+    with _lock:
+        snapshot = {endpoint: {kind: (list(h.counts), h.count, h.sum) for kind, h in hs.items()}
+                    for endpoint, hs in _histograms.items()}
+    for endpoint in sorted(snapshot):
+        label = metric_label(endpoint)
+        for kind, (counts, count, total) in snapshot[endpoint].items():
+            labels = f'endpoint="{label}",part="{kind}"'
+            cumulative = 0
+            for bound, n in zip(BUCKETS, counts):
+                cumulative += n
+                lines.append(f'{name}_bucket{{{labels},le="{bound:.6g}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'{name}_sum{{{labels}}} {total}')
+            lines.append(f'{name}_count{{{labels}}} {count}')
+    return lines
+
+
+def init_app(app):
+    """
+    Record latency histograms for every request of `app` and sample profiles.
+
+    Register this before other `before_request` hooks so their time counts.
+
+    Args:
+        app (Flask): The application.
+    """
+    app.config.setdefault('LATENCY_HISTOGRAMS', True)
+    app.config.setdefault('PROFILE_SAMPLE_RATE', 0.0)
+    app.config.setdefault('PROFILE_DIR', PROFILE_DIR)
+    add_metrics_renderer(_render_histograms)
+
+    @app.before_request
+    def start_request_timer():
+        if not app.config['LATENCY_HISTOGRAMS']:
+            return
+        g.request_started = time.perf_counter()
+        g.template_seconds = 0.0
+        rate = app.config['PROFILE_SAMPLE_RATE']
+        if rate and random.random() < rate:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler is already active.
+                return
+            g.profiler = profiler
+
+    def template_started(sender, template, context, **extra):
+        if 'request_started' in g:
+            g.template_started = time.perf_counter()
+
+    def template_finished(sender, template, context, **extra):
+        if 'template_started' in g:
+            g.template_seconds += time.perf_counter() - g.pop('template_started')
+
+    before_render_template.connect(template_started, app, weak=False)
+    template_rendered.connect(template_finished, app, weak=False)
+
+    @app.teardown_request
+    def record_request_latency(exc):
+        started = g.pop('request_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            _dump_profile(profiler, app.config['PROFILE_DIR'], request.endpoint, elapsed)
+        if request.endpoint in ('metrics', 'latency_metrics'):
+            return
+        stats = g.get('query_stats')
+        _observe(request.endpoint or 'unknown', elapsed, stats.seconds if stats else 0.0, g.template_seconds)
+
+    @app.route('/metrics/latency')
+    def latency_metrics():
+        if not metrics_allowed():
+            abort(404)
+        return jsonify(latency_summary())
+
+
+def _dump_profile(profiler, directory, endpoint, elapsed):
+    os.makedirs(directory, exist_ok=True)
+    name = (f"{endpoint or 'unknown'}-{time.strftime('%Y%m%d-%H%M%S')}-{elapsed * 1000:.0f}ms"
+            f"-{os.getpid()}-{next(_profile_ids)}.prof")
+    try:
+        profiler.dump_stats(os.path.join(directory, name))
+    except OSError as e:
+        print(f"Error writing profile {name}: {e}")
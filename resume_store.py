@@ -0,0 +1,164 @@
+"""
+Content-addressed file store for student resumes.
+
+Resumes used to live in `students.resume_data`, so every query that touched
+the students table dragged up to 10 MB of PDF through the page cache.  The
+store keeps each PDF as a file named by the SHA-256 of its contents, and the
+table keeps only the digest, size and original filename.  Two students who
+upload the same file share one copy.
+
+Files are laid out as `<root>/<aa>/<bb>/<digest>.pdf`, written to a temporary
+file first and renamed into place, so a reader never sees half a file.
+
+Uploads go through `put_stream()`, which copies the upload in fixed-size
+chunks, hashing it and checking the size cap and PDF header as it goes, so an
+upload never needs more than one chunk of memory.
+
+Classes:
+    - ResumeStore: Reads and writes resume files under one directory.
+    - InvalidResume: Raised when an upload is too large or not a PDF.
+"""
+import hashlib
+import os
+import tempfile
+import time
+
+CHUNK_SIZE = 64 * 1024
+PDF_HEADER = b'%PDF-'
+
+
+class InvalidResume(ValueError):
+    """An upload that was rejected; the message is safe to show the user."""
+
+
+class ResumeStore:
+    """
+    Resume files keyed by the SHA-256 of their contents.
+
+    Attributes:
+        root (str): Absolute path of the directory the files live under.
+    """
+    def __init__(self, root):
+        # Resolved once, so a path handed to send_file is not re-resolved
+        # against the app's root_path instead of the working directory.
+        self.root = os.path.abspath(root)
+
+    def path(self, digest):
+        """Return the file path for a digest (whether or not it exists)."""
+        return os.path.join(self.root, digest[:2], digest[2:4], f'{digest}.pdf')
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def put(self, data):
+        """
+        Store `data` unless an identical file is already stored.
+
+        Args:
+            data (bytes): File contents.
+
+        Returns:
+            tuple[str, int]: The hex SHA-256 digest and the size in bytes.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        if not self._touch(digest):
+            self._write(digest, [data])
+        return digest, len(data)
+
+    def put_stream(self, stream, max_size=None, chunk_size=CHUNK_SIZE):
+        """
+        Copy a file-like object into the store, one chunk at a time.
+
+        The upload is written to a temporary file while it is hashed, then
+        renamed to its digest (or dropped if an identical file is stored).
+
+        Args:
+            stream: Object with a `read(n)` method, e.g. an upload's stream.
+            max_size (int, optional): Largest accepted size in bytes.
+            chunk_size (int): Bytes read per step.
+
+        Returns:
+            tuple[str, int]: The hex SHA-256 digest and the size in bytes.
+
+        Raises:
+            InvalidResume: If the upload is empty, larger than `max_size`, or
+                does not start with a PDF header.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        try:
+            sha256 = hashlib.sha256()
+            size = 0
+            header = b''
+            with os.fdopen(fd, 'wb') as f:
+                while True:
+                    chunk = stream.read(chunk_size)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if max_size is not None and size > max_size:
+                        raise InvalidResume(f"File size must be less than {max_size // (1024 * 1024)} MB")
+                    if len(header) < len(PDF_HEADER):
+                        header += chunk[:len(PDF_HEADER) - len(header)]
+                        if not PDF_HEADER.startswith(header):
+                            raise InvalidResume("File is not a valid PDF")
+                    sha256.update(chunk)
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            if header != PDF_HEADER:
+                raise InvalidResume("File is not a valid PDF")
+
+            digest = sha256.hexdigest()
+            if self._touch(digest):
+                os.remove(tmp)
+            else:
+                target = self.path(digest)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(tmp, target)
+            return digest, size
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def age(self, digest):
+        """Return seconds since the file was last written or re-stored."""
+        return time.time() - os.path.getmtime(self.path(digest))
+
+    def delete(self, digest):
+        """Remove a stored file. Missing files are ignored."""
+        try:
+            os.remove(self.path(digest))
+        except FileNotFoundError:
+            pass
+
+    def digests(self):
+        """Yield the digest of every stored file."""
+        for _, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith('.pdf'):
+                    yield name[:-4]
+
+    def _touch(self, digest):
+        # Refresh an existing file's mtime so pruning treats it as new.
+        try:
+            os.utime(self.path(digest))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _write(self, digest, chunks):
+        target = self.path(digest)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, target)
+        except BaseException:
+            os.remove(tmp)
+            raise
@@ -10,6 +10,10 @@ import os
 import sys
 from sys import stderr
 from fellowship import app
+from database import enable_wal_mode, ensure_schema, ensure_search_index
+from instrumentation import METRICS_ACCESS
+from mailer import start_email_worker
+from migrate import upgrade_database
 # import ssl
 # ssl._create_default_https_context = ssl._create_stdlib_context
 
@@ -34,6 +38,34 @@ def parse_arguments():
         type=str,
         help= "the port at which the server should listen")
 
+    parser.add_argument(
+        "--wal",
+        action="store_true",
+        help="run the database in WAL mode and serialize writes through one writer thread")
+
+    parser.add_argument(
+        "--email-workers",
+        type=int,
+        default=2,
+        help="background threads (and SMTP sessions) sending queued email; 0 leaves the outbox unsent")
+
+    parser.add_argument(
+        "--profile-rate",
+        type=float,
+        default=0.0,
+        help="fraction of requests to run under cProfile (0 disables profiling)")
+
+    parser.add_argument(
+        "--profile-dir",
+        default="profiles",
+        help="directory the sampled .prof files are written to")
+
+    parser.add_argument(
+        "--metrics",
+        choices=METRICS_ACCESS,
+        default="off",
+        help="who may read /metrics: nobody, loopback clients only, or anyone")
+
     args = parser.parse_args()
     try:
         port = int(args.port)
@@ -64,6 +96,16 @@ def main():
     """
     args = parse_arguments()
     check_database()
+    if args.wal:
+        enable_wal_mode()
+    ensure_schema()
+    upgrade_database()
+    ensure_search_index()
+    if args.email_workers > 0:
+        start_email_worker(workers=args.email_workers)
+    app.config['PROFILE_SAMPLE_RATE'] = args.profile_rate
+    app.config['PROFILE_DIR'] = args.profile_dir
+    app.config['METRICS_ACCESS'] = args.metrics
     try:
         app.run(host='0.0.0.0', port=args.port)
     except OSError as ex:
@@ -18,6 +18,9 @@ CREATE TABLE IF NOT EXISTS students (
     resume_data BLOB,
     resume_filename TEXT,
     resume_uploaded_at DATETIME,
+    resume_sha256 TEXT,
+    resume_size INTEGER,
+    subscribed INTEGER NOT NULL DEFAULT 0,
     FOREIGN KEY (net_id) REFERENCES users(net_id) ON DELETE CASCADE
 );
 
@@ -53,7 +56,7 @@ CREATE TABLE IF NOT EXISTS fellowships (
 );
 
 -- Saved Fellowships
-CREATE TABLE saved_fellowships (
+CREATE TABLE IF NOT EXISTS saved_fellowships (
     student_net_id TEXT NOT NULL,
     fellowship_id INTEGER NOT NULL,
     saved_at DATETIME DEFAULT (CURRENT_TIMESTAMP),
@@ -108,8 +111,59 @@ CREATE TABLE IF NOT EXISTS matches (
     UNIQUE (fellowship_id, student_net_id)
 );
 
-CREATE TABLE password_resets (
+-- MATCHING STATE (proposal state behind `matches`, for incremental re-matching)
+CREATE TABLE IF NOT EXISTS matching_state (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    strategy TEXT NOT NULL,
+    top_k INTEGER,
+    version INTEGER NOT NULL DEFAULT 0,
+    updated_at DATETIME DEFAULT (CURRENT_TIMESTAMP)
+);
+
+CREATE TABLE IF NOT EXISTS matching_progress (
+    student_net_id TEXT PRIMARY KEY,
+    next_choice INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS matching_rejections (
+    fellowship_id INTEGER NOT NULL,
+    student_net_id TEXT NOT NULL,
+    PRIMARY KEY (fellowship_id, student_net_id)
+);
+
+CREATE TABLE IF NOT EXISTS password_resets (
     email TEXT NOT NULL,
     token TEXT NOT NULL,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-);
\ No newline at end of file
+);
+
+-- EMAIL OUTBOX (messages waiting for the background mailer)
+CREATE TABLE IF NOT EXISTS email_outbox (
+    email_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    to_addrs TEXT NOT NULL,
+    message TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending','sending','sent','failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at DATETIME DEFAULT (CURRENT_TIMESTAMP),
+    sent_at DATETIME,
+    notification_id INTEGER,
+    recipients INTEGER,
+    send_seconds REAL
+);
+
+CREATE INDEX IF NOT EXISTS idx_email_outbox_due ON email_outbox (status, next_attempt_at);
+CREATE INDEX IF NOT EXISTS idx_email_outbox_notification ON email_outbox (notification_id);
+
+-- NOTIFICATIONS (one row per fan-out; its batches are rows in email_outbox)
+CREATE TABLE IF NOT EXISTS notifications (
+    notification_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    subject TEXT NOT NULL,
+    class_years TEXT,
+    recipients INTEGER NOT NULL,
+    batches INTEGER NOT NULL,
+    created_at DATETIME DEFAULT (CURRENT_TIMESTAMP)
+);
+
+-- Later index changes live in migrations/ and are applied by migrate.py.
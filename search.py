@@ -0,0 +1,218 @@
+"""
+Full-text search index for fellowships, labs and faculty.
+
+The listing pages used to search with `LOWER(col) LIKE '%q%'` over five or six
+joined columns, which scans and lowercases every row on every search.  This
+module builds FTS5 indexes over the same columns instead.
+
+The fellowship and lab indexes are external-content FTS5 tables whose content
+is a view that joins the underlying tables, so the text itself is not stored
+twice; their rowid is the table's INTEGER PRIMARY KEY.  `users` is keyed by
+its TEXT net_id and its implicit rowid can change on VACUUM, so the faculty
+index is a regular FTS5 table that stores its own copy of the text, with
+net_id as an UNINDEXED column to join on.  Triggers on `fellowships`, `labs`,
+`users` and `faculty` keep the indexes in sync: a BEFORE trigger removes the
+affected rows from the index while the view still shows the old values, and
+an AFTER trigger adds them back with the new ones.
+
+If the SQLite build has no FTS5, `install()` returns False and the database
+module keeps using the LIKE queries.
+
+Functions:
+    - fts5_available(conn)
+    - install(conn)
+    - rebuild(conn)
+    - match_expression(q)
+"""
+import re
+import sqlite3
+
+# 'rowid' names the integer key of an external-content index; 'key' the
+# UNINDEXED column of an index that stores its own content.
+INDEXES = {
+    'fellowships_fts': {
+        'source': 'fellowship_search_source',
+        'rowid': 'fellowship_id',
+        'columns': ['name', 'description', 'class_years', 'lab_name', 'faculty_name'],
+        'view': '''
+            SELECT f.fellowship_id, f.name, f.description, f.class_years, l.lab_name,
+                   (u.first_name || ' ' || u.last_name) AS faculty_name,
+                   l.lab_num, l.faculty_net_id
+            FROM fellowships f
+            JOIN labs l ON f.lab_num = l.lab_num
+            JOIN users u ON l.faculty_net_id = u.net_id
+        ''',
+    },
+    'labs_fts': {
+        'source': 'lab_search_source',
+        'rowid': 'lab_num',
+        'columns': ['lab_name', 'email', 'department', 'location', 'description', 'faculty_name'],
+        'view': '''
+            SELECT l.lab_num, l.lab_name, u.email, f.department, l.location, l.description,
+                   (u.first_name || ' ' || u.last_name) AS faculty_name,
+                   l.faculty_net_id
+            FROM labs l
+            JOIN faculty f ON l.faculty_net_id = f.net_id
+            JOIN users u ON f.net_id = u.net_id
+        ''',
+    },
+    'faculty_fts': {
+        'source': 'faculty_search_source',
+        'key': 'net_id',
+        'columns': ['email', 'department', 'first_name', 'last_name'],
+        'view': '''
+            SELECT users.email, faculty.department, users.first_name, users.last_name, users.net_id
+            FROM users
+            JOIN faculty ON users.net_id = faculty.net_id
+            WHERE users.role = 'faculty'
+        ''',
+    },
+}
+
+# (table, columns watched by UPDATE, [(index, filter on the source view)]).
+# `{row}` is replaced by OLD or NEW depending on the trigger.
+_DEPENDENCIES = [
+    ('fellowships', 'lab_num, name, description, class_years', [
+        ('fellowships_fts', 'fellowship_id = {row}.fellowship_id'),
+    ]),
+    ('labs', 'lab_name, description, location, faculty_net_id', [
+        ('labs_fts', 'lab_num = {row}.lab_num'),
+        ('fellowships_fts', 'lab_num = {row}.lab_num'),
+    ]),
+    ('users', 'first_name, last_name, email, role', [
+        ('faculty_fts', 'net_id = {row}.net_id'),
+        ('labs_fts', 'faculty_net_id = {row}.net_id'),
+        ('fellowships_fts', 'faculty_net_id = {row}.net_id'),
+    ]),
+    ('faculty', 'net_id, department', [
+        ('faculty_fts', 'net_id = {row}.net_id'),
+        ('labs_fts', 'faculty_net_id = {row}.net_id'),
+    ]),
+]
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def fts5_available(conn):
+    """Return True if the SQLite library behind `conn` was built with FTS5."""
+    try:
+        conn.execute('CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)')
+        conn.execute('DROP TABLE temp.fts5_probe')
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def install(conn):
+    """
+    Create the search views, FTS5 tables and sync triggers if they are missing.
+
+    Safe to call on every startup.  A newly created index is filled from the
+    existing rows.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the application database.
+
+    Returns:
+        bool: True if the indexes are in place, False if FTS5 is unavailable.
+    """
+    if not fts5_available(conn):
+        return False
+
+    existing = dict(conn.execute("SELECT name, sql FROM sqlite_master WHERE type IN ('table', 'view')"))
+    created = []
+    for name, spec in INDEXES.items():
+        # An index built with an older layout (the faculty index used to be
+        # external-content on users.rowid) is dropped and built again.
+        if name in existing and ('content=' in existing[name]) != ('rowid' in spec):
+            conn.execute(f'DROP TABLE {name}')
+            conn.execute(f"DROP VIEW IF EXISTS {spec['source']}")
+            del existing[name]
+        conn.execute(f"CREATE VIEW IF NOT EXISTS {spec['source']} AS {spec['view']}")
+        if name not in existing:
+            conn.execute(f'CREATE VIRTUAL TABLE {name} USING fts5({_table_options(spec)})')
+            created.append(name)
+
+    # Triggers are recreated so that their bodies follow the current layout.
+    for statement in _trigger_statements():
+        conn.execute(statement)
+
+    for name in created:
+        _fill(conn, name)
+    conn.commit()
+    return True
+
+
+def rebuild(conn):
+    """Rebuild every search index from the current table contents."""
+    for name in INDEXES:
+        _fill(conn, name)
+    conn.commit()
+
+
+def match_expression(q):
+    """
+    Turn a search box string into an FTS5 MATCH expression.
+
+    Every word becomes a quoted prefix term, so "comp sci" finds
+    "Computer Science".  Terms are ANDed, which is FTS5's default.
+
+    Args:
+        q (str): Raw search text.
+
+    Returns:
+        str | None: The MATCH expression, or None if `q` has no searchable words.
+    """
+    tokens = _TOKEN.findall(q or '')
+    if not tokens:
+        return None
+    return ' '.join(f'"{t}"*' for t in tokens)
+
+
+def _table_options(spec):
+    columns = ', '.join(spec['columns'])
+    if 'key' in spec:
+        return f"{columns}, {spec['key']} UNINDEXED, prefix='2 3'"
+    return f"{columns}, content='{spec['source']}', content_rowid='{spec['rowid']}', prefix='2 3'"
+
+
+def _fill(conn, index):
+    spec = INDEXES[index]
+    if 'rowid' in spec:
+        conn.execute(f"INSERT INTO {index}({index}) VALUES ('rebuild')")
+        return
+    columns = ', '.join(spec['columns'] + [spec['key']])
+    conn.execute(f'DELETE FROM {index}')
+    conn.execute(f"INSERT INTO {index}({columns}) SELECT {columns} FROM {spec['source']}")
+
+
+def _index_rows(index, where, delete):
+    spec = INDEXES[index]
+    if 'key' in spec:
+        key = spec['key']
+        if delete:
+            return f"DELETE FROM {index} WHERE {key} IN (SELECT {key} FROM {spec['source']} WHERE {where});"
+        columns = ', '.join(spec['columns'] + [key])
+        return f"INSERT INTO {index}({columns}) SELECT {columns} FROM {spec['source']} WHERE {where};"
+    columns = ', '.join(spec['columns'])
+    if delete:
+        return (f"INSERT INTO {index}({index}, rowid, {columns}) "
+                f"SELECT 'delete', {spec['rowid']}, {columns} FROM {spec['source']} WHERE {where};")
+    return (f"INSERT INTO {index}(rowid, {columns}) "
+            f"SELECT {spec['rowid']}, {columns} FROM {spec['source']} WHERE {where};")
+
+
+def _trigger_statements():
+    statements = []
+    for table, watched, targets in _DEPENDENCIES:
+        events = [
+            ('ai', 'AFTER INSERT', 'NEW', False),
+            ('bd', 'BEFORE DELETE', 'OLD', True),
+            ('bu', f'BEFORE UPDATE OF {watched}', 'OLD', True),
+            ('au', f'AFTER UPDATE OF {watched}', 'NEW', False),
+        ]
+        for suffix, event, row, delete in events:
+            body = '\n'.join(_index_rows(index, where.format(row=row), delete) for index, where in targets)
+            statements.append(f'DROP TRIGGER IF EXISTS {table}_search_{suffix}')
+            statements.append(f'CREATE TRIGGER {table}_search_{suffix} {event} ON {table} BEGIN\n{body}\nEND')
+    return statements
@@ -0,0 +1,127 @@
+"""
+What-if matching simulations for Labs at Yale.
+
+Before saving a matching, faculty admins can ask how the outcome would change
+with different strategies, top-k cutoffs or capacities.  `simulate()` loads
+the preferences once, pickles them once, and hands the bytes to every worker
+of a ProcessPoolExecutor when it starts.  Each scenario then runs against that
+read-only copy, so the only per-scenario traffic is the scenario itself and
+its summary.
+
+A scenario is a dict with any of:
+    - strategy (str): Key in matching.STRATEGIES. Defaults to the default strategy.
+    - top_k (int | None): Cutoff passed to the strategy.
+    - capacity (dict[int, int]): fellowship_id -> capacity overrides.
+    - capacity_scale (float): Multiplier applied to every capacity (rounded, at least 1).
+
+Functions:
+    - simulate(scenarios, data=None, workers=None)
+    - run_scenario(data, scenario)
+"""
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+from matching import DEFAULT_STRATEGY, PreferenceTable, load_preferences, run_strategy
+
+# Limits on what one request to the simulation endpoint may ask for.
+MAX_SCENARIOS = 64
+MAX_WORKERS = os.cpu_count() or 1
+
+_shared = None
+
+
+def simulate(scenarios, data=None, workers=None):
+    """
+    Run every scenario and return one summary per scenario, in order.
+
+    Args:
+        scenarios (list[dict]): Scenario definitions (see module docstring).
+        data (PreferenceTable, optional): Preferences to use. Loaded from the
+            database once when omitted.
+        workers (int, optional): Worker processes. Defaults to the CPU count;
+            1 runs everything in this process.
+
+    Returns:
+        list[dict]: The result of `run_scenario` for each scenario.
+    """
+    if data is None:
+        data = load_preferences()
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, len(scenarios)) or 1
+    if workers == 1:
+        return [run_scenario(data, scenario) for scenario in scenarios]
+
+    payload = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+    chunksize = max(1, len(scenarios) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_load_shared, initargs=(payload,)) as pool:
+        return list(pool.map(_run_shared, scenarios, chunksize=chunksize))
+
+
+def run_scenario(data, scenario):
+    """
+    Run one scenario and summarize the outcome.
+
+    Args:
+        data (PreferenceTable): Preferences to match. Not modified.
+        scenario (dict): Scenario definition (see module docstring).
+
+    Returns:
+        dict: `scenario`, `matched`, `students`, `match_rate`, `fill`
+            (fellowship_id -> matched / capacity, for every fellowship), and
+            `rank_distribution` (position in the student's ranking -> number of
+            students matched there).
+    """
+    data = _with_capacities(data, scenario)
+    params = {}
+    if 'top_k' in scenario:
+        params['top_k'] = scenario['top_k']
+    matches = run_strategy(scenario.get('strategy', DEFAULT_STRATEGY), data, **params)
+
+    fellowship_index = {fid: f for f, fid in enumerate(data.fellowship_ids)}
+    student_index = {s: i for i, s in enumerate(data.student_ids)}
+    # Every fellowship is listed, unfilled ones at 0, so averages over `fill` are not biased upward.
+    fill = dict.fromkeys(data.fellowship_ids, 0.0)
+    rank_distribution = {}
+    matched = 0
+    for fid, students in matches.items():
+        f = fellowship_index[fid]
+        fill[fid] = len(students) / data.capacity[f] if data.capacity[f] else 0.0
+        matched += len(students)
+        for net_id in students:
+            position = data.student_prefs[student_index[net_id]].index(f)
+            rank_distribution[position + 1] = rank_distribution.get(position + 1, 0) + 1
+
+    return {
+        'scenario': scenario,
+        'matched': matched,
+        'students': len(data.student_ids),
+        'match_rate': matched / len(data.student_ids) if data.student_ids else 0.0,
+        'fill': fill,
+        'rank_distribution': dict(sorted(rank_distribution.items())),
+    }
+
+
+def _with_capacities(data, scenario):
+    overrides = scenario.get('capacity')
+    scale = scenario.get('capacity_scale')
+    if not overrides and scale is None:
+        return data
+    capacity = list(data.capacity)
+    if scale is not None:
+        capacity = [max(1, round(c * scale)) if c > 0 else c for c in capacity]
+    if overrides:
+        for f, fid in enumerate(data.fellowship_ids):
+            if fid in overrides:
+                capacity[f] = overrides[fid]
+    return PreferenceTable(data.student_ids, data.fellowship_ids, capacity,
+                           data.student_prefs, data.faculty_rank)
+
+
+def _load_shared(payload):
+    global _shared
+    _shared = pickle.loads(payload)
+
+
+def _run_shared(scenario):
+    return run_scenario(_shared, scenario)
@@ -1,6 +1,13 @@
+import os
+import sqlite3
+
 import pytest
+import database
+import migrate
 from fellowship import app as flask_app
 
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "schema.sql")
+
 @pytest.fixture
 def app(): 
     """Flask app for testing"""
@@ -11,4 +18,24 @@ def app():
 def client(app):
     """Flask test client"""
     with app.test_client() as client: 
-        yield client
\ No newline at end of file
+        yield client
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Empty database built from schema.sql and wired into the database module"""
+    path = str(tmp_path / "labsatyale.sqlite")
+    with open(SCHEMA_PATH) as f:
+        schema = f.read()
+    conn = sqlite3.connect(path)
+    conn.executescript(schema)
+    migrate.upgrade(conn)
+    conn.close()
+
+    monkeypatch.setattr(database, "_DATABASE_URL", path)
+    database._pool.reset()
+    database.catalog_cache.clear()
+    database.user_cache.clear()
+    yield path
+    database._pool.reset()
+    database.catalog_cache.clear()
+    database.user_cache.clear()
@@ -0,0 +1,58 @@
+import sqlite3
+
+import database
+
+
+def _seed(path):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("INSERT INTO users VALUES ('prof', 'P', 'Rof', 'prof@yale.edu', 'x', 'faculty')")
+    conn.execute("INSERT INTO faculty VALUES ('prof', 'CS')")
+    conn.execute("INSERT INTO labs (lab_num, lab_name, faculty_net_id) VALUES (1, 'Lab', 'prof')")
+    for i in range(3):
+        conn.execute("INSERT INTO users VALUES (?, 'S', 'T', ?, 'x', 'student')", (f"s{i}", f"s{i}@yale.edu"))
+        conn.execute("INSERT INTO students (net_id, class_year) VALUES (?, 2026)", (f"s{i}",))
+    conn.executemany("INSERT INTO fellowships (fellowship_id, lab_num, name) VALUES (?, 1, ?)",
+                     [(1, "A"), (2, "B"), (3, "C")])
+    conn.executemany("INSERT INTO applications (fellowship_id, student_net_id) VALUES (?, ?)",
+                     [(1, "s0"), (1, "s1"), (1, "s2"), (2, "s0")])
+    conn.commit()
+    return conn
+
+
+def _counts():
+    return {f.get_fellowship_id(): f.get_application_count() for f in database.get_fellowship_information()}
+
+
+def test_triggers_keep_counts_exact(db_path):
+    conn = _seed(db_path)
+    assert _counts() == {1: 3, 2: 1, 3: 0}
+
+    conn.execute("DELETE FROM applications WHERE fellowship_id = 1 AND student_net_id = 's1'")
+    conn.execute("UPDATE applications SET fellowship_id = 3 WHERE fellowship_id = 2")
+    conn.execute("DELETE FROM users WHERE net_id = 's2'")  # cascades to students and applications
+    conn.commit()
+    conn.close()
+    assert _counts() == {1: 1, 2: 0, 3: 1}
+
+
+def test_rebuild_repairs_drifted_counts(db_path):
+    conn = _seed(db_path)
+    conn.execute("UPDATE fellowships SET application_count = 42 WHERE fellowship_id = 3")
+    conn.commit()
+    conn.close()
+    assert database.rebuild_application_counts() == 1
+    assert _counts() == {1: 3, 2: 1, 3: 0}
+    assert database.rebuild_application_counts() == 0
+
+
+def test_listing_does_not_aggregate_applications(db_path):
+    _seed(db_path).close()
+    with database.get_connection() as conn:
+        statements = []
+        conn.set_trace_callback(statements.append)
+        database.get_fellowship_information()
+        conn.set_trace_callback(None)
+        (query,) = [s for s in statements if "FROM fellowships" in s]
+        plan = " | ".join(r[3] for r in conn.execute(f"EXPLAIN QUERY PLAN {query}"))
+    assert "applications" not in plan.lower() and "TEMP B-TREE" not in plan
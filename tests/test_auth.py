@@ -0,0 +1,118 @@
+import sqlite3
+import threading
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+import auth
+import fellowship
+from auth import HashPool, PoolBusy, RateLimiter
+
+
+def _add_user(db_path, password_hash, net_id="stu1"):
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO users VALUES (?, 'Grace', 'Hopper', 'grace@yale.edu', ?, 'student')",
+                 (net_id, password_hash))
+    conn.commit()
+    conn.close()
+
+
+def _stored_hash(db_path, net_id="stu1"):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT password_hash FROM users WHERE net_id = ?", (net_id,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_rate_limiter_refills_over_time():
+    now = [0.0]
+    limiter = RateLimiter(2, 10, clock=lambda: now[0])
+    assert limiter.acquire("a") == 0
+    assert limiter.acquire("a") == 0
+    assert limiter.acquire("a") == pytest.approx(5.0)
+    assert limiter.acquire("b") == 0
+    now[0] = 5.0
+    assert limiter.acquire("a") == 0
+    assert limiter.limited == 1
+
+
+def test_full_hash_pool_rejects_instead_of_queueing():
+    pool = HashPool(workers=1, queue_size=1)
+    started, release = threading.Event(), threading.Event()
+    running = pool.submit(lambda: started.set() or release.wait())
+    started.wait(1)
+    queued = pool.submit(lambda: "done")
+    with pytest.raises(PoolBusy):
+        pool.submit(lambda: None)
+    release.set()
+    assert running.result(1) is True
+    assert queued.result(1) == "done"
+    pool.stop()
+    assert pool.stats()["rejected"] == 1
+
+
+def test_timed_out_jobs_are_not_run():
+    pool = HashPool(workers=1, queue_size=4)
+    release = threading.Event()
+    pool.submit(release.wait)
+    ran = []
+    with pytest.raises(PoolBusy):
+        pool.run(ran.append, 1, timeout=0.01)
+    release.set()
+    pool.stop()
+    assert ran == []
+    assert pool.stats()["expired"] == 1
+
+
+def test_login_upgrades_legacy_hashes(db_path, monkeypatch):
+    monkeypatch.setattr(auth, "HASH_METHOD", "pbkdf2:sha256:2000")
+    _add_user(db_path, generate_password_hash("secret", "pbkdf2:sha256:1000"))
+
+    assert auth.authenticate("stu1", "wrong") is None
+    assert _stored_hash(db_path).startswith("pbkdf2:sha256:1000$")
+
+    user = auth.authenticate("stu1", "secret")
+    assert user.net_id == "stu1"
+    upgraded = _stored_hash(db_path)
+    assert upgraded.startswith("pbkdf2:sha256:2000$")
+    assert auth.authenticate("stu1", "secret").net_id == "stu1"
+    assert _stored_hash(db_path) == upgraded
+    assert auth.authenticate("nobody", "secret") is None
+
+
+def test_only_weaker_hashes_are_rehashed(monkeypatch):
+    monkeypatch.setattr(auth, "HASH_METHOD", "scrypt:32768:8:1")
+    assert auth.needs_rehash("scrypt:16384:8:1$salt$hash")
+    assert auth.needs_rehash("pbkdf2:sha256:1000000$salt$hash")
+    assert auth.needs_rehash("plain$salt$hash")
+    assert not auth.needs_rehash("scrypt:32768:8:1$salt$hash")
+    assert not auth.needs_rehash("scrypt:65536:8:1$salt$hash")
+
+    monkeypatch.setattr(auth, "HASH_METHOD", "pbkdf2:sha256:2000")
+    assert not auth.needs_rehash("scrypt:16384:8:1$salt$hash")
+    assert not auth.needs_rehash("pbkdf2:sha256:3000$salt$hash")
+    assert auth.needs_rehash("pbkdf2:sha256:1000$salt$hash")
+
+
+def test_login_is_rate_limited_per_net_id(client, db_path, monkeypatch):
+    monkeypatch.setattr(auth, "net_id_limiter", RateLimiter(2, 60))
+    monkeypatch.setattr(auth, "ip_limiter", RateLimiter(100, 60))
+    _add_user(db_path, generate_password_hash("secret", "pbkdf2:sha256:1000"))
+    for _ in range(2):
+        assert client.post("/login", data={"net_id": "stu1", "password": "wrong"}).status_code == 200
+    response = client.post("/login", data={"net_id": "stu1", "password": "secret"})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) == 30
+    # Other accounts from the same address are unaffected.
+    assert client.post("/login", data={"net_id": "stu2", "password": "x"}).status_code == 200
+
+
+def test_busy_hash_pool_answers_503(client, db_path, monkeypatch):
+    def busy(net_id, password):
+        raise PoolBusy("password hashing queue is full")
+
+    monkeypatch.setattr(fellowship, "authenticate", busy)
+    response = client.post("/login", data={"net_id": "stu1", "password": "secret"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
@@ -0,0 +1,90 @@
+import sqlite3
+
+import database
+import instrumentation
+from cache import TTLCache, cached
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_and_ttl_eviction_are_counted():
+    clock = Clock()
+    cache = TTLCache(maxsize=2, ttl=10, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1          # a is now the most recently used
+    cache.set("c", 3)                   # so b is evicted
+    assert cache.get("b") != 2 and cache.get("c") == 3
+    clock.now = 11
+    assert cache.get("a") != 1
+    assert cache.snapshot() == {"hits": 2, "misses": 2, "evictions": 1, "expirations": 1,
+                                "invalidations": 0, "size": 1}
+
+
+def test_invalidation_is_by_tag_and_blocks_racing_reads():
+    cache = TTLCache()
+    calls = []
+
+    @cached(cache, lambda result, x: (f"x:{x}",))
+    def load(x):
+        calls.append(x)
+        if x == 3:
+            cache.invalidate("x:3")     # a write lands while this read is running
+        return x * 10
+
+    assert [load(1), load(2), load(1), load(2)] == [10, 20, 10, 20]
+    cache.invalidate("x:1")
+    assert [load(1), load(2)] == [10, 20]
+    assert calls == [1, 2, 1]
+
+    load(3)
+    load(3)
+    assert calls[-2:] == [3, 3]         # the raced result was not stored
+
+
+def _seed(path):
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO users VALUES ('prof', 'Ada', 'Lovelace', 'prof@yale.edu', 'x', 'faculty')")
+    conn.execute("INSERT INTO faculty VALUES ('prof', 'CS')")
+    conn.execute("INSERT INTO labs (lab_num, lab_name, faculty_net_id) VALUES (1, 'Engine Lab', 'prof')")
+    conn.executemany("INSERT INTO fellowships (fellowship_id, lab_num, name) VALUES (?, 1, ?)", [(1, "A"), (2, "B")])
+    conn.commit()
+    conn.close()
+
+
+def _queries(fn, *args):
+    stats = instrumentation.start_collecting()
+    try:
+        result = fn(*args)
+    finally:
+        instrumentation.stop_collecting()
+    return result, sum(1 for s in stats.statements if not s["sql"].startswith("PRAGMA"))
+
+
+def test_catalog_reads_are_cached_until_their_data_changes(db_path):
+    _seed(db_path)
+    assert _queries(database.get_fellowships_by_faculty, "prof")[1] == 1
+    fellowships, queries = _queries(database.get_fellowships_by_faculty, "prof")
+    assert queries == 0 and len(fellowships) == 2
+    assert _queries(database.get_fellowship_by_id, 2)[1] == 1
+    assert _queries(database.get_fellowship_by_id, 2)[1] == 0
+    assert _queries(database.get_labs_information)[1] == 1
+
+    assert database.delete_fellowship(1)
+    fellowships, queries = _queries(database.get_fellowships_by_faculty, "prof")
+    assert queries == 1 and [f.fellowship_id for f in fellowships] == [2]
+    assert _queries(database.get_fellowship_by_id, 2)[1] == 0      # untouched
+    assert _queries(database.get_labs_information)[1] == 0
+
+    database.run_write(lambda conn: conn.execute("UPDATE users SET last_name = 'King' WHERE net_id = 'prof'"))
+    database.invalidate_faculty("prof")
+    fellowship, queries = _queries(database.get_fellowship_by_id, 2)
+    assert queries == 1 and fellowship.faculty_name == "Ada King"
+    assert database.get_labs_information()[0].get_faculty_name() == "Ada King"
+    assert database.get_cache_stats()["invalidations"] >= 4
@@ -0,0 +1,72 @@
+import csv
+import gzip
+import io
+import json
+
+import database
+import export
+from database import iter_matches, save_matches
+from tests.test_incremental import _seed
+
+ROWS = [(i, f"name, {i}", "café" if i % 2 else None) for i in range(500)]
+COLUMNS = ["id", "name", "note"]
+
+
+def test_chunks_round_trip(monkeypatch):
+    monkeypatch.setattr(export, "CHUNK_SIZE", 256)
+    monkeypatch.setattr(export, "ROW_BATCH", 7)
+
+    chunks = list(export.csv_chunks(COLUMNS, iter(ROWS)))
+    assert len(chunks) > 10
+    parsed = list(csv.reader(io.StringIO(b"".join(chunks).decode("utf-8"))))
+    assert parsed[0] == COLUMNS
+    assert parsed[1:] == [[str(i), name, note or ""] for i, name, note in ROWS]
+
+    chunks = list(export.json_chunks(COLUMNS, iter(ROWS)))
+    assert len(chunks) > 10
+    assert json.loads(b"".join(chunks)) == [dict(zip(COLUMNS, row)) for row in ROWS]
+    assert json.loads(b"".join(export.json_chunks(COLUMNS, []))) == []
+
+    plain = export.csv_chunks(COLUMNS, iter(ROWS))
+    assert gzip.decompress(b"".join(export.gzip_chunks(export.csv_chunks(COLUMNS, iter(ROWS))))) == b"".join(plain)
+
+
+def test_closing_an_export_early_returns_its_connection(db_path):
+    _seed(db_path)
+    run_id = save_matches({10: ["s1"], 20: ["s2"]})
+    rows = iter_matches(run_id)
+    assert next(rows) == (run_id, 10, "A", "s1", "S", "One", "s1@yale.edu")
+    assert database.get_pool_stats()["in_use"] == 1
+    rows.close()
+    assert database.get_pool_stats()["in_use"] == 0
+
+
+def test_export_routes(client, db_path):
+    _seed(db_path)
+    run_id = save_matches({10: ["s1"], 20: ["s2"]})
+    with client.session_transaction() as session:
+        session["_user_id"] = "prof"
+        session["_fresh"] = True
+
+    response = client.get("/export/fellowships/10/applicants.csv")
+    assert response.mimetype == "text/csv"
+    assert response.headers["Content-Disposition"] == 'attachment; filename="fellowship-10-applicants.csv"'
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert sorted(r["net_id"] for r in rows) == ["s1", "s2"]
+    assert client.get("/export/fellowships/99/applicants.csv").status_code == 404
+
+    response = client.get("/export/matches.json", headers={"Accept-Encoding": "gzip, deflate"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    matches = json.loads(gzip.decompress(response.get_data()))
+    assert [(m["match_run_id"], m["fellowship_id"], m["student_net_id"]) for m in matches] == \
+        [(run_id, 10, "s1"), (run_id, 20, "s2")]
+    assert client.get(f"/export/matches.csv?run={run_id + 1}").status_code == 404
+
+    response = client.get("/export/preferences/faculty.csv")
+    assert "Content-Encoding" not in response.headers
+    assert response.get_data(as_text=True).splitlines()[:2] == \
+        ["fellowship_id,fellowship_name,preference_rank,student_net_id", "10,A,1,s1"]
+
+    with client.session_transaction() as session:
+        session["_user_id"] = "s1"
+    assert client.get("/export/preferences/student.json").status_code == 302
@@ -0,0 +1,60 @@
+import sqlite3
+
+import database
+
+
+def _seed(path, fellowships):
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO users VALUES (?, ?, ?, ?, ?, ?)", [
+        ("prof", "P", "Rof", "prof@yale.edu", "x", "faculty"),
+        ("other", "O", "Ther", "other@yale.edu", "x", "faculty"),
+    ] + [(f"s{i}", "S", str(i), f"s{i}@yale.edu", "x", "student") for i in range(3)])
+    conn.executemany("INSERT INTO faculty VALUES (?, ?)", [("prof", "CS"), ("other", "Math")])
+    conn.executemany("INSERT INTO students (net_id, class_year) VALUES (?, 2026)", [(f"s{i}",) for i in range(3)])
+    conn.executemany("INSERT INTO labs (lab_num, lab_name, faculty_net_id) VALUES (?, ?, ?)",
+                     [(1, "Lab", "prof"), (2, "Other lab", "other")])
+    for fid in range(1, fellowships + 1):
+        conn.execute("INSERT INTO fellowships (fellowship_id, lab_num, name) VALUES (?, 1, 'F')", (fid,))
+        conn.executemany("INSERT INTO applications (fellowship_id, student_net_id, applied_at) VALUES (?, ?, ?)",
+                         [(fid, f"s{i}", f"2025-01-0{i + 1}") for i in range(3)])
+        conn.execute("INSERT INTO faculty_preferences VALUES (?, 's0', 1)", (fid,))
+    conn.execute("INSERT INTO fellowships (fellowship_id, lab_num, name) VALUES (99, 2, 'Not mine')")
+    conn.execute("INSERT INTO applications (fellowship_id, student_net_id) VALUES (99, 's1')")
+    conn.execute("INSERT INTO match_runs (match_run_id) VALUES (1)")
+    conn.execute("INSERT INTO matches (match_run_id, fellowship_id, student_net_id) VALUES (1, 1, 's0')")
+    conn.commit()
+    conn.close()
+
+
+def test_details_are_ranked_and_scoped_to_the_faculty(db_path):
+    """ranked applicants come first, then the rest newest first; other labs are left out"""
+    _seed(db_path, 2)
+    details = database.get_faculty_fellowship_details("prof")
+    assert sorted(details) == [1, 2]
+    assert [a.student_net_id for a in details[1]["applicants"]] == ["s0", "s2", "s1"]
+    assert details[1]["preferences"] == {"s0": 1}
+    assert details[1]["matched_students"] == ["s0"]
+    assert details[2]["matched_students"] == []
+
+
+def _count_statements():
+    statements = []
+    with database.get_connection() as conn:
+        conn.set_trace_callback(statements.append)
+        database.get_faculty_fellowship_details("prof")
+        conn.set_trace_callback(None)
+    return len(statements)
+
+
+def test_query_count_does_not_grow_with_fellowships(db_path):
+    _seed(db_path, 1)
+    one = _count_statements()
+
+    conn = sqlite3.connect(db_path)
+    for fid in range(100, 125):
+        conn.execute("INSERT INTO fellowships (fellowship_id, lab_num, name) VALUES (?, 1, 'F')", (fid,))
+        conn.execute("INSERT INTO applications (fellowship_id, student_net_id) VALUES (?, 's1')", (fid,))
+    conn.commit()
+    conn.close()
+
+    assert one == _count_statements() == 3
@@ -0,0 +1,163 @@
+import random
+import sqlite3
+
+import incremental
+import pytest
+from database import get_matches, load_matching_state
+from incremental import MatchingState, match_and_save, rematch, update
+from matching import PreferenceTable, load_preferences, run_matching
+
+
+def _random_rows(rng, students, fellowships):
+    student_rows = []
+    applicants = {fid: [] for fid in fellowships}
+    for net_id in students:
+        for fid in rng.sample(fellowships, rng.randint(0, min(4, len(fellowships)))):
+            student_rows.append((net_id, fid))
+            applicants[fid].append(net_id)
+    faculty_rows = []
+    for fid, net_ids in applicants.items():
+        rng.shuffle(net_ids)
+        faculty_rows.extend((fid, net_id) for net_id in net_ids)
+    return student_rows, faculty_rows
+
+
+def _table(students, capacities, student_rows, faculty_rows):
+    return PreferenceTable.from_rows(students, list(capacities.items()), student_rows, faculty_rows)
+
+
+@pytest.mark.parametrize("top_k", [2, None])
+def test_update_matches_full_recompute(top_k):
+    """replaying only the affected proposals ends where a full run does"""
+    rng = random.Random(8)
+    for _ in range(40):
+        students = [f"s{i}" for i in range(30)]
+        capacities = {fid: rng.randint(0, 3) for fid in range(10, 18)}
+        student_rows, faculty_rows = _random_rows(rng, students, list(capacities))
+        data = _table(students, capacities, student_rows, faculty_rows)
+        state = update(MatchingState.empty("mutual_top_k", top_k), data, students=data.student_ids)
+        assert state.held == run_matching(data, top_k=top_k)
+
+        changed_student = rng.choice(students)
+        student_rows = [r for r in student_rows if r[0] != changed_student]
+        for fid in rng.sample(list(capacities), 3):
+            student_rows.append((changed_student, fid))
+        changed_fellowship = rng.choice(list(capacities))
+        ranked = [r for r in faculty_rows if r[0] == changed_fellowship]
+        rng.shuffle(ranked)
+        faculty_rows = [r for r in faculty_rows if r[0] != changed_fellowship] + ranked
+        students.append("new")
+        student_rows.append(("new", changed_fellowship))
+        faculty_rows.append((changed_fellowship, "new"))
+        del capacities[rng.choice([f for f in capacities if f != changed_fellowship])]
+
+        data = _table(students, capacities, student_rows, faculty_rows)
+        state = update(state, data, students=[changed_student], fellowships=[changed_fellowship])
+        assert state.held == run_matching(data, top_k=top_k)
+
+
+@pytest.mark.parametrize("top_k", [1, 2, None])
+def test_update_follows_full_recompute_over_change_sequences(top_k):
+    """each step of a random sequence of ranking changes matches a full run of the new rankings"""
+    rng = random.Random(80)
+    for _ in range(150):
+        students = [f"s{i}" for i in range(12)]
+        capacities = {fid: rng.randint(1, 2) for fid in range(10, 15)}
+        student_rows, faculty_rows = _random_rows(rng, students, list(capacities))
+        data = _table(students, capacities, student_rows, faculty_rows)
+        state = update(MatchingState.empty("mutual_top_k", top_k), data, students=data.student_ids)
+
+        for _ in range(10):
+            changed_students, changed_fellowships = set(), set()
+            for _ in range(rng.randint(1, 3)):
+                if rng.random() < 0.5:
+                    s = rng.choice(students)
+                    ranked = [r for r in student_rows if r[0] == s]
+                    rng.shuffle(ranked)
+                    if ranked and rng.random() < 0.3:
+                        ranked.pop()
+                    student_rows = [r for r in student_rows if r[0] != s] + ranked
+                    changed_students.add(s)
+                else:
+                    fid = rng.choice(list(capacities))
+                    ranked = [r for r in faculty_rows if r[0] == fid]
+                    rng.shuffle(ranked)
+                    faculty_rows = [r for r in faculty_rows if r[0] != fid] + ranked
+                    changed_fellowships.add(fid)
+
+            data = _table(students, capacities, student_rows, faculty_rows)
+            state = update(state, data, students=changed_students, fellowships=changed_fellowships)
+            assert state.held == run_matching(data, top_k=top_k)
+
+
+def _seed(path):
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        INSERT INTO users (net_id, email, password_hash, first_name, last_name, role) VALUES
+            ('prof', 'prof@yale.edu', 'x', 'P', 'Rof', 'faculty'),
+            ('s1', 's1@yale.edu', 'x', 'S', 'One', 'student'),
+            ('s2', 's2@yale.edu', 'x', 'S', 'Two', 'student');
+        INSERT INTO faculty (net_id, department) VALUES ('prof', 'CS');
+        INSERT INTO students (net_id, class_year) VALUES ('s1', 2026), ('s2', 2026);
+        INSERT INTO labs (lab_num, lab_name, faculty_net_id) VALUES (1, 'Lab', 'prof');
+        INSERT INTO fellowships (fellowship_id, lab_num, name, capacity) VALUES (10, 1, 'A', 1), (20, 1, 'B', 1);
+        INSERT INTO applications (student_net_id, fellowship_id) VALUES
+            ('s1', 10), ('s1', 20), ('s2', 10), ('s2', 20);
+        INSERT INTO student_preferences (student_net_id, fellowship_id, preference_rank) VALUES
+            ('s1', 10, 1), ('s1', 20, 2), ('s2', 10, 1), ('s2', 20, 2);
+        INSERT INTO faculty_preferences (fellowship_id, student_net_id, preference_rank) VALUES
+            (10, 's1', 1), (10, 's2', 2), (20, 's1', 1), (20, 's2', 2);
+    """)
+    conn.commit()
+    conn.close()
+
+
+def test_rematch_writes_only_the_change(db_path):
+    """flipping one faculty ranking moves both students and keeps the state in sync"""
+    _seed(db_path)
+    assert match_and_save("mutual_top_k") == {10: ["s1"], 20: ["s2"]}
+    assert load_matching_state()["rejected"] == {10: {"s2"}}
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("DELETE FROM faculty_preferences WHERE fellowship_id = 10")
+    conn.execute("INSERT INTO faculty_preferences VALUES (10, 's2', 1), (10, 's1', 2)")
+    conn.commit()
+    conn.close()
+
+    diff = rematch(fellowships=[10])
+    assert sorted(diff["matches_added"]) == [(10, "s2"), (20, "s1")]
+    assert sorted(diff["matches_removed"]) == [(10, "s1"), (20, "s2")]
+    assert get_matches() == {10: ["s2"], 20: ["s1"]}
+
+
+def test_rematch_skips_batch_only_strategies(db_path):
+    _seed(db_path)
+    match_and_save("fellowship_proposing")
+    assert load_matching_state() is None
+    assert rematch(students=["s1"]) is None
+
+
+def test_rematch_recomputes_when_the_state_changes_under_it(db_path, monkeypatch):
+    """a save that lands while a re-match is computing makes it start over from the saved state"""
+    _seed(db_path)
+    match_and_save("mutual_top_k")
+    conn = sqlite3.connect(db_path)
+    conn.execute("DELETE FROM faculty_preferences WHERE fellowship_id = 10")
+    conn.execute("INSERT INTO faculty_preferences VALUES (10, 's2', 1), (10, 's1', 2)")
+    conn.commit()
+    conn.close()
+
+    raced = []
+
+    def racing_load():
+        # The first attempt loses to a full matching saved after it read the state.
+        if not raced:
+            raced.append(True)
+            match_and_save("mutual_top_k")
+        return load_preferences()
+
+    monkeypatch.setattr(incremental, "load_preferences", racing_load)
+    diff = rematch(fellowships=[10])
+    assert diff["matches_added"] == diff["matches_removed"] == []
+    assert get_matches() == {10: ["s2"], 20: ["s1"]}
+    assert load_matching_state()["rejected"] == {10: {"s1"}}
@@ -0,0 +1,49 @@
+import json
+import logging
+
+import database
+import instrumentation
+
+
+def test_cursor_counts_queries_and_rows_only_while_collecting(db_path):
+    with database.get_connection() as conn:
+        conn.execute("SELECT 1").fetchall()
+        stats = instrumentation.start_collecting()
+        try:
+            conn.execute("SELECT 1 UNION ALL SELECT 2").fetchall()
+            for _ in conn.execute("SELECT 3"):
+                pass
+        finally:
+            instrumentation.stop_collecting()
+    assert stats.queries == 2
+    assert stats.rows == 3
+    assert [s["rows"] for s in stats.statements] == [2, 1]
+
+
+def test_request_reports_headers_log_and_metrics(app, client, db_path, caplog, monkeypatch):
+    monkeypatch.setitem(app.config, "QUERY_DEBUG_HEADERS", True)
+    monkeypatch.setitem(app.config, "QUERY_SLOW_MS", 0)
+    monkeypatch.setitem(app.config, "METRICS_ACCESS", "local")
+    with caplog.at_level(logging.INFO, logger="labsatyale.queries"):
+        response = client.get("/labs")
+
+    assert response.status_code == 200
+    assert int(response.headers["X-DB-Queries"]) >= 1
+    assert float(response.headers["X-DB-Time-ms"]) > 0
+
+    line = json.loads(caplog.records[-1].getMessage())
+    assert line["endpoint"] == "labs" and line["queries"] == int(response.headers["X-DB-Queries"])
+    assert any(s["plan"] for s in line["slowest"])
+
+    metrics = client.get("/metrics").get_data(as_text=True)
+    assert "# TYPE labsatyale_db_queries_total counter" in metrics
+    assert 'labsatyale_requests_total{endpoint="labs"}' in metrics
+
+
+def test_metrics_are_served_only_where_configured(app, client, db_path, monkeypatch):
+    assert client.get("/metrics").status_code == 404
+    monkeypatch.setitem(app.config, "METRICS_ACCESS", "local")
+    assert client.get("/metrics").status_code == 200
+    assert client.get("/metrics", environ_base={"REMOTE_ADDR": "10.0.0.5"}).status_code == 404
+    monkeypatch.setitem(app.config, "METRICS_ACCESS", "any")
+    assert client.get("/metrics", environ_base={"REMOTE_ADDR": "10.0.0.5"}).status_code == 200
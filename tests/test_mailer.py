@@ -0,0 +1,156 @@
+import smtplib
+import sqlite3
+import time
+from email.mime.text import MIMEText
+
+import database
+import mailer
+from mailer import EmailWorker, MemoryTransport, SMTPTransport, queue_email, queue_notification
+
+
+class FlakyTransport(MemoryTransport):
+    """Fails the first `failures` sends"""
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    def send(self, from_addr, to_addrs, message):
+        if self.failures:
+            self.failures -= 1
+            raise smtplib.SMTPServerDisconnected("connection lost")
+        super().send(from_addr, to_addrs, message)
+
+
+def _message(to):
+    msg = MIMEText("hello")
+    msg["To"] = to
+    msg["Subject"] = "Hi"
+    return msg
+
+
+def _drain(worker, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        counts = database.get_outbox_counts()
+        if not counts.get("pending") and not counts.get("sending"):
+            return counts
+        worker.wake()
+        time.sleep(0.01)
+    raise AssertionError(f"outbox not drained: {database.get_outbox_counts()}")
+
+
+def test_queue_email_only_writes_the_outbox(db_path, monkeypatch):
+    monkeypatch.setattr(mailer, "_worker", None)
+    queue_email(_message("a@yale.edu"))
+    assert database.get_outbox_counts() == {"pending": 1}
+
+
+def test_worker_retries_with_backoff_then_delivers(db_path):
+    transport = FlakyTransport(failures=2)
+    for to in ("a@yale.edu", "b@yale.edu"):
+        queue_email(_message(to))
+    worker = EmailWorker(lambda: transport, workers=1, poll_interval=0.01, backoff=0.01)
+    try:
+        assert _drain(worker) == {"sent": 2}
+    finally:
+        worker.stop()
+    assert sorted(to for _, (to,), _ in transport.sent) == ["a@yale.edu", "b@yale.edu"]
+    assert worker.stats == {"sent": 2, "retried": 2, "failed": 0}
+
+
+def test_worker_survives_bookkeeping_errors(db_path, monkeypatch):
+    mark_email_sent = database.mark_email_sent
+    calls = []
+
+    def locked_once(email_id, send_seconds=None):
+        calls.append(email_id)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        mark_email_sent(email_id, send_seconds)
+
+    monkeypatch.setattr(mailer, "mark_email_sent", locked_once)
+    transport = MemoryTransport()
+    for to in ("a@yale.edu", "b@yale.edu"):
+        queue_email(_message(to))
+    worker = EmailWorker(lambda: transport, workers=1, poll_interval=0.01, lease=0.2)
+    try:
+        assert _drain(worker) == {"sent": 2}
+    finally:
+        worker.stop()
+    assert len(transport.sent) == 3 and len(calls) == 3
+
+
+def test_worker_gives_up_after_max_attempts(db_path):
+    queue_email(_message("a@yale.edu"))
+    worker = EmailWorker(lambda: FlakyTransport(failures=10), workers=1, poll_interval=0.01,
+                         backoff=0.01, max_attempts=3)
+    try:
+        assert _drain(worker) == {"failed": 1}
+    finally:
+        worker.stop()
+    assert worker.stats["retried"] == 2
+
+
+def test_retry_delay_doubles_up_to_the_cap():
+    worker = EmailWorker(MemoryTransport, workers=0, backoff=30, max_backoff=100)
+    assert [worker.retry_delay(n) for n in (1, 2, 3, 4)] == [30, 60, 100, 100]
+
+
+def test_smtp_session_is_reused(monkeypatch):
+    opened = []
+
+    class FakeSMTP:
+        def __init__(self, host, port, timeout):
+            opened.append(self)
+            self.sent = 0
+
+        def ehlo(self):
+            pass
+
+        def starttls(self):
+            pass
+
+        def login(self, user, password):
+            pass
+
+        def sendmail(self, from_addr, to_addrs, message):
+            self.sent += 1
+
+        def quit(self):
+            pass
+
+    monkeypatch.setattr(smtplib, "SMTP", FakeSMTP)
+    transport = SMTPTransport(host="localhost", port=8025)
+    for _ in range(3):
+        transport.send("from@yale.edu", ["to@yale.edu"], "message")
+    assert len(opened) == 1 and opened[0].sent == 3
+
+
+def test_notification_targets_class_years_in_batches(db_path):
+    conn = sqlite3.connect(db_path)
+    for i in range(7):
+        year, subscribed = (2026, 1) if i < 5 else (2027, i % 2)
+        conn.execute("INSERT INTO users VALUES (?, 'S', 'T', ?, 'x', 'student')", (f"s{i}", f"s{i}@yale.edu"))
+        conn.execute("INSERT INTO students (net_id, class_year, subscribed) VALUES (?, ?, ?)", (f"s{i}", year, subscribed))
+    conn.commit()
+    plan = " ".join(r[3] for r in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT net_id FROM students WHERE subscribed = 1 AND class_year IN (2026)"))
+    conn.close()
+    assert "COVERING INDEX idx_students_subscribed" in plan
+
+    emails = [email for _, email in database.get_notification_subscribers(["2026"])]
+    assert sorted(emails) == [f"s{i}@yale.edu" for i in range(5)]
+
+    notification_id = queue_notification(lambda: _message("undisclosed"), emails, ["2026"], batch_size=2)
+    transport = MemoryTransport()
+    worker = EmailWorker(lambda: transport, workers=2, poll_interval=0.01)
+    try:
+        _drain(worker)
+    finally:
+        worker.stop()
+
+    assert sorted(len(to) for _, to, _ in transport.sent) == [1, 2, 2]
+    metrics = database.get_notification_metrics(notification_id)
+    assert metrics["recipients"] == 5 and metrics["status"] == {"sent": 3}
+    assert [b["recipients"] for b in metrics["batches"]] == [2, 2, 1]
+    assert all(b["send_seconds"] is not None for b in metrics["batches"])
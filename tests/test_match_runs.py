@@ -0,0 +1,95 @@
+import sqlite3
+
+import database
+from database import get_matches, save_matches
+from incremental import match_and_save, rematch
+from tests.test_incremental import _seed
+
+
+def _runs(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return [r[0] for r in conn.execute("SELECT match_run_id FROM match_runs ORDER BY match_run_id")]
+    finally:
+        conn.close()
+
+
+def test_each_save_is_a_new_run_and_old_runs_stay_readable(db_path, monkeypatch):
+    _seed(db_path)
+    first = save_matches({10: ["s1", "s2"], 20: "s1"})
+    second = save_matches({20: ["s2"]})
+    assert get_matches() == {20: ["s2"]}
+    assert get_matches(first) == {10: ["s1", "s2"], 20: ["s1"]}
+    assert get_matches(second + 1) == {}
+
+    monkeypatch.setattr(database, "MATCH_RUNS_KEPT", 2)
+    third = save_matches({10: ["s2"]})
+    assert _runs(db_path) == [second, third]
+    assert get_matches(first) == {}
+
+
+def test_full_matchings_start_runs_and_rematches_update_in_place(db_path):
+    _seed(db_path)
+    match_and_save("mutual_top_k")
+    first = _runs(db_path)
+    assert get_matches() == {10: ["s1"], 20: ["s2"]}
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("DELETE FROM faculty_preferences WHERE fellowship_id = 10")
+    conn.execute("INSERT INTO faculty_preferences VALUES (10, 's2', 1), (10, 's1', 2)")
+    conn.commit()
+    conn.close()
+
+    rematch(fellowships=[10])
+    assert _runs(db_path) == first
+    assert get_matches() == {10: ["s2"], 20: ["s1"]}
+
+    match_and_save("mutual_top_k")
+    assert len(_runs(db_path)) == 2
+    assert get_matches() == {10: ["s2"], 20: ["s1"]}
+    assert get_matches(first[0]) == {10: ["s2"], 20: ["s1"]}
+
+
+def test_runs_record_how_they_were_made(db_path):
+    _seed(db_path)
+    match_and_save("student_proposing")
+    match_and_save("fellowship_proposing", top_k=1)
+    newest, oldest = database.get_match_runs()
+    assert (oldest["strategy"], oldest["params"]) == ("student_proposing", {"top_k": None})
+    assert (newest["strategy"], newest["params"]) == ("fellowship_proposing", {"top_k": 1})
+    matches = get_matches(newest["match_run_id"])
+    assert newest["matched_count"] == sum(map(len, matches.values()))
+    assert newest["fellowship_count"] == len(matches)
+    assert newest["duration_seconds"] >= 0
+
+
+def test_diff_between_runs(db_path):
+    _seed(db_path)
+    old = save_matches({10: ["s1"], 20: ["s2"]})
+    new = save_matches({20: ["s1"]})
+    assert database.diff_match_runs(old, new) == {
+        "added": [], "removed": [("s2", 20)], "moved": [("s1", 10, 20)]}
+    assert database.diff_match_runs(new, old) == {
+        "added": [("s2", 20)], "removed": [], "moved": [("s1", 20, 10)]}
+    assert database.diff_match_runs(old, old) == {"added": [], "removed": [], "moved": []}
+
+
+def test_match_run_pages(client, db_path):
+    _seed(db_path)
+    old = save_matches({10: ["s1"], 20: ["s2"]})
+    new = save_matches({20: ["s1"]})
+    with client.session_transaction() as session:
+        session["_user_id"] = "prof"
+        session["_fresh"] = True
+
+    page = client.get("/matches/runs").get_data(as_text=True)
+    assert "Changes from run 1 to run 2" in page and "Moved" in page and "Removed" in page
+
+    body = client.get(f"/matches/runs/{old}/diff/{new}").get_json()
+    assert body["old"]["matched_count"] == 2 and body["new"]["matched_count"] == 1
+    assert body["moved"] == [{"student_net_id": "s1", "old_fellowship_id": 10, "new_fellowship_id": 20}]
+    assert client.get(f"/matches/runs/{old}/diff/99").status_code == 404
+
+    with client.session_transaction() as session:
+        session["_user_id"] = "s1"
+    assert client.get(f"/matches/runs/{old}/diff/{new}").status_code == 403
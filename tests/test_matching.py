@@ -0,0 +1,70 @@
+import pytest
+from matching import PreferenceTable, STRATEGIES, count_blocking_pairs, run_matching, run_strategy
+
+
+def test_unknown_fellowship_keeps_later_choices_in_place():
+    """stu1 lists a deleted fellowship first, so fellowship 10 is its second choice"""
+    data = PreferenceTable.from_rows(
+        ["stu1", "stu2"],
+        [(10, 1)],
+        [("stu1", 99), ("stu1", 10), ("stu2", 10)],
+        [(10, "stu1"), (10, "stu2")],
+    )
+    assert data.student_prefs == [[-1, 0], [0]]
+    assert data.faculty_rank == [{0: 0, 1: 1}]
+    assert run_matching(data) == {10: ["stu1"]}
+
+
+def test_faculty_rank_counts_students_without_applications():
+    """a ranked student who did not apply still occupies a ranking position"""
+    data = PreferenceTable.from_rows(
+        ["stu2"],
+        [(10, 1)],
+        [("stu2", 10)],
+        [(10, "gone"), (10, "other"), (10, "stu2")],
+    )
+    assert data.faculty_rank == [{0: 2}]
+    assert run_matching(data) == {}
+
+
+def test_full_fellowship_replaces_worst_holder():
+    """with the cutoff lifted, a better-ranked latecomer bumps the worst holder"""
+    data = PreferenceTable.from_rows(
+        ["a", "b", "c", "d"],
+        [(10, 2), (20, 2)],
+        [("a", 10), ("b", 10), ("c", 10), ("c", 20), ("d", 10)],
+        [(10, "d"), (10, "a"), (10, "b"), (10, "c"), (20, "c")],
+    )
+    assert run_matching(data, top_k=None) == {10: ["d", "a"], 20: ["c"]}
+
+
+def test_strategies_agree_on_stable_outcome():
+    """both proposing sides find a stable matching; here it is unique"""
+    data = PreferenceTable.from_rows(
+        ["a", "b"],
+        [(10, 1), (20, 1)],
+        [("a", 10), ("a", 20), ("b", 10), ("b", 20)],
+        [(10, "b"), (10, "a"), (20, "a"), (20, "b")],
+    )
+    for name in ("student_proposing", "fellowship_proposing"):
+        matches = run_strategy(name, data)
+        assert matches == {10: ["b"], 20: ["a"]}
+        assert count_blocking_pairs(data, matches) == 0
+    assert set(STRATEGIES) >= {"mutual_top_k", "student_proposing", "fellowship_proposing"}
+
+
+def test_blocking_pairs_after_a_deleted_fellowship():
+    """an unmatched student's deleted first choice (-1) must not end the scan of their ranking"""
+    data = PreferenceTable.from_rows(
+        ["a", "b"],
+        [(10, 1)],
+        [("a", 99), ("a", 10), ("b", 10)],
+        [(10, "a"), (10, "b")],
+    )
+    assert count_blocking_pairs(data, {10: ["b"]}) == 1
+    assert count_blocking_pairs(data, {10: ["a"]}) == 0
+
+
+def test_unknown_strategy_rejected():
+    with pytest.raises(ValueError):
+        run_strategy("lottery", PreferenceTable.from_rows([], [], [], []))
@@ -0,0 +1,100 @@
+import sqlite3
+
+import pytest
+
+import database
+import instrumentation
+import migrate
+
+
+def _plan(call):
+    """Run `call`, then EXPLAIN QUERY PLAN the first statement it ran (after connection setup)"""
+    stats = instrumentation.start_collecting()
+    try:
+        call()
+    finally:
+        instrumentation.stop_collecting()
+    statement = next(s for s in stats.statements if not s["sql"].startswith("PRAGMA"))
+    with database.get_connection() as conn:
+        return " | ".join(instrumentation.explain(conn, statement["sql"], statement["params"]))
+
+
+def test_upgrade_applies_each_migration_once_in_order(tmp_path):
+    directory = tmp_path / "migrations"
+    directory.mkdir()
+    (directory / "0001_create_t.sql").write_text("CREATE TABLE t (x INTEGER);")
+    (directory / "0002_index_t.sql").write_text("CREATE INDEX idx_t ON t (x);")
+    (directory / "notes.txt").write_text("ignored")
+    conn = sqlite3.connect(str(tmp_path / "db.sqlite"))
+
+    assert [m.version for m in migrate.upgrade(conn, target=1, directory=str(directory))] == [1]
+    assert migrate.current_version(conn) == 1
+    assert [m.name for m in migrate.upgrade(conn, directory=str(directory))] == ["index_t"]
+    assert migrate.upgrade(conn, directory=str(directory)) == []
+    assert migrate.current_version(conn) == 2
+
+
+def test_failing_migration_is_rolled_back(tmp_path):
+    directory = tmp_path / "migrations"
+    directory.mkdir()
+    (directory / "0001_create_t.sql").write_text("CREATE TABLE t (x INTEGER);")
+    (directory / "0002_broken.sql").write_text("CREATE TABLE u (y INTEGER); INSERT INTO missing VALUES (1);")
+    conn = sqlite3.connect(str(tmp_path / "db.sqlite"))
+
+    with pytest.raises(sqlite3.OperationalError):
+        migrate.upgrade(conn, directory=str(directory))
+    assert migrate.current_version(conn) == 1
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert "t" in tables and "u" not in tables
+
+
+def test_shipped_migrations_are_applied_to_the_test_database(db_path):
+    with database.get_connection() as conn:
+        assert migrate.pending(conn) == []
+        assert migrate.current_version(conn) == migrate.load_migrations()[-1].version
+
+
+def test_lookups_use_the_migrated_indexes(db_path):
+    plan = _plan(lambda: database.get_student_applications("stu1"))
+    assert "USING INDEX idx_applications_student (student_net_id=?)" in plan
+    assert "TEMP B-TREE FOR ORDER BY" not in plan
+
+    plan = _plan(lambda: database.get_saved_fellowship_ids("stu1"))
+    assert "COVERING INDEX idx_saved_fellowships_student_saved_at (student_net_id=?)" in plan
+    assert "TEMP B-TREE" not in plan
+
+    assert "COVERING INDEX idx_students_subscribed" in _plan(database.get_notification_subscribers)
+
+    plan = _plan(lambda: database.get_fellowship_applicants("prof1", 1))
+    assert "USING INDEX idx_applications_fellowship_applied_at (fellowship_id=?)" in plan
+    assert "TEMP B-TREE" not in plan
+
+    plan = _plan(lambda: database.get_matches(1))
+    assert "COVERING INDEX sqlite_autoindex_matches_1 (match_run_id=?)" in plan
+    assert "TEMP B-TREE" not in plan
+
+    with database.get_connection() as conn:
+        def explain(sql):
+            return " | ".join(instrumentation.explain(conn, sql, ("x",)))
+
+        assert "COVERING INDEX sqlite_autoindex_labs_1 (faculty_net_id=?)" in \
+            explain("SELECT lab_num FROM labs WHERE faculty_net_id = ?")
+        assert "USING INDEX idx_fellowships_lab (lab_num=?)" in \
+            explain("SELECT f.name FROM labs l JOIN fellowships f ON f.lab_num = l.lab_num WHERE l.faculty_net_id = ?")
+        assert "USING INDEX idx_password_resets_email (email=?)" in \
+            explain("SELECT token FROM password_resets WHERE email = ? ORDER BY created_at DESC")
+
+
+def test_existing_matches_become_the_first_run(tmp_path):
+    path = str(tmp_path / "db.sqlite")
+    conn = sqlite3.connect(path)
+    with open(database._SCHEMA_PATH) as f:
+        conn.executescript(f.read())
+    migrate.upgrade(conn, target=4)
+    conn.execute("PRAGMA foreign_keys = OFF")
+    conn.execute("INSERT INTO matches (fellowship_id, student_net_id) VALUES (10, 's1'), (20, 's2')")
+    conn.commit()
+    migrate.upgrade(conn)
+    assert conn.execute("SELECT match_run_id FROM match_runs").fetchall() == [(1,)]
+    assert conn.execute("SELECT match_run_id, fellowship_id, student_net_id FROM matches ORDER BY match_id").fetchall() \
+        == [(1, 10, "s1"), (1, 20, "s2")]
@@ -0,0 +1,102 @@
+import sqlite3
+
+import pytest
+
+import database
+import pagination
+from benchmarks.common import seed
+
+
+def _walk(fetch, limit):
+    """Follow next_cursor from the first page to the last, returning every page"""
+    pages, cursor = [], None
+    while True:
+        page = fetch(after=cursor, limit=limit)
+        pages.append(page)
+        cursor = page.next_cursor
+        if cursor is None:
+            return pages
+
+
+@pytest.fixture
+def listing(db_path):
+    ids, students = seed(db_path, faculty=4, fellowships_per_lab=5, students=10)
+    conn = sqlite3.connect(db_path)
+    # NULL and tied sort keys are where keyset conditions usually go wrong.
+    conn.execute("UPDATE fellowships SET deadline = NULL, stipend = NULL WHERE fellowship_id % 4 = 0")
+    conn.execute("UPDATE fellowships SET deadline = '2026-05-01', stipend = 500 WHERE fellowship_id % 4 = 1")
+    conn.executemany("INSERT INTO applications (fellowship_id, student_net_id) VALUES (?, ?)",
+                     [(fid, s) for fid in ids[:6] for s in students[:fid % 3]])
+    conn.commit()
+    conn.close()
+    return ids
+
+
+@pytest.mark.parametrize("sort", list(database.FELLOWSHIP_SORTS))
+def test_pages_cover_the_listing_in_sort_order(listing, sort):
+    everything = [f.get_fellowship_id() for f in database.get_fellowship_information(sort=sort)]
+    pages = _walk(lambda **kw: database.get_fellowship_information(sort=sort, **kw), limit=3)
+    assert [len(p) for p in pages] == [3] * 6 + [2]
+    assert [f.get_fellowship_id() for p in pages for f in p] == everything
+    assert sorted(everything) == listing
+
+
+def test_fellowships_sort_by_key_with_missing_values_last(listing):
+    deadlines = [f.get_deadline() for f in database.get_fellowship_information(sort="deadline")]
+    assert deadlines[-5:] == [None] * 5 and deadlines[:-5] == sorted(deadlines[:-5])
+    stipends = [f.get_stipend() for f in database.get_fellowship_information(sort="stipend")]
+    assert stipends[-5:] == [None] * 5 and stipends[:-5] == sorted(stipends[:-5], reverse=True)
+    counts = [f.get_application_count() for f in database.get_fellowship_information(sort="applications")]
+    assert counts == sorted(counts, reverse=True) and counts[0] == 2
+    newest = [f.get_fellowship_id() for f in database.get_fellowship_information(sort="newest")]
+    assert newest == sorted(listing, reverse=True)
+
+
+def test_other_listings_paginate(listing):
+    conn = sqlite3.connect(database._DATABASE_URL)
+    conn.executemany("INSERT INTO saved_fellowships (student_net_id, fellowship_id, saved_at) VALUES ('stu0', ?, ?)",
+                     [(fid, f"2025-01-0{1 + fid % 3}") for fid in range(1, 8)])
+    conn.execute("UPDATE labs SET lab_name = 'Zoology' WHERE lab_num = 1")
+    conn.execute("UPDATE users SET last_name = 'Same', first_name = 'Ann' WHERE net_id IN ('prof3', 'prof1')")
+    conn.commit()
+    conn.close()
+
+    labs = _walk(lambda **kw: database.get_labs_information(**kw), limit=3)
+    assert [l.get_lab_num() for p in labs for l in p] == [2, 3, 4, 1]
+    faculty = _walk(lambda **kw: database.get_faculty_information(**kw), limit=3)
+    assert [f.get_email() for p in faculty for f in p] == \
+        [f"prof{i}@yale.edu" for i in (0, 2, 1, 3)]
+    saved = _walk(lambda **kw: database.get_saved_fellowships("stu0", **kw), limit=2)
+    assert [f.get_fellowship_id() for p in saved for f in p] == [5, 2, 7, 4, 1, 6, 3]
+
+
+def test_cursors_from_another_sort_or_garbage_start_over(listing):
+    page = database.get_fellowship_information(sort="stipend", limit=2)
+    first = [f.get_fellowship_id() for f in database.get_fellowship_information(sort="deadline", limit=2)]
+    crafted = [pagination.encode_cursor(database.FELLOWSHIP_SORTS["deadline"], value, 3) for value in ([1], {"a": 1})]
+    for cursor in (page.next_cursor, "not-a-cursor", "bm90IGpzb24", *crafted):
+        again = database.get_fellowship_information(sort="deadline", after=cursor, limit=2)
+        assert [f.get_fellowship_id() for f in again] == first
+
+
+def test_page_size_is_capped():
+    assert pagination.page_size(None) == pagination.PAGE_SIZE
+    assert pagination.page_size("7") == 7
+    assert pagination.page_size("100000") == pagination.MAX_PAGE_SIZE
+    assert pagination.page_size("-3") == 1
+
+
+def test_listing_page_links_to_the_next_page(client, listing):
+    html = client.get("/fellowships?sort=deadline&limit=15").get_data(as_text=True)
+    assert html.count('class="fellowship-row"') == 15
+    assert "Next page" in html and "First page" not in html
+    cursor = database.get_fellowship_information(sort="deadline", limit=15).next_cursor
+    assert f"after={cursor}" in html
+
+    html = client.get(f"/fellowships?sort=deadline&limit=15&after={cursor}").get_data(as_text=True)
+    assert html.count('class="fellowship-row"') == 5
+    assert "Next page" not in html and "First page" in html
+
+    crafted = pagination.encode_cursor(database.FELLOWSHIP_SORTS["deadline"], {"a": 1}, [3])
+    response = client.get(f"/fellowships?sort=deadline&limit=15&after={crafted}")
+    assert response.status_code == 200 and response.get_data(as_text=True).count('class="fellowship-row"') == 15
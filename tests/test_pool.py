@@ -0,0 +1,67 @@
+import sqlite3
+import threading
+
+from pool import ConnectionPool, PoolTimeout
+
+
+def make_pool(tmp_path, **kwargs):
+    path = str(tmp_path / "pool.sqlite")
+    return ConnectionPool(lambda: sqlite3.connect(path), **kwargs)
+
+
+def test_connection_reused_within_thread(tmp_path):
+    pool = make_pool(tmp_path)
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        assert second is first
+
+    stats = pool.stats()
+    assert stats["opened"] == 1
+    assert stats["reused"] == 1
+
+
+def test_nested_blocks_share_connection_and_slot(tmp_path):
+    pool = make_pool(tmp_path, size=1, timeout=0.1)
+    with pool.connection() as outer:
+        with pool.connection() as inner:
+            assert inner is outer
+            assert pool.stats()["in_use"] == 1
+
+
+def test_pragmas_applied_once(tmp_path):
+    pool = make_pool(tmp_path, pragmas=[("foreign_keys", "ON")])
+    for _ in range(3):
+        with pool.connection() as conn:
+            assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+    assert pool.stats()["opened"] == 1
+
+
+def test_uncommitted_work_rolled_back(tmp_path):
+    pool = make_pool(tmp_path)
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.commit()
+        conn.execute("INSERT INTO t VALUES (1)")
+    with pool.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+
+
+def test_waiters_counted_and_time_out(tmp_path):
+    pool = make_pool(tmp_path, size=1, timeout=0.05)
+    errors = []
+
+    def other_thread():
+        try:
+            with pool.connection():
+                pass
+        except PoolTimeout as e:
+            errors.append(e)
+
+    with pool.connection():
+        t = threading.Thread(target=other_thread)
+        t.start()
+        t.join()
+
+    assert len(errors) == 1
+    assert pool.stats()["waited"] == 1
@@ -0,0 +1,57 @@
+import random
+import sqlite3
+
+import pytest
+from database import get_faculty_preferences, get_student_preferences, save_faculty_preferences, \
+    save_student_preferences
+
+STUDENTS = [f"s{i}" for i in range(8)]
+
+
+def _seed(path):
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO users VALUES (?, 'S', 'Tudent', ?, 'x', 'student')",
+                     [(s, f"{s}@yale.edu") for s in STUDENTS])
+    conn.executemany("INSERT INTO students (net_id, class_year) VALUES (?, 2026)", [(s,) for s in STUDENTS])
+    conn.executescript("""
+        INSERT INTO users VALUES ('prof', 'P', 'Rof', 'prof@yale.edu', 'x', 'faculty');
+        INSERT INTO faculty (net_id, department) VALUES ('prof', 'CS');
+        INSERT INTO labs (lab_num, lab_name, faculty_net_id) VALUES (1, 'Lab', 'prof');
+        INSERT INTO fellowships (fellowship_id, lab_num, name) VALUES (10, 1, 'A'), (20, 1, 'B'), (30, 1, 'C');
+    """)
+    conn.commit()
+    conn.close()
+
+
+def test_saving_a_ranking_writes_only_the_difference(db_path):
+    _seed(db_path)
+    changes = save_faculty_preferences(10, ["s0", "s1", "s2", "s3"])
+    assert changes == {"added": [("s0", 1), ("s1", 2), ("s2", 3), ("s3", 4)], "removed": [], "moved": []}
+
+    # Swap the top two, drop s2, add s4: ranks are exchanged without tripping UNIQUE(fellowship_id, rank).
+    changes = save_faculty_preferences(10, ["s1", "s0", "s3", "s4"])
+    assert changes == {"added": [("s4", 4)], "removed": ["s2"], "moved": [("s1", 2, 1), ("s0", 1, 2), ("s3", 4, 3)]}
+    assert get_faculty_preferences(10) == [("s1", 1), ("s0", 2), ("s3", 3), ("s4", 4)]
+
+    assert save_faculty_preferences(10, ["s1", "s0", "s3", "s4"]) == {"added": [], "removed": [], "moved": []}
+
+
+def test_random_rankings_round_trip(db_path):
+    _seed(db_path)
+    rng = random.Random(22)
+    for _ in range(50):
+        ranking = rng.sample([10, 20, 30], rng.randint(1, 3))
+        save_student_preferences("s0", ranking)
+        assert [fid for fid, _ in get_student_preferences("s0")] == ranking
+        assert [rank for _, rank in get_student_preferences("s0")] == list(range(1, len(ranking) + 1))
+
+
+def test_failed_saves_raise_and_keep_the_old_ranking(db_path):
+    _seed(db_path)
+    save_student_preferences("s0", [10, 20])
+    with pytest.raises(sqlite3.IntegrityError):
+        save_student_preferences("s0", [20, 99])
+    with pytest.raises(sqlite3.IntegrityError):
+        save_faculty_preferences(10, ["s0", "nobody"])
+    assert get_student_preferences("s0") == [(10, 1), (20, 2)]
+    assert get_faculty_preferences(10) == []
@@ -0,0 +1,50 @@
+import pstats
+
+import pytest
+
+import profiling
+from profiling import Histogram
+
+
+def test_histogram_percentiles_fall_in_the_right_buckets():
+    h = Histogram()
+    for ms in range(1, 101):
+        h.observe(ms / 1000)
+    assert h.percentile(50) * 1000 == pytest.approx(50, rel=0.25)
+    assert h.percentile(99) * 1000 == pytest.approx(99, rel=0.25)
+    assert Histogram().percentile(50) is None
+
+
+def test_request_latency_is_split_into_db_and_template_time(app, client, db_path, monkeypatch):
+    monkeypatch.setitem(app.config, "METRICS_ACCESS", "local")
+    profiling.reset()
+    for _ in range(3):
+        assert client.get("/labs").status_code == 200
+
+    summary = client.get("/metrics/latency").get_json()
+    labs = summary["labs"]
+    assert labs["requests"] == 3
+    assert labs["total"]["p99_ms"] >= labs["total"]["p50_ms"] > 0
+    assert labs["db"]["mean_ms"] > 0 and labs["template"]["mean_ms"] > 0
+    assert labs["db"]["mean_ms"] + labs["template"]["mean_ms"] <= labs["total"]["mean_ms"] * 1.5
+    assert "latency_metrics" not in summary
+
+    metrics = client.get("/metrics").get_data(as_text=True)
+    assert 'labsatyale_request_seconds_count{endpoint="labs",part="template"} 3' in metrics
+
+
+def test_latency_summary_follows_metrics_access(app, client, db_path, monkeypatch):
+    assert client.get("/metrics/latency").status_code == 404
+    monkeypatch.setitem(app.config, "METRICS_ACCESS", "local")
+    assert client.get("/metrics/latency", environ_base={"REMOTE_ADDR": "10.0.0.5"}).status_code == 404
+    assert client.get("/metrics/latency").status_code == 200
+
+
+def test_sampled_requests_dump_cprofile_stats(app, client, db_path, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, "PROFILE_SAMPLE_RATE", 1.0)
+    monkeypatch.setitem(app.config, "PROFILE_DIR", str(tmp_path / "profiles"))
+    client.get("/labs")
+
+    (dump,) = (tmp_path / "profiles").iterdir()
+    assert dump.name.startswith("labs-") and dump.suffix == ".prof"
+    assert pstats.Stats(str(dump)).total_calls > 0
@@ -1,12 +1,13 @@
 import sqlite3
 import os
-import database
 from matching import run_matching
 
+RANK_SQL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rank.sql")
 
-def test_matching_results(monkeypatch):
+
+def test_matching_results(db_path):
     """
-    Matching test using pre-populated labsatyale_test.sqlite (added rank.sql)
+    Matching test on a database built from schema.sql and rank.sql
     see rank.sql for the specific test cases
     Test Case 1:
         fellowship 100 → stu102
@@ -15,12 +16,11 @@ def test_matching_results(monkeypatch):
         fellowship 200 → stu202
     """
 
-    test_db_path = os.path.abspath("labsatyale_test.sqlite")
-
-    def fake_connect(_):
-        return sqlite3.connect(test_db_path)
-
-    monkeypatch.setattr(database, "connect", fake_connect)
+    conn = sqlite3.connect(db_path)
+    with open(RANK_SQL) as f:
+        conn.executescript(f.read())
+    conn.commit()
+    conn.close()
 
     matches = run_matching()
 
@@ -0,0 +1,114 @@
+import io
+import os
+import sqlite3
+
+import pytest
+import database
+from resume_store import InvalidResume, ResumeStore
+
+PDF = b"%PDF-1.4\n" + b"x" * 1000
+
+
+@pytest.fixture
+def resume_dir(tmp_path, monkeypatch):
+    path = str(tmp_path / "resumes")
+    monkeypatch.setattr(database, "_RESUME_DIR", path)
+    return path
+
+
+def _add_students(path, *net_ids, data=None):
+    conn = sqlite3.connect(path)
+    for net_id in net_ids:
+        conn.execute("INSERT INTO users VALUES (?, 'S', 'T', ?, 'x', 'student')", (net_id, f"{net_id}@yale.edu"))
+        conn.execute("INSERT INTO students (net_id, class_year, resume_data, resume_filename) VALUES (?, 2026, ?, 'cv.pdf')",
+                     (net_id, data))
+    conn.commit()
+    conn.close()
+
+
+def test_identical_uploads_share_one_file(tmp_path):
+    store = ResumeStore(str(tmp_path))
+    first = store.put(PDF)
+    assert store.put(PDF) == first
+    assert list(store.digests()) == [first[0]]
+    with open(store.path(first[0]), "rb") as f:
+        assert f.read() == PDF
+
+
+def test_upload_keeps_only_metadata_in_the_table(db_path, resume_dir):
+    _add_students(db_path, "s1")
+    assert database.update_student_resume("s1", PDF, "cv.pdf")
+    info = database.get_student_resume("s1")
+    assert info["data"] is None and info["size"] == len(PDF)
+    assert info["path"].startswith(resume_dir) and os.path.exists(info["path"])
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT resume_data FROM students").fetchone() == (None,)
+    conn.close()
+
+
+def test_migration_moves_blobs_in_batches(db_path, resume_dir):
+    _add_students(db_path, "s1", "s2", "s3", data=PDF)
+    assert database.get_student_resume("s1")["data"] == PDF
+
+    assert list(database.move_resume_blobs(batch_size=2)) == [2, 1]
+    for net_id in ("s1", "s2", "s3"):
+        info = database.get_student_resume(net_id)
+        assert info["data"] is None and os.path.exists(info["path"])
+    assert len(list(database.get_resume_store().digests())) == 1
+
+    database.update_student_resume("s1", PDF + b"new", "cv.pdf")
+    assert database.prune_resume_files(min_age=0) == 0
+    database.update_student_resume("s2", PDF + b"new", "cv.pdf")
+    database.update_student_resume("s3", PDF + b"new", "cv.pdf")
+    assert database.prune_resume_files(min_age=0) == 1
+
+
+def test_resume_is_sent_with_etag_and_ranges(app, db_path, resume_dir):
+    from fellowship import _send_resume
+
+    _add_students(db_path, "s1")
+    database.update_student_resume("s1", PDF, "cv.pdf")
+    info = database.get_student_resume("s1")
+
+    with app.test_request_context(headers={"Range": "bytes=0-7"}):
+        response = _send_resume(info)
+        response.direct_passthrough = False
+        assert response.status_code == 206
+        assert response.get_data() == PDF[:8]
+        assert response.headers["ETag"] == f'"{info["sha256"]}"'
+        response.close()
+
+    with app.test_request_context(headers={"If-None-Match": f'"{info["sha256"]}"'}):
+        assert _send_resume(info).status_code == 304
+
+
+def test_relative_resume_dir_is_served_from_the_working_directory(app, db_path, tmp_path, monkeypatch):
+    """the stored path is absolute, so send_file does not resolve it against app.root_path"""
+    from fellowship import _send_resume
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(database, "_RESUME_DIR", "resumes")
+    _add_students(db_path, "s1")
+    database.update_student_resume("s1", PDF, "cv.pdf")
+    info = database.get_student_resume("s1")
+    assert info["path"].startswith(str(tmp_path / "resumes"))
+
+    with app.test_request_context():
+        response = _send_resume(info)
+        response.direct_passthrough = False
+        assert response.status_code == 200 and response.get_data() == PDF
+        response.close()
+
+
+def test_streamed_upload_is_checked_chunk_by_chunk(tmp_path):
+    store = ResumeStore(str(tmp_path))
+    assert store.put_stream(io.BytesIO(PDF), max_size=len(PDF), chunk_size=3) == store.put(PDF)
+
+    with pytest.raises(InvalidResume):
+        store.put_stream(io.BytesIO(PDF), max_size=len(PDF) - 1, chunk_size=64)
+    with pytest.raises(InvalidResume):
+        store.put_stream(io.BytesIO(b"<html>" + PDF), chunk_size=2)
+    with pytest.raises(InvalidResume):
+        store.put_stream(io.BytesIO(b""))
+    assert [name for _, _, files in os.walk(tmp_path) for name in files if name.endswith(".tmp")] == []
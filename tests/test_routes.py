@@ -43,7 +43,7 @@ def test_labs_page_renders(client, monkeypatch):
         )
     ]
 
-    def fake_get_labs_information(q=None):
+    def fake_get_labs_information(q=None, **page):
         return dummy_labs
 
     # learned this in 327 but when we get the labs information, it uses our fake function instead
@@ -121,7 +121,7 @@ def test_fellowship_page_renders(client, monkeypatch):
         )
     ]
 
-    def fake_get_fellowship_information(q=None):
+    def fake_get_fellowship_information(q=None, **page):
         return dummy_fellowships
     
     monkeypatch.setattr("fellowship.get_fellowship_information", fake_get_fellowship_information)
@@ -173,7 +173,7 @@ def test_faculty_page_renders(client, monkeypatch):
         )
     ]
 
-    def fake_get_faculty_information(q=None):
+    def fake_get_faculty_information(q=None, **page):
         return dummy_faculty
 
     monkeypatch.setattr("fellowship.get_faculty_information", fake_get_faculty_information)
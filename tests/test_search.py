@@ -0,0 +1,75 @@
+import sqlite3
+
+import pytest
+import database
+import search
+
+
+def populate(path):
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        INSERT INTO users VALUES ('prof1', 'Ada', 'Lovelace', 'ada@yale.edu', 'x', 'faculty');
+        INSERT INTO users VALUES ('prof2', 'Alan', 'Turing', 'alan@yale.edu', 'x', 'faculty');
+        INSERT INTO faculty VALUES ('prof1', 'Computer Science'), ('prof2', 'Mathematics');
+        INSERT INTO labs (lab_num, lab_name, description, location, faculty_net_id)
+            VALUES (1, 'Engine Lab', 'Analytical engines', 'AKW', 'prof1'),
+                   (2, 'Machine Lab', 'Computability', 'DL', 'prof2');
+        INSERT INTO fellowships (fellowship_id, lab_num, name, class_years, description)
+            VALUES (10, 1, 'Engine Fellowship', '2026', 'Build difference engines'),
+                   (20, 2, 'Codebreaking Fellowship', '2027', 'Break ciphers');
+    """)
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def indexed_db(db_path):
+    populate(db_path)
+    if not database.ensure_search_index():
+        pytest.skip("SQLite built without FTS5")
+    return db_path
+
+
+def names(fellowships):
+    return [f.get_fellowship_name() for f in fellowships]
+
+
+def test_match_expression_prefixes_each_word():
+    assert search.match_expression("comp sci") == '"comp"* "sci"*'
+    assert search.match_expression("  '%  ") is None
+
+
+def test_prefix_search_across_joined_columns(indexed_db):
+    assert names(database.get_fellowship_information("turi")) == ["Codebreaking Fellowship"]
+    assert [l.get_lab_name() for l in database.get_labs_information("analyt")] == ["Engine Lab"]
+    assert [f.get_last_name() for f in database.get_faculty_information("math")] == ["Turing"]
+
+
+def test_triggers_keep_index_in_sync(indexed_db):
+    database.run_write(lambda conn: conn.execute(
+        "UPDATE users SET last_name = 'Hopper' WHERE net_id = 'prof2'"))
+    assert names(database.get_fellowship_information("turing")) == []
+    assert names(database.get_fellowship_information("hopper")) == ["Codebreaking Fellowship"]
+
+    database.run_write(lambda conn: conn.execute("DELETE FROM fellowships WHERE fellowship_id = 10"))
+    assert names(database.get_fellowship_information("engine")) == []
+
+    with database.get_connection() as conn:
+        for index in search.INDEXES:
+            conn.execute(f"INSERT INTO {index}({index}, rank) VALUES ('integrity-check', 1)")
+
+
+def test_like_fallback_without_index(db_path):
+    populate(db_path)
+    assert names(database.get_fellowship_information("ciphers")) == ["Codebreaking Fellowship"]
+
+
+def test_faculty_index_does_not_depend_on_user_rowids(indexed_db):
+    """users has a TEXT key, so VACUUM may renumber its rowids; the faculty index joins on net_id"""
+    conn = sqlite3.connect(indexed_db)
+    conn.execute("UPDATE users SET rowid = rowid + 100")
+    conn.commit()
+    conn.close()
+
+    assert [f.get_email() for f in database.get_faculty_information("turing")] == ["alan@yale.edu"]
+    assert [f.get_email() for f in database.get_faculty_information("lovelace")] == ["ada@yale.edu"]
@@ -0,0 +1,37 @@
+import sqlite3
+
+import database
+
+
+def _login(client, db_path, net_id="stu1"):
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO users VALUES (?, 'Grace', 'Hopper', 'grace@yale.edu', 'x', 'student')", (net_id,))
+    conn.execute("INSERT INTO students (net_id, class_year) VALUES (?, 2026)", (net_id,))
+    conn.commit()
+    conn.close()
+    with client.session_transaction() as session:
+        session["_user_id"] = net_id
+        session["_fresh"] = True
+
+
+def _queries(client, path):
+    response = client.get(path)
+    assert response.status_code == 200
+    return int(response.headers["X-DB-Queries"])
+
+
+def test_logged_in_page_loads_skip_the_user_query(app, client, db_path, monkeypatch):
+    monkeypatch.setitem(app.config, "QUERY_DEBUG_HEADERS", True)
+    _login(client, db_path)
+    assert _queries(client, "/labs") > 0
+    # The user and the lab listing both come from the caches now.
+    assert _queries(client, "/labs") == 0
+
+
+def test_profile_update_refreshes_the_cached_user(app, client, db_path, monkeypatch):
+    monkeypatch.setitem(app.config, "QUERY_DEBUG_HEADERS", True)
+    _login(client, db_path)
+    assert "Grace" in client.get("/profile").get_data(as_text=True)
+    client.post("/update-profile", data={"first_name": "Amazing", "last_name": "Grace"})
+    assert database.get_session_user("stu1").first_name == "Amazing"
+    assert "Amazing" in client.get("/profile").get_data(as_text=True)
@@ -0,0 +1,40 @@
+from matching import PreferenceTable
+from simulation import MAX_SCENARIOS, MAX_WORKERS, simulate
+from tests.test_incremental import _seed
+
+
+def make_data():
+    return PreferenceTable.from_rows(
+        ["a", "b", "c"],
+        [(10, 1), (20, 1)],
+        [("a", 10), ("b", 10), ("b", 20), ("c", 10)],
+        [(10, "a"), (10, "b"), (10, "c"), (20, "b")],
+    )
+
+
+def test_capacity_override_changes_outcome():
+    base, bigger = simulate([{}, {"capacity": {10: 3}, "top_k": None}], data=make_data(), workers=1)
+    assert base["matched"] == 2
+    assert bigger["matched"] == 3
+    assert base["fill"] == {10: 1.0, 20: 1.0}
+    assert bigger["fill"] == {10: 1.0, 20: 0.0}
+    assert bigger["rank_distribution"] == {1: 3}
+
+
+def test_process_pool_matches_in_process_results():
+    scenarios = [{"top_k": k, "capacity_scale": s} for k in (1, 2, None) for s in (1, 2)]
+    assert simulate(scenarios, data=make_data(), workers=2) == simulate(scenarios, data=make_data(), workers=1)
+
+
+def test_simulation_route_limits_scenarios_and_workers(client, db_path):
+    _seed(db_path)
+    with client.session_transaction() as session:
+        session["_user_id"] = "prof"
+        session["_fresh"] = True
+
+    assert client.post("/run-matching/simulate", json={"scenarios": [{}] * (MAX_SCENARIOS + 1)}).status_code == 400
+    for workers in (0, MAX_WORKERS + 1, "4", 1.5):
+        assert client.post("/run-matching/simulate", json={"workers": workers}).status_code == 400
+    response = client.post("/run-matching/simulate", json={"scenarios": [{}, {"top_k": None}], "workers": 1})
+    assert response.status_code == 200
+    assert [r["matched"] for r in response.get_json()["results"]] == [2, 2]
@@ -0,0 +1,30 @@
+import sqlite3
+import threading
+
+import pytest
+from writer import WriteQueue
+
+
+def test_failed_job_does_not_undo_others(tmp_path):
+    path = str(tmp_path / "writer.sqlite")
+    setup = sqlite3.connect(path)
+    setup.execute("CREATE TABLE t (x INTEGER UNIQUE)")
+    setup.close()
+
+    writes = WriteQueue(lambda: sqlite3.connect(path))
+    writes.submit(lambda conn: conn.execute("INSERT INTO t VALUES (1)"))
+    with pytest.raises(sqlite3.IntegrityError):
+        writes.submit(lambda conn: conn.execute("INSERT INTO t VALUES (1)"))
+
+    threads = [threading.Thread(target=writes.submit,
+                                args=(lambda conn, i=i: conn.execute("INSERT INTO t VALUES (?)", (i,)),))
+               for i in range(2, 12)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    writes.stop()
+
+    check = sqlite3.connect(path)
+    assert check.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 11
+    assert writes.stats()["failed"] == 1
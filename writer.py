@@ -0,0 +1,136 @@
+"""
+Single-writer queue for the Labs at Yale SQLite database.
+
+SQLite allows one writer at a time.  When several request threads write at
+once, all but one wait on the file lock and, if the wait outlasts the busy
+timeout, fail with "database is locked".  The WriteQueue funnels every write
+through one background thread that owns its own connection, so request
+threads never compete for the lock; they block on a future instead.
+
+Jobs that arrive while the writer is busy are committed together in one
+transaction.  Each job runs inside its own SAVEPOINT, so a job that raises is
+rolled back on its own and its exception is re-raised in the thread that
+submitted it, without affecting the other jobs in the batch.
+
+Classes:
+    - WriteQueue: Background writer thread that runs submitted write jobs.
+"""
+import queue
+import threading
+from concurrent.futures import Future
+
+_STOP = object()
+
+
+class WriteQueue:
+    """
+    Runs write jobs one after another on a dedicated connection.
+
+    Attributes:
+        max_batch (int): Largest number of queued jobs committed in one transaction.
+    """
+    def __init__(self, factory, pragmas=None, max_batch=64):
+        """
+        Initialize a WriteQueue and start its writer thread.
+
+        Args:
+            factory (callable): Zero-argument callable returning a new sqlite3 connection.
+            pragmas (list[tuple[str, object]], optional): PRAGMAs applied to the writer's connection.
+            max_batch (int): Largest number of queued jobs committed in one transaction.
+        """
+        self.max_batch = max_batch
+        self._factory = factory
+        self._pragmas = list(pragmas or [])
+        self._jobs = queue.Queue()
+        self._stats = {'jobs': 0, 'batches': 0, 'failed': 0}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, fn):
+        """
+        Run `fn(conn)` on the writer thread and wait for it to commit.
+
+        Args:
+            fn (callable): Function taking a sqlite3 connection. It must not commit
+                or roll back; the queue does that.
+
+        Returns:
+            object: Whatever `fn` returned.
+
+        Raises:
+            Exception: Whatever `fn` raised, or the error from the commit.
+        """
+        future = Future()
+        self._jobs.put((fn, future))
+        return future.result()
+
+    def stop(self):
+        """Finish the queued jobs, then stop the writer thread."""
+        self._jobs.put(_STOP)
+        self._thread.join()
+
+    def stats(self):
+        """Return the number of jobs, batches and failed jobs processed so far."""
+        with self._lock:
+            return dict(self._stats)
+
+    def _run(self):
+        conn = self._factory()
+        conn.isolation_level = None
+        for name, value in self._pragmas:
+            conn.execute(f'PRAGMA {name} = {value}')
+        try:
+            while True:
+                batch = [self._jobs.get()]
+                while batch[-1] is not _STOP and len(batch) < self.max_batch:
+                    try:
+                        batch.append(self._jobs.get_nowait())
+                    except queue.Empty:
+                        break
+                stopping = batch[-1] is _STOP
+                if stopping:
+                    batch.pop()
+                if batch:
+                    self._run_batch(conn, batch)
+                if stopping:
+                    return
+        finally:
+            conn.close()
+
+    def _run_batch(self, conn, batch):
+        results = []
+        failed = 0
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for fn, future in batch:
+                conn.execute('SAVEPOINT job')
+                try:
+                    results.append((future, fn(conn), None))
+                    conn.execute('RELEASE job')
+                except Exception as e:
+                    conn.execute('ROLLBACK TO job')
+                    conn.execute('RELEASE job')
+                    results.append((future, None, e))
+                    failed += 1
+            conn.execute('COMMIT')
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            for _, future in batch:
+                future.set_exception(e)
+            self._record(len(batch), len(batch))
+            return
+
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        self._record(len(batch), failed)
+
+    def _record(self, jobs, failed):
+        with self._lock:
+            self._stats['jobs'] += jobs
+            self._stats['batches'] += 1
+            self._stats['failed'] += failed